@@ -5,10 +5,10 @@
 import streamlit as st
 import os
 import time
-from modules import auth, db, features
+from modules import auth, db, features, image_store, index, lifecycle, matcher, metrics, search, service_client, text_model, thumbnails, vector_store
 
 # --- SYSTEM CONFIGURATION ---
-IMG_STORAGE = "data/item_images"
+IMG_STORAGE = image_store.STORE_DIR
 if not os.path.exists(IMG_STORAGE):
     os.makedirs(IMG_STORAGE)
 
@@ -21,6 +21,59 @@ ITEM_CATEGORIES = [
     "Headphones", "Keyboard", "Keys", "Laptop", "Mouse", 
     "Smartphone", "Waterbottle", "Wristwatch", "Other"
 ]
+MAX_RESULTS = 100  # top-k cut-off for the results list
+RESULTS_PER_PAGE = 10  # result cards (thumbnails) rendered per page
+# Image-only searches on pools this large may use approximate (IVF) visual search; None = always exact.
+# It is approximate (recall@10 about 0.94 at ann.DEFAULT_PROBE on 20k synthetic items, and
+# it levels off near 0.95; measure with evaluation/ann_recall.py), so it is opt-in.
+ANN_MIN_POOL = None
+# Pools this large are scored exactly across CPU cores instead (modules/shards.py); None = off.
+# Only worth enabling on multi-core servers with pools in the millions.
+SHARD_MIN_POOL = None
+# Serve the OPEN pools from memory-mapped segments (modules/vector_store.py) instead of RAM,
+# e.g. "data/vectors" once years of history no longer fit comfortably; None = off.
+VECTOR_STORE_DIR = None
+CATEGORY_AUTO = "Auto (predicted from image)"
+# Owner actions on the "My Matches" page, by target status (modules/lifecycle.py).
+STATUS_ACTIONS = {
+    lifecycle.CLAIMED: "Mark as claimed",
+    lifecycle.CLOSED: "Returned - close report",
+    lifecycle.OPEN: "Reopen",
+}
+# Accounts that see the "Admin: Metrics" page (comma-separated usernames). None unless set:
+# anyone can register a username, so no default name may unlock the profiler.
+ADMIN_USERS = {name.strip() for name in os.environ.get("LF_ADMIN_USERS", "").split(",") if name.strip()}
+
+@st.cache_resource
+def start_background_services():
+    """Runs once per server process, before the first page renders."""
+    # Refreshes the Prometheus textfile when LF_METRICS_FILE is set.
+    metrics.start_exporter()
+    if get_service_client():
+        return  # The matching service (service.py) owns the index, model and workers.
+    # Imports cv2/sklearn and loads the classifier while the user is still logging in.
+    features.start_warmup()
+    # Keeps the text IDF current and re-encodes old text vectors off the request path.
+    text_model.start_background_worker()
+    # Matches every new report against the opposite pool into the `matches` table.
+    matcher.start_background_worker(get_search_index())
+    # Expires stale reports and archives closed ones (hourly).
+    lifecycle.start_background_worker()
+    if get_search_index().store is not None:
+        # Appends items added by other processes and compacts out closed ones.
+        vector_store.start_background_worker(get_search_index().store)
+
+@st.cache_resource
+def get_search_index():
+    """One warm vector index per server process, shared by every session and rerun."""
+    return index.get_index(ann_min_pool=ANN_MIN_POOL, shard_min_pool=SHARD_MIN_POOL, store_dir=VECTOR_STORE_DIR)
+
+@st.cache_resource
+def get_service_client():
+    """Client for the headless matching service when LF_SERVICE_URL is set, else None (in-process)."""
+    if not service_client.SERVICE_URL:
+        return None
+    return service_client.ServiceClient(service_client.SERVICE_URL)
 
 # --- STATE INITIALIZATION ---
 if 'current_user' not in st.session_state:
@@ -29,19 +82,15 @@ if 'current_user' not in st.session_state:
 # ==========================
 # UTILITY FUNCTIONS
 # ==========================
-def process_image_upload(file_obj):
-    """Handles writing the uploaded image buffer to the local storage."""
+def process_image_upload(file_obj, digest=None):
+    """
+    Stores the uploaded image under its content hash (see modules/image_store.py):
+    saving the same photo again returns the existing file instead of a new copy.
+    """
     if not file_obj:
         return None
     try:
-        # Create a unique filename using epoch time
-        unique_name = f"{int(time.time())}_{file_obj.name}"
-        full_path = os.path.join(IMG_STORAGE, unique_name)
-        
-        with open(full_path, "wb") as buffer:
-            buffer.write(file_obj.getbuffer())
-        
-        return full_path
+        return image_store.save(file_obj, digest)
     except Exception as err:
         st.error(f"Upload failed: {err}")
         return None
@@ -60,8 +109,11 @@ def view_auth():
         u_pass = st.text_input("Password", type="password")
         
         if st.button("Authenticate", key="btn_login"):
-            user_data = auth.login_user(u_name, u_pass)
-            if user_data:
+            wait_s = auth.lockout_remaining(u_name)
+            user_data = auth.login_user(u_name, u_pass) if not wait_s else None
+            if wait_s:
+                st.error(f"Too many failed attempts. Try again in {wait_s // 60 + 1} min.")
+            elif user_data:
                 st.session_state['current_user'] = user_data
                 st.toast(f"Hello, {user_data['username']}!")
                 time.sleep(0.5)
@@ -86,7 +138,11 @@ def view_auth():
                     st.error("Username is already taken.")
 
 def view_dashboard():
-    active_user = st.session_state['current_user']
+    # The session keeps only public fields; the cached lookup picks up profile changes.
+    active_user = auth.get_user(st.session_state['current_user']['id'])
+    if active_user is None:
+        st.session_state['current_user'] = None
+        st.rerun()
     
     # Sidebar Setup
     with st.sidebar:
@@ -96,13 +152,20 @@ def view_dashboard():
             st.rerun()
         
         st.divider()
-        nav_mode = st.radio("Menu", ["Post Item", "Find Match"])
+        menu = ["Post Item", "My Matches", "Find Match"]
+        if active_user['username'] in ADMIN_USERS:
+            menu.append("Admin: Metrics")
+        nav_mode = st.radio("Menu", menu)
 
     # Router
     if nav_mode == "Post Item":
         render_submission_form(active_user)
+    elif nav_mode == "My Matches":
+        render_my_matches(active_user)
     elif nav_mode == "Find Match":
         render_search_engine(active_user)
+    elif nav_mode == "Admin: Metrics":
+        render_metrics_panel()
 
 def render_submission_form(user_obj):
     st.subheader("📝 Submit an Item Report")
@@ -115,6 +178,8 @@ def render_submission_form(user_obj):
     left_col, right_col = st.columns([1, 1])
     
     img_file = None
+    img_analysis = None
+    img_digest = None
     
     with right_col:
         st.markdown("### 1. Image Upload")
@@ -122,9 +187,16 @@ def render_submission_form(user_obj):
         
         if img_file:
             st.image(img_file, width=250)
-            # Perform AI Check immediately on upload
-            saved_path = process_image_upload(img_file)
-            ai_tag = features.predict_category(saved_path)
+            # Perform AI Check immediately on upload (memoized by content hash, so
+            # reruns and "Save Report" reuse it instead of decoding again)
+            if get_service_client():
+                try:
+                    img_analysis = get_service_client().predict_category(img_file)
+                except service_client.ServiceClientError as err:
+                    st.warning(f"AI analysis unavailable: {err}")
+            else:
+                img_digest, img_analysis = image_store.analyze(img_file)
+            ai_tag = img_analysis["category"] if img_analysis else None
             
             if ai_tag:
                 st.info(f"AI identified this as: **{ai_tag}**")
@@ -151,11 +223,18 @@ def render_submission_form(user_obj):
         if st.button("Save Report", type="primary"):
             if not txt_desc or not img_file:
                 st.error("Image and description are required.")
+            elif get_service_client():
+                with st.spinner("Indexing features..."):
+                    try:
+                        get_service_client().submit_item(user_obj['id'], db_mode, txt_desc, img_file, sel_category)
+                        st.success("Report saved! System is looking for matches (see 'My Matches').")
+                    except service_client.ServiceClientError as err:
+                        st.error(f"Processing failed: {err}")
             else:
                 with st.spinner("Indexing features..."):
-                    # Save and Process
-                    final_path = process_image_upload(img_file)
-                    v_vec = features.extract_visual_vector(final_path)
+                    # Save and reuse the vector computed from the upload buffer
+                    final_path = process_image_upload(img_file, img_digest)
+                    v_vec = img_analysis["vector"] if img_analysis else None
                     t_vec = features.extract_text_vector(txt_desc)
                     
                     if final_path and v_vec is not None:
@@ -168,10 +247,107 @@ def render_submission_form(user_obj):
                             v_vec, 
                             t_vec
                         )
-                        st.success("Report saved! System is looking for matches.")
+                        # Preview for result cards, ready before anyone searches
+                        thumbnails.get_thumbnail(final_path)
+                        st.success("Report saved! System is looking for matches (see 'My Matches').")
                     else:
                         st.error("Processing failed. Try a different image.")
 
+def render_my_matches(user_obj):
+    """Precomputed candidates for the user's open reports (written by modules/matcher.py)."""
+    st.subheader("🔔 Matches for My Reports")
+    all_items = db.get_user_items(user_obj['id'], include_archived=True)
+    my_items = [item for item in all_items if item['status'] == lifecycle.OPEN and not item['archived']]
+    if not my_items:
+        st.caption("You have no open reports.")
+
+    for item in my_items:
+        with st.expander(f"{item['type']}: {item['category']} (#{item['id']})", expanded=True):
+            render_status_actions(item, user_obj['id'])
+            matches = db.get_matches(item['id'], matcher.MATCH_TOP_K)
+            if not matches:
+                st.caption("No likely matches yet. New reports are checked every few seconds.")
+                continue
+            for match in matches:
+                col_img, col_info = st.columns([1, 4])
+                with col_img:
+                    thumb = thumbnails.get_thumbnail(match['image_path'])
+                    if thumb:
+                        st.image(thumb, use_container_width=True)
+                    else:
+                        st.text("No Img")
+                with col_info:
+                    st.markdown(f"**{match['category']}** ({match['type']}), confidence {match['score']:.1%}")
+                    st.write(match['description'])
+                    if st.button("Reveal Contact Info", key=f"match_contact_{item['id']}_{match['id']}"):
+                        st.success(f"📞 Contact: {match['contact_info']}")
+
+    # Claimed / closed / expired reports are no longer searched; expired ones can be renewed.
+    # Archived ones are listed read-only: their ids are gone from `items`.
+    inactive = [item for item in all_items if item['status'] != lifecycle.OPEN or item['archived']]
+    if inactive:
+        st.markdown("#### Claimed, closed & expired")
+        for item in inactive:
+            label = f"{item['status']}, archived" if item['archived'] else item['status']
+            st.write(f"{item['type']}: {item['category']} (#{item['id']}) - **{label}**")
+            if not item['archived']:
+                render_status_actions(item, user_obj['id'])
+
+def render_status_actions(item, user_id):
+    """Lifecycle buttons for one of the user's own reports."""
+    targets = lifecycle.allowed_transitions(item['status'])
+    if not targets:
+        return
+    for col, status in zip(st.columns(len(targets)), targets):
+        if col.button(STATUS_ACTIONS[status], key=f"status_{item['id']}_{status}"):
+            client = get_service_client()
+            if client:
+                # The service checks the token and that user_id owns the item.
+                try:
+                    client.change_status(item['id'], status, user_id)
+                    changed = True
+                except service_client.ServiceClientError as err:
+                    if err.status != 409:
+                        st.error(f"Status change failed: {err}")
+                        return
+                    changed = False
+            else:
+                changed = lifecycle.change_status(item['id'], status)
+            if changed:
+                st.rerun()
+            else:
+                st.warning("This report was updated elsewhere. Refresh to see its current status.")
+
+def render_metrics_panel():
+    """Per-stage latency (p50/p95 over the recent window) from modules/metrics.py."""
+    st.subheader("📈 Stage Timings")
+    snap = metrics.snapshot()
+    counters = snap.pop("counters")
+    if snap:
+        st.dataframe(
+            [{"stage": stage, "calls": s["count"], "p50 (ms)": round(s["p50_ms"], 2),
+              "p95 (ms)": round(s["p95_ms"], 2), "mean (ms)": round(s["mean_ms"], 2),
+              "total (s)": round(s["total_s"], 2)} for stage, s in snap.items()],
+            use_container_width=True, hide_index=True
+        )
+    else:
+        st.caption("Nothing recorded yet in this server process.")
+    if counters:
+        st.caption(" · ".join(f"{name}: {value}" for name, value in counters.items()))
+
+    c1, c2, c3 = st.columns(3)
+    if c1.button("Profile next search"):
+        st.session_state['profile_next_search'] = True
+        st.toast("The next 'Analyze Matches' will be profiled.")
+    if c2.button("Write Prometheus file"):
+        path = metrics.write_prometheus(metrics.METRICS_FILE or os.path.join("data", "metrics.prom"))
+        st.success(f"Written to {path}")
+    if c3.button("Reset timings"):
+        metrics.reset()
+        st.rerun()
+    with st.expander("Prometheus text"):
+        st.code(metrics.to_prometheus(), language="text")
+
 def render_search_engine(user_obj):
     st.subheader("🔍 Intelligent Search")
     
@@ -181,10 +357,16 @@ def render_search_engine(user_obj):
     
     target_db = "FOUND" if "lost" in search_context else "LOST"
     
-    # Fetch DB Candidates
-    db_items = db.get_candidates(target_db)
+    # Candidate pool lives in the warm in-memory index (in this process or behind the service)
+    client = get_service_client()
+    search_index = None if client else get_search_index()
     
-    if not db_items:
+    try:
+        pool_size = (client or search_index).count(target_db)
+    except service_client.ServiceClientError as err:
+        st.error(f"Matching service unavailable: {err}")
+        return
+    if not pool_size:
         st.warning(f"The '{target_db}' database is currently empty.")
         return
 
@@ -192,84 +374,122 @@ def render_search_engine(user_obj):
     c1, c2 = st.columns(2)
     q_txt = c1.text_input("Keyword Search")
     q_img = c2.file_uploader("Visual Search (Image)", type=["jpg", "png", "jpeg"])
+    q_cat = c1.selectbox("Category", [CATEGORY_AUTO] + ITEM_CATEGORIES)
     
     run_search = st.button("Analyze Matches")
 
     if run_search:
-        st.divider()
-        scored_results = []
-        
-        # Vectorize queries
-        q_txt_vec = features.extract_text_vector(q_txt) if q_txt else None
-        q_vis_vec = None
-        if q_img:
-             path_temp = process_image_upload(q_img)
-             q_vis_vec = features.extract_visual_vector(path_temp)
-
-        # Scoring Logic
-        for row in db_items:
-            final_score = 0.0
-            
-            # Case 1: Hybrid
-            if q_txt_vec is not None and q_vis_vec is not None:
-                final_score = features.calculate_hybrid_score(
-                    q_vis_vec, row['features_color'], 
-                    q_txt_vec, row['features_text']
-                )
-            # Case 2: Text only
-            elif q_txt_vec is not None:
-                final_score = features.get_text_similarity(q_txt_vec, row['features_text'])
-            # Case 3: Image only
-            elif q_vis_vec is not None:
-                final_score = features.get_visual_similarity(q_vis_vec, row['features_color'])
-            
-            # Filter low relevance
-            if final_score > 0.01:
-                scored_results.append((final_score, row))
-        
-        # Sort descending
-        scored_results.sort(key=lambda x: x[0], reverse=True)
-        
-        if not scored_results:
-            st.caption("No relevant matches found.")
+        # The admin panel can arm a one-shot profile of the next search.
+        profiling = st.session_state.pop('profile_next_search', False)
+        with metrics.profile("search", enabled=profiling) as captured, metrics.timer("app.search"):
+            run_query(search_index, target_db, q_txt, q_img, q_cat)
+        if captured.path:
+            st.caption(f"Profile written to {captured.path}")
+
+    last_search = st.session_state.get('search_results')
+    if last_search and last_search["target"] == target_db:
+        with metrics.timer("app.render_results"):
+            render_results(search_index, last_search)
+
+def run_query(search_index, target_db, q_txt, q_img, q_cat):
+    """Scores the query and keeps the results in session state (see render_results)."""
+    selected = None if q_cat == CATEGORY_AUTO else q_cat
+    client = get_service_client()
+    if client:
+        try:
+            scored_results, searched = client.search(target_db, q_txt, q_img, selected, k=MAX_RESULTS)
+        except service_client.ServiceClientError as err:
+            st.error(f"Search failed: {err}")
             return
+        _keep_results(target_db, q_txt, scored_results, searched)
+        return
+
+    # Vectorize queries
+    q_txt_vec = features.extract_text_vector(q_txt) if q_txt else None
+    q_vis_vec = None
+    ranking = None
+    if q_img:
+         # Query images are analysed in memory (memoized by content hash); nothing is written to disk
+         _, q_analysis = image_store.analyze(q_img, predict=(q_cat == CATEGORY_AUTO))
+         if q_analysis:
+             q_vis_vec = q_analysis["vector"]
+             ranking = q_analysis["ranking"]
+
+    # Scoring Logic: predicted/selected category first, widening only if too few hits
+    tiers = search.category_tiers(selected, ranking)
+    scored_results, searched = search_index.search_by_category(
+        target_db, q_vis_vec, q_txt_vec, k=MAX_RESULTS, tiers=tiers
+    )
+    _keep_results(target_db, q_txt, scored_results, searched)
 
-        st.write(f"**{len(scored_results)}** Matches Detected:")
+def _keep_results(target_db, q_txt, scored_results, searched):
+    # Kept across reruns, so paging and "Reveal Contact Info" do not re-run the search
+    st.session_state['search_results'] = {
+        "target": target_db, "query": q_txt, "results": scored_results, "searched": searched
+    }
+    st.session_state['results_page'] = 1
+
+def render_results(search_index, last_search):
+    """One page of result cards (thumbnails only), so page weight is bounded by RESULTS_PER_PAGE."""
+    st.divider()
+    scored_results, q_txt = last_search["results"], last_search["query"]
+    if last_search["searched"] is not None:
+        st.caption(f"Searched categories: {', '.join(last_search['searched'])}")
+
+    if not scored_results:
+        st.caption("No relevant matches found.")
+        return
+
+    st.write(f"**{len(scored_results)}** Matches Detected:")
+    n_pages = (len(scored_results) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1, key="results_page")
+    page_results = scored_results[(page - 1) * RESULTS_PER_PAGE:page * RESULTS_PER_PAGE]
+
+    # Keyword explanations for the visible results in one pass over the stored text matrix
+    keywords = {}
+    if q_txt and search_index is not None:
+        keywords = search_index.explain_keywords(
+            last_search["target"], q_txt, [data['id'] for _, data in page_results]
+        )
+    
+    for score, data in page_results:
+        # Determine visual indicator color
+        indicator = "🟢" if score > 0.75 else "🟡" if score > 0.45 else "🔴"
         
-        for score, data in scored_results:
-            # Determine visual indicator color
-            indicator = "🟢" if score > 0.75 else "🟡" if score > 0.45 else "🔴"
+        with st.container(border=True):
+            col_img, col_info = st.columns([1, 4])
             
-            with st.container(border=True):
-                col_img, col_info = st.columns([1, 4])
+            with col_img:
+                thumb = thumbnails.get_thumbnail(data['image_path'])
+                if thumb:
+                    st.image(thumb, use_container_width=True)
+                else:
+                    st.text("No Img")
+            
+            with col_info:
+                st.markdown(f"### {indicator} {data['category']}")
+                st.caption(f"Match Confidence: {score:.1%}")
+                st.write(f"**Details:** {data['description']}")
                 
-                with col_img:
-                    if os.path.exists(data['image_path']):
-                        st.image(data['image_path'], use_container_width=True)
-                    else:
-                        st.text("No Img")
+                # Explainability
+                if q_txt:
+                    hits = data.get('keywords') or keywords.get(data['id'])
+                    if hits:
+                        st.write(f"**Keywords:** {', '.join(hits)}")
                 
-                with col_info:
-                    st.markdown(f"### {indicator} {data['category']}")
-                    st.caption(f"Match Confidence: {score:.1%}")
-                    st.write(f"**Details:** {data['description']}")
-                    
-                    # Explainability
-                    if q_txt:
-                        hits = features.explain_text_match(q_txt, data['description'])
-                        if hits:
-                            st.write(f"**Keywords:** {', '.join(hits)}")
-                    
-                    # Claim Button
-                    btn_key = f"claim_btn_{data['id']}"
-                    if st.button("Reveal Contact Info", key=btn_key):
-                        st.success(f"📞 Contact: {data['contact_info']}")
+                # Claim Button
+                btn_key = f"claim_btn_{data['id']}"
+                if st.button("Reveal Contact Info", key=btn_key):
+                    st.success(f"📞 Contact: {data['contact_info']}")
 
 # ==========================
 # MAIN ENTRY POINT
 # ==========================
 def main():
     db.init_db()
+    start_background_services()
     if st.session_state['current_user']:
         view_dashboard()
     else:
@@ -1,16 +1,24 @@
 # File: database_seeder.py
 # Description: Automated script to ingest raw images, generate metadata, 
 #              and populate the SQL database for testing.
+#              Extraction runs in a process pool; one writer batches inserts
+#              and records a checkpoint so interrupted runs resume cleanly.
 # Updated: Refactored for modularity and distinct logic flow.
 
 import os
+import json
+import time
 import shutil
 import random
-from modules import db, features, auth
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from modules import db, features, auth, thumbnails
 
 # --- PATH CONFIGURATION ---
 RAW_INPUT_DIR = "data/raw_dataset"
 FINAL_IMG_DIR = "data/uploaded_images"
+CHECKPOINT_FILE = "data/seed_checkpoint.json"
+CHUNK_SIZE = 256  # rows per insert transaction
 
 # --- DATASET DEFINITIONS ---
 # List of recognized item classes
@@ -44,8 +52,18 @@ def generate_description(category):
     place = random.choice(ATTR_SPOTS)
     return f"{category} detected. Color: {color}. Last seen area: {place}."
 
-def process_artifact(file_path, filename, root_folder, admin_id):
-    """Handles the processing of a single image file."""
+def target_path_for(filename, root_folder):
+    """Destination path of a raw image inside FINAL_IMG_DIR."""
+    folder_name = os.path.basename(root_folder)
+    return os.path.join(FINAL_IMG_DIR, f"auto_{folder_name}_{filename}")
+
+def process_artifact(job):
+    """
+    Handles the processing of a single image file (runs inside a worker process).
+    job: (file_path, filename, root_folder)
+    Returns (source_path, row_or_None, message); the row is committed by the writer.
+    """
+    file_path, filename, root_folder = job
     try:
         # 1. Infer Category from folder name
         folder_name = os.path.basename(root_folder)
@@ -57,8 +75,7 @@ def process_artifact(file_path, filename, root_folder, admin_id):
                 break
         
         # 2. Prepare Destination
-        new_filename = f"auto_{folder_name}_{filename}"
-        target_path = os.path.join(FINAL_IMG_DIR, new_filename)
+        target_path = target_path_for(filename, root_folder)
         
         # 3. Copy File
         shutil.copy(file_path, target_path)
@@ -66,28 +83,53 @@ def process_artifact(file_path, filename, root_folder, admin_id):
         # 4. Generate Metadata & Vectors
         desc_text = generate_description(detected_label)
         
-        # Calls to ML modules
-        vec_visual = features.extract_visual_vector(target_path)
+        # Calls to ML modules (decode straight from the source file)
+        vec_visual = features.extract_visual_vector(file_path)
         vec_text = features.extract_text_vector(desc_text)
+        # Result-card preview, so the first search does not have to render it
+        thumbnails.get_thumbnail(target_path)
         
-        # 5. Commit to DB
+        # 5. Hand the row to the single DB writer
         if vec_visual is not None:
-            db.add_item(
-                user_id=admin_id,
-                item_type="FOUND",
-                category=detected_label,
-                description=desc_text,
-                image_path=target_path,
-                features_col=vec_visual,
-                features_txt=vec_text
-            )
-            return True, detected_label
-        return False, "Vector Extraction Failed"
+            row = ("FOUND", detected_label, desc_text, target_path, vec_visual, vec_text)
+            return file_path, row, detected_label
+        return file_path, None, "Vector Extraction Failed"
 
     except Exception as ex:
-        return False, str(ex)
+        return file_path, None, str(ex)
+
+# ==========================
+# CHECKPOINTING
+# ==========================
+
+def load_checkpoint():
+    """Source paths already committed by a previous (possibly interrupted) run."""
+    if not os.path.exists(CHECKPOINT_FILE):
+        return set()
+    with open(CHECKPOINT_FILE, "r") as f:
+        return set(json.load(f).get("done", []))
+
+def save_checkpoint(done):
+    """Atomic write: a crash mid-save never leaves a truncated checkpoint."""
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+def collect_jobs():
+    jobs = []
+    for root, _, files in os.walk(RAW_INPUT_DIR):
+        for f_name in sorted(files):
+            # Filter valid image extensions
+            if f_name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                jobs.append((os.path.join(root, f_name), f_name, root))
+    return jobs
+
+# ==========================
+# BULK INGESTION
+# ==========================
 
-def populate_database():
+def populate_database(workers=None, chunk_size=CHUNK_SIZE, restart=False):
     print(">>> INITIALIZING DATA INGESTION <<<")
     
     # Setup DB
@@ -104,24 +146,56 @@ def populate_database():
     # Get Admin ID
     admin_id = get_or_create_admin()
     
-    total_indexed = 0
+    # Resume: skip anything the checkpoint OR the DB already has. The DB check
+    # covers a crash between a chunk's commit and its checkpoint write.
+    done = set() if restart else load_checkpoint()
+    existing_paths = db.get_item_paths(admin_id)
+    jobs = [
+        job for job in collect_jobs()
+        if job[0] not in done and target_path_for(job[1], job[2]) not in existing_paths
+    ]
+    skipped = len(done)
+    if skipped:
+        print(f"[*] Resuming: {skipped} images already ingested, {len(jobs)} to go.")
     
-    # Recursive Walk
-    for root, _, files in os.walk(RAW_INPUT_DIR):
-        for f_name in files:
-            # Filter valid image extensions
-            if f_name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                full_source_path = os.path.join(root, f_name)
-                
-                success, msg = process_artifact(full_source_path, f_name, root, admin_id)
-                
-                if success:
-                    print(f"   [OK] Indexed: {msg}")
-                    total_indexed += 1
-                else:
-                    print(f"   [ERR] Failed {f_name}: {msg}")
-
-    print(f"\n>>> PROCESS COMPLETE. Total Items Seeded: {total_indexed} <<<")
+    total_indexed = 0
+    pending_rows, pending_sources = [], []
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal total_indexed
+        db.add_items_bulk((admin_id,) + row for row in pending_rows)
+        done.update(pending_sources)
+        save_checkpoint(done)
+        total_indexed += len(pending_rows)
+        elapsed = time.perf_counter() - start
+        print(f"   [OK] Committed {total_indexed}/{len(jobs)} "
+              f"({total_indexed / elapsed:.1f} images/sec)")
+        pending_rows.clear()
+        pending_sources.clear()
+
+    # Feature extraction fans out across processes; this process is the only writer.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for source, row, msg in pool.map(process_artifact, jobs, chunksize=8):
+            if row is None:
+                print(f"   [ERR] Failed {os.path.basename(source)}: {msg}")
+                continue
+            pending_rows.append(row)
+            pending_sources.append(source)
+            if len(pending_rows) >= chunk_size:
+                flush()
+        if pending_rows:
+            flush()
+
+    elapsed = time.perf_counter() - start
+    rate = total_indexed / elapsed if elapsed > 0 else 0.0
+    print(f"\n>>> PROCESS COMPLETE. Total Items Seeded: {total_indexed} "
+          f"in {elapsed:.1f}s ({rate:.1f} images/sec) <<<")
 
 if __name__ == "__main__":
-    populate_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bulk-ingest data/raw_dataset into the database.")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per insert transaction")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint file")
+    args = parser.parse_args()
+    populate_database(workers=args.workers, chunk_size=args.chunk_size, restart=args.restart)
\ No newline at end of file
@@ -0,0 +1,96 @@
+# File: evaluation/ann_recall.py
+# Purpose: Verifies the approximate (IVF) visual search against exact brute force.
+# Reports recall@k and per-query latency for several n_probe settings on the same data.
+# Usage: python evaluation/ann_recall.py            (synthetic clustered vectors)
+#        python evaluation/ann_recall.py --db       (real FOUND vectors from data/campus.db)
+#        [--items 100000] [--queries 200] [--k 10] [--probes 1,2,4,8,16,32,64] [--repeat 1]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules import ann, db, search
+
+# Benchmark Configuration
+NUM_ITEMS = 100000
+NUM_CLUSTERS = 14          # roughly one per item category
+VECTOR_DIM = 64 + 1764     # color histogram + HOG
+NUM_QUERIES = 200
+TOP_K = 10
+PROBE_SETTINGS = [1, 2, 4, 8, 16, 32, 64]
+
+def synthetic_vectors(n, seed=7, latent_dim=48):
+    """
+    Non-negative vectors shaped like the real Color+HOG layout: a low-rank
+    signal (one cluster per category) plus small per-item noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, (NUM_CLUSTERS, latent_dim)).astype(np.float32)
+    basis = rng.random((latent_dim, VECTOR_DIM), dtype=np.float32)
+    labels = rng.integers(0, NUM_CLUSTERS, n)
+    latent = centers[labels] + rng.normal(0, 0.7, (n, latent_dim)).astype(np.float32)
+    noise = rng.random((n, VECTOR_DIM), dtype=np.float32) * 0.1
+    return search.normalize_rows(np.maximum(latent @ basis, 0) + noise)
+
+def database_vectors():
+    rows = db.get_candidates("FOUND")
+    return search.stack_vectors([search.as_vector(r['features_color']) for r in rows])
+
+def exact_top_k(matrix, q_unit, k):
+    return set(search.top_k(matrix @ q_unit, k, min_score=-np.inf).tolist())
+
+def run_benchmark(matrix, num_queries=NUM_QUERIES, k=TOP_K, probes=PROBE_SETTINGS, repeat=1):
+    n = matrix.shape[0]
+    num_queries = min(num_queries, n)
+    rng = np.random.default_rng(11)
+    # Queries are perturbed copies of stored items, like a second photo of the same object.
+    picks = rng.choice(n, num_queries, replace=False)
+    queries = search.normalize_rows(matrix[picks] + rng.normal(0, 0.01, (num_queries, matrix.shape[1])).astype(np.float32))
+
+    start = time.perf_counter()
+    truth = [exact_top_k(matrix, q, k) for q in queries]
+    exact_ms = (time.perf_counter() - start) / num_queries * 1000
+    print(f"--- {n} items, dim {matrix.shape[1]}, recall@{k} vs exact ---")
+    print(f"Exact brute force:            {exact_ms:7.2f} ms/query")
+
+    start = time.perf_counter()
+    ivf = ann.IVFIndex().build(matrix)
+    print(f"IVF build ({ivf.centroids.shape[0]} lists):       {time.perf_counter() - start:7.2f} s")
+
+    for n_probe in probes:
+        times = []
+        for _ in range(repeat):
+            hits = 0
+            start = time.perf_counter()
+            for q, expected in zip(queries, truth):
+                cand = ivf.candidates(q, k, n_probe)
+                scores = matrix[cand] @ q
+                found = cand[search.top_k(scores, k, min_score=-np.inf)]
+                hits += len(expected & set(found.tolist()))
+            times.append(time.perf_counter() - start)
+        ms = float(np.median(times)) / num_queries * 1000
+        recall = hits / (num_queries * k)
+        print(f"n_probe={n_probe:<3} recall@{k}={recall:6.3f}   {ms:7.2f} ms/query")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IVF recall@k and latency vs. exact visual search.")
+    parser.add_argument("--db", action="store_true", help="use the FOUND vectors in data/campus.db")
+    parser.add_argument("--items", type=int, default=NUM_ITEMS, help="synthetic pool size (ignored with --db)")
+    parser.add_argument("--queries", type=int, default=NUM_QUERIES)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--probes", default=",".join(map(str, PROBE_SETTINGS)),
+                        help="comma-separated n_probe settings")
+    parser.add_argument("--repeat", type=int, default=1, help="timing runs per setting (median reported)")
+    args = parser.parse_args()
+
+    if args.db:
+        vectors = database_vectors()
+        if len(vectors) < args.k:
+            print("[ERROR] Not enough FOUND items in the database. Run database_seeder.py first.")
+            sys.exit(1)
+    else:
+        vectors = synthetic_vectors(args.items)
+    run_benchmark(vectors, args.queries, args.k, [int(p) for p in args.probes.split(",")], max(1, args.repeat))
@@ -0,0 +1,132 @@
+# File: evaluation/classifier_benchmark.py
+# Purpose: Compares the pickled Random Forest with its compact export (modules/forest.py).
+# Reports per format, each loaded in a fresh interpreter: file size, load time, RSS growth,
+#         single-image and batch predict latency; plus label agreement / max probability
+#         difference against the pickle (optionally for a depth-limited export too).
+# Usage: python evaluation/classifier_benchmark.py [--runs 3] [--max-depth 12] [--json results.json]
+#        Uses modules/category_classifier.pkl; without one, a stand-in forest is trained
+#        on synthetic vectors of the real feature size so the numbers stay comparable.
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import forest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PICKLE_PATH = os.path.join(PROJECT_DIR, "modules", "category_classifier.pkl")
+INPUT_DIM = 1828        # 64 colour bins + 1764 HOG values
+BATCH = 64
+REPEATS = 30
+
+LOAD_AND_PREDICT = """
+import time, sys, pickle, numpy as np
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+X = np.load({x_path!r})
+from modules import forest
+import sklearn.ensemble  # imported up front so only the model itself is timed/measured
+before = rss_kb()
+start = time.perf_counter()
+if {compact}:
+    model = forest.load_forest({path!r})
+else:
+    with open({path!r}, "rb") as f:
+        model = pickle.load(f)
+load_ms = (time.perf_counter() - start) * 1000
+model.predict_proba(X[:1])  # first call allocates scratch buffers
+loaded_kb = rss_kb() - before
+def timed(rows):
+    start = time.perf_counter()
+    for _ in range({repeats}):
+        model.predict_proba(rows)
+    return (time.perf_counter() - start) * 1000 / {repeats}
+print(load_ms, loaded_kb, timed(X[:1]), timed(X[:{batch}]))
+"""
+
+def stand_in_model():
+    from sklearn.ensemble import RandomForestClassifier
+    rng = np.random.default_rng(101)
+    X = rng.random((800, INPUT_DIM)).astype(np.float32)
+    y = np.array(["Bag", "Keys", "Laptop", "Mouse"])[(X[:, :40].sum(axis=1) * 3).astype(int) % 4]
+    return RandomForestClassifier(n_estimators=200, n_jobs=-1, random_state=101).fit(X, y)
+
+def measure(path, compact, x_path):
+    code = LOAD_AND_PREDICT.format(path=path, compact=compact, x_path=x_path,
+                                   repeats=REPEATS, batch=BATCH)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR,
+                          capture_output=True, text=True, check=True)
+    return [float(v) for v in proc.stdout.split()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pickle vs. compact classifier benchmark.")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per format (median reported)")
+    parser.add_argument("--max-depth", type=int, help="also benchmark an export truncated at this depth")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    if os.path.exists(PICKLE_PATH):
+        pickle_path = PICKLE_PATH
+        with open(pickle_path, "rb") as f:
+            model = pickle.load(f)
+        print(f"Model: {PICKLE_PATH}")
+    else:
+        model = stand_in_model()
+        pickle_path = os.path.join(work_dir, "stand_in.pkl")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(model, f)
+        print("Model: no trained classifier found, using a stand-in RF(200) on synthetic vectors")
+
+    rng = np.random.default_rng(7)
+    X = rng.random((BATCH, model.n_features_in_)).astype(np.float32)
+    x_path = os.path.join(work_dir, "queries.npy")
+    np.save(x_path, X)
+    reference = model.predict_proba(X)
+
+    variants = [("pickle", pickle_path, False, None)]
+    for depth in (None, args.max_depth) if args.max_depth else (None,):
+        name = "compact" if depth is None else f"compact (depth<={depth})"
+        path = os.path.join(work_dir, f"model_{depth or 'full'}.lfrf")
+        forest.export_forest(model, path, max_depth=depth)
+        variants.append((name, path, True, depth))
+
+    print(f"\n{'format':<22}{'size KB':>10}{'load ms':>10}{'RSS MB':>9}{'1 img ms':>10}"
+          f"{f'{BATCH} imgs ms':>12}{'agree %':>9}{'max |dp|':>10}")
+    results, failed = {}, False
+    for name, path, compact, depth in variants:
+        runs = np.array([measure(path, compact, x_path) for _ in range(args.runs)])
+        load_ms, rss_kb, one_ms, batch_ms = np.median(runs, axis=0)
+        if compact:
+            proba = forest.load_forest(path).predict_proba(X)
+            agree = float(np.mean(np.argmax(proba, 1) == np.argmax(reference, 1)) * 100)
+            max_diff = float(np.abs(proba - reference).max())
+            # The full export must be lossless; truncated ones are allowed to differ.
+            if depth is None and (agree < 100 or max_diff > 1e-5):
+                failed = True
+        else:
+            agree, max_diff = 100.0, 0.0
+        size_kb = os.path.getsize(path) / 1024
+        print(f"{name:<22}{size_kb:>10.0f}{load_ms:>10.1f}{rss_kb / 1024:>9.1f}{one_ms:>10.2f}"
+              f"{batch_ms:>12.2f}{agree:>9.1f}{max_diff:>10.1e}")
+        results[name] = {"size_kb": size_kb, "load_ms": float(load_ms), "rss_mb": float(rss_kb / 1024),
+                         "predict_1_ms": float(one_ms), f"predict_{BATCH}_ms": float(batch_ms),
+                         "agreement_pct": agree, "max_proba_diff": max_diff}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[OK] Results written to {args.json}")
+
+    if failed:
+        print("[FAIL] Compact export does not reproduce the pickled model's predictions")
+        sys.exit(1)
+    print("[OK] Compact export reproduces the pickled model's predictions")
@@ -0,0 +1,139 @@
+# File: evaluation/hog_benchmark.py
+# Purpose: Compares the HOG extractors in modules/features.py against the skimage reference.
+# Reports: per-image extraction time + speedup, worst-case cosine similarity to the reference,
+#          and (when data/raw_dataset exists) classifier accuracy per extractor.
+# Exits with status 1 if an extractor tagged with the reference feature version deviates
+# from it, or if any extractor's accuracy drops by more than ACCURACY_TOLERANCE.
+# Usage: python evaluation/hog_benchmark.py [--images 40] [--max-images 1500] [--repeat 1]
+#                                           [--extractors skimage,opencv,opencv-area] [--no-accuracy]
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules import features
+
+# Benchmark Configuration
+RAW_DATA_DIR = "data/raw_dataset"
+MAX_IMAGES = 1500            # per accuracy run (keeps the benchmark under a few minutes)
+NUM_SYNTHETIC = 40
+REFERENCE = "skimage"
+# "Same version" extractors may only differ by float tie-breaks (a pixel whose
+# gradient sits exactly on an orientation-bin edge), so compare per-image cosine.
+EQUIVALENCE_MIN_COSINE = 0.999
+ACCURACY_TOLERANCE = 0.02     # allowed absolute drop in validation accuracy
+
+def load_dataset(max_images=MAX_IMAGES):
+    """Returns [(path, label)] from the training dataset, or [] if it is missing."""
+    samples = []
+    if not os.path.exists(RAW_DATA_DIR):
+        return samples
+    for dir_path, _, filenames in os.walk(RAW_DATA_DIR):
+        for fname in sorted(filenames):
+            if fname.lower().endswith(('.jpg', '.jpeg', '.png')):
+                samples.append((os.path.join(dir_path, fname), os.path.basename(dir_path)))
+    rng = np.random.default_rng(101)
+    rng.shuffle(samples)
+    return samples[:max_images]
+
+def synthetic_images(count=NUM_SYNTHETIC):
+    """Smooth random photos of varied sizes (used when no dataset is available)."""
+    import cv2
+    rng = np.random.default_rng(5)
+    images = []
+    for _ in range(count):
+        h, w = rng.integers(200, 900, 2)
+        noise = (rng.random((h, w, 3)) * 255).astype(np.uint8)
+        images.append(cv2.GaussianBlur(noise, (0, 0), 3))
+    return images
+
+def time_extractor(images, extractor, repeat=1):
+    """(vectors, median ms per image over `repeat` passes)."""
+    times = []
+    for _ in range(repeat):
+        vectors = []
+        start = time.perf_counter()
+        for img in images:
+            vectors.append(features.get_hog_features(img, extractor))
+        times.append((time.perf_counter() - start) / len(images) * 1000)
+    return np.array(vectors), float(np.median(times))
+
+def compare_speed_and_equivalence(images, extractors, repeat=1):
+    print(f"--- HOG extractors on {len(images)} images (reference: {REFERENCE}) ---")
+    reference, ref_ms = time_extractor(images, REFERENCE, repeat)
+    ok = True
+    for extractor in extractors:
+        version = features.HOG_EXTRACTORS[extractor]
+        vectors, ms = time_extractor(images, extractor, repeat)
+        cosines = np.sum(vectors * reference, axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1) + 1e-12
+        )
+        worst = float(cosines.min())
+        same_version = version == features.HOG_EXTRACTORS[REFERENCE]
+        status = ""
+        if same_version and worst < EQUIVALENCE_MIN_COSINE:
+            status = "  [FAIL: must match reference]"
+            ok = False
+        print(f"{extractor:<12} v{version}  {ms:8.2f} ms/img  speedup x{ref_ms / ms:5.1f}  "
+              f"min cosine={worst:.6f}{status}")
+    return ok
+
+def compare_accuracy(samples, extractors):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+
+    print(f"--- Classifier accuracy on {len(samples)} dataset images ---")
+    images = [features.decode_image(path) for path, _ in samples]
+    keep = [i for i, img in enumerate(images) if img is not None]
+    images = [images[i] for i in keep]
+    labels = np.array([samples[i][1] for i in keep])
+    colors = np.array([features.get_raw_color_hist(img) for img in images])
+
+    accuracies = {}
+    for extractor in dict.fromkeys([REFERENCE, *extractors]):
+        hogs, _ = time_extractor(images, extractor)
+        X = np.hstack([colors, hogs])
+        X_train, X_val, y_train, y_val = train_test_split(X, labels, test_size=0.25, random_state=101)
+        model = RandomForestClassifier(n_estimators=100, n_jobs=-1, random_state=101)
+        model.fit(X_train, y_train)
+        accuracies[extractor] = model.score(X_val, y_val)
+
+    ok = True
+    for extractor, acc in accuracies.items():
+        drop = accuracies[REFERENCE] - acc
+        status = "" if drop <= ACCURACY_TOLERANCE else "  [FAIL: accuracy dropped]"
+        ok = ok and not status
+        print(f"{extractor:<12} accuracy={acc * 100:6.2f}%  (vs reference {-drop * 100:+.2f} pts){status}")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HOG extractor speed, equivalence and accuracy.")
+    parser.add_argument("--images", type=int, default=NUM_SYNTHETIC, help="images timed per extractor")
+    parser.add_argument("--max-images", type=int, default=MAX_IMAGES, help="dataset images for the accuracy run")
+    parser.add_argument("--repeat", type=int, default=1, help="timing passes per extractor (median reported)")
+    parser.add_argument("--extractors", default=",".join(features.HOG_EXTRACTORS),
+                        help="comma-separated, compared against the skimage reference")
+    parser.add_argument("--no-accuracy", action="store_true", help="skip the classifier accuracy run")
+    args = parser.parse_args()
+    extractors = args.extractors.split(",")
+    unknown = set(extractors) - set(features.HOG_EXTRACTORS)
+    if unknown:
+        parser.error(f"unknown extractors {sorted(unknown)}; choose from {sorted(features.HOG_EXTRACTORS)}")
+
+    dataset = load_dataset(args.max_images)
+    if dataset:
+        bench_images = [features.decode_image(path) for path, _ in dataset[:args.images]]
+        bench_images = [img for img in bench_images if img is not None]
+    else:
+        print(f"[INFO] '{RAW_DATA_DIR}' not found: timing on synthetic images, skipping accuracy.")
+        bench_images = synthetic_images(args.images)
+
+    passed = compare_speed_and_equivalence(bench_images, extractors, max(1, args.repeat))
+    if dataset and not args.no_accuracy:
+        passed = compare_accuracy(dataset, extractors) and passed
+
+    print("[SUCCESS] All extractors within tolerance." if passed else "[ERROR] Tolerance exceeded.")
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,138 @@
+# File: evaluation/kdf_benchmark.py
+# Purpose: Picks the password-hashing cost (modules/auth.py) for a target login rate.
+# Reports: 1) time per hash for each candidate scrypt N / PBKDF2 iteration count and the
+#             logins/sec that gives with the given number of cores,
+#          2) the most expensive setting that still serves --target-qps at --headroom,
+#          3) the login path end to end on a scratch database: first login of a legacy
+#             SHA-256 account (verify + transparent re-hash), a regular login, a failed one,
+#             and the dashboard's cached user lookup vs. a direct SQLite read.
+# Usage: python evaluation/kdf_benchmark.py [--target-qps 20] [--cores N] [--headroom 0.5]
+#                                           [--runs 5] [--json results.json]
+# Apply the result with LF_PASSWORD_KDF / LF_SCRYPT_N / LF_PBKDF2_ITERATIONS.
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules import auth, db
+
+SCRYPT_COSTS = [2 ** 12, 2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16]
+PBKDF2_COSTS = [100000, 200000, 400000, 600000, 1000000]
+LOOKUPS = 2000
+
+def median_ms(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+def measure_costs(runs):
+    """[{kdf, cost, ms, memory_mb}] for every candidate setting."""
+    salt = os.urandom(auth.SALT_BYTES)
+    results = []
+    if hasattr(hashlib, "scrypt"):
+        for n in SCRYPT_COSTS:
+            ms = median_ms(lambda: auth._derive("benchmark", "scrypt", (n, auth.SCRYPT_R, auth.SCRYPT_P), salt), runs)
+            results.append({"kdf": "scrypt", "cost": n, "ms": ms, "memory_mb": 128 * n * auth.SCRYPT_R / 2 ** 20})
+    for iterations in PBKDF2_COSTS:
+        ms = median_ms(lambda: auth._derive("benchmark", "pbkdf2_sha256", (iterations,), salt), runs)
+        results.append({"kdf": "pbkdf2_sha256", "cost": iterations, "ms": ms, "memory_mb": 0.0})
+    return results
+
+def recommend(results, target_qps, cores, headroom):
+    """Most expensive setting per KDF whose login rate at `headroom` of the cores meets the target."""
+    picks = {}
+    for r in results:
+        r["logins_per_s"] = cores * 1000 / r["ms"]
+        if r["logins_per_s"] * headroom >= target_qps:
+            best = picks.get(r["kdf"])
+            if best is None or r["cost"] > best["cost"]:
+                picks[r["kdf"]] = r
+    return picks
+
+def measure_login_path(runs):
+    """Login and lookup latencies on a scratch database with the current auth settings."""
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="lf_kdf_"), "auth.db")
+    db.init_db()
+    legacy_id = db.add_user("legacy", hashlib.sha256(b"old secret").hexdigest(), "legacy@example.com")
+    auth.register_user("current", "new secret", "current@example.com")
+    auth.clear_cache()
+
+    start = time.perf_counter()
+    upgraded = auth.login_user("legacy", "old secret")
+    legacy_ms = (time.perf_counter() - start) * 1000
+    stored = db.get_user_by_id(legacy_id)['password_hash']
+    out = {
+        "legacy_login_ms": legacy_ms,
+        "legacy_rehashed": bool(upgraded) and stored.startswith(auth.KDF + "$"),
+        "login_ms": median_ms(lambda: auth.login_user("current", "new secret"), runs),
+        "failed_login_ms": median_ms(lambda: auth.login_user("nobody", "guess"), runs),
+        "session_safe": upgraded is not None and "password_hash" not in upgraded,
+    }
+    auth.get_user(legacy_id)
+    start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        auth.get_user(legacy_id)
+    out["cached_lookup_us"] = (time.perf_counter() - start) / LOOKUPS * 1e6
+    start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        db.get_user_by_id(legacy_id)
+    out["db_lookup_us"] = (time.perf_counter() - start) / LOOKUPS * 1e6
+
+    # Lockout after MAX_FAILED_LOGINS, even with the right password.
+    for _ in range(auth.MAX_FAILED_LOGINS):
+        auth.login_user("current", "wrong")
+    out["locked_out"] = auth.login_user("current", "new secret") is None and auth.lockout_remaining("current") > 0
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password KDF cost vs. login throughput.")
+    parser.add_argument("--target-qps", type=float, default=20.0, help="peak logins/sec to sustain")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1, help="cores available for logins")
+    parser.add_argument("--headroom", type=float, default=0.5, help="share of those cores logins may use")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    print(f"--- KDF cost ({args.cores} cores, target {args.target_qps:g} logins/s at {args.headroom:.0%}) ---")
+    results = measure_costs(args.runs)
+    picks = recommend(results, args.target_qps, args.cores, args.headroom)
+    current = {("scrypt", auth.SCRYPT_N), ("pbkdf2_sha256", auth.PBKDF2_ITERATIONS)}
+    for r in results:
+        mark = " <- current" if (r["kdf"], r["cost"]) in current else ""
+        mark += " <- recommended" if picks.get(r["kdf"]) is r else ""
+        print(f"{r['kdf']:<14}{r['cost']:>9}  {r['ms']:8.1f} ms  {r['memory_mb']:6.0f} MB  "
+              f"{r['logins_per_s']:8.1f} logins/s{mark}")
+    if not picks:
+        print("[WARN] No candidate meets the target; add cores or lower the cost range.")
+
+    print(f"\n--- Login path ({auth.KDF}, current settings) ---")
+    path = measure_login_path(args.runs)
+    print(f"legacy SHA-256 login + re-hash {path['legacy_login_ms']:8.1f} ms")
+    print(f"login                          {path['login_ms']:8.1f} ms")
+    print(f"failed login (unknown user)    {path['failed_login_ms']:8.1f} ms")
+    print(f"dashboard user lookup          {path['cached_lookup_us']:8.1f} us cached, "
+          f"{path['db_lookup_us']:.1f} us from SQLite")
+
+    checks = {
+        "legacy hash upgraded on login": path["legacy_rehashed"],
+        "session user carries no password hash": path["session_safe"],
+        "locked out after repeated failures": path["locked_out"],
+    }
+    for name, ok in checks.items():
+        print(f"[{'OK' if ok else 'FAIL'}] {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"costs": results, "recommended": picks, "login_path": path,
+                       "config": vars(args)}, f, indent=2)
+        print(f"[OK] Results written to {args.json}")
+    sys.exit(0 if all(checks.values()) else 1)
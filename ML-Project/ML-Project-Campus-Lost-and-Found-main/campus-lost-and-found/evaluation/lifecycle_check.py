@@ -0,0 +1,148 @@
+# File: evaluation/lifecycle_check.py
+# Purpose: End-to-end check of the item lifecycle (modules/lifecycle.py) on a synthetic database.
+# Method: Seeds N items (reusing the retrieval benchmark's catalogue), back-dates most of them
+#         past the TTL and warms a VectorIndex. The batch job then runs in a SEPARATE process
+#         (as it would in another app/service instance), so the index can only learn about the
+#         changes from db's status_log. Checks:
+#           - the searched pools shrink to the OPEN items, without reloading them from SQLite,
+#           - expired/archived items never come back from search,
+#           - archived items keep their feature BLOBs in the archive tables,
+#           - owner transitions follow lifecycle.TRANSITIONS,
+#           - a renewed report survives the next sweep (its TTL restarts),
+#         and reports search latency before/after (it should follow the OPEN count).
+# Usage: python evaluation/lifecycle_check.py [--items 20000] [--stale 0.8] [--queries 50]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules import db, index, lifecycle, metrics, text_model
+from retrieval_benchmark import Catalogue
+
+BATCH_JOB = """
+import sys
+from modules import db, lifecycle
+db.DB_PATH = sys.argv[1]
+print(lifecycle.run_once())
+"""
+
+def seed(catalogue, stale_ratio, seed=3):
+    """Inserts the catalogue; back-dates a share of it past the TTL. Returns the stale ids."""
+    user_id = db.add_user("lifecycle", "x", "lifecycle@example.com")
+    item_ids = db.add_items_bulk(
+        (user_id, "FOUND", r['category'], r['description'], r['image_path'], r['features_color'], r['features_text'])
+        for r in catalogue.rows
+    )
+    rng = np.random.default_rng(seed)
+    stale = sorted(int(i) for i in rng.choice(item_ids, int(len(item_ids) * stale_ratio), replace=False))
+    age = f"-{lifecycle.TTL_DAYS['FOUND'] + 1} days"
+    conn = db.get_connection()
+    with conn:
+        conn.executemany("UPDATE items SET timestamp = datetime('now', ?) WHERE id = ?", [(age, i) for i in stale])
+    return user_id, stale
+
+def run_batch_job():
+    """Runs lifecycle.run_once() in another process against the same database."""
+    proc = subprocess.run([sys.executable, "-c", BATCH_JOB, db.DB_PATH], cwd=PROJECT_DIR,
+                          capture_output=True, text=True, check=True)
+    return proc.stdout.strip()
+
+def search_latency(vector_index, queries):
+    q_visual, q_text, _ = queries
+    latencies, found = [], set()
+    for qv, qt in zip(q_visual, q_text):
+        start = time.perf_counter()
+        results = vector_index.search("FOUND", qv, qt, 10)
+        latencies.append(time.perf_counter() - start)
+        found.update(row['id'] for _, row in results)
+    return float(np.percentile(np.array(latencies) * 1000, 50)), found
+
+def check(name, ok, detail=""):
+    print(f"[{'OK' if ok else 'FAIL'}] {name}{': ' + detail if detail else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Item lifecycle end-to-end check.")
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--stale", type=float, default=0.8, help="share of items past the TTL")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="lf_lifecycle_")
+    db.DB_PATH = os.path.join(work_dir, "lifecycle.db")
+    db.init_db()
+    catalogue = Catalogue(args.items)
+    model = text_model.TextModel(model_dir=os.path.join(work_dir, "text_model"))
+    model.fit(row['features_text'] for row in catalogue.rows)
+    text_model.set_model(model)
+    user_id, stale = seed(catalogue, args.stale)
+    queries = catalogue.queries(args.queries)
+
+    vector_index = index.VectorIndex()
+    before_ms, _ = search_latency(vector_index, queries)
+    before = vector_index.count("FOUND")
+    loads = metrics.snapshot().get("index.load_bucket", {}).get("count", 0)
+    print(f"Before: {before} OPEN items, search p50 {before_ms:.2f} ms")
+
+    ok = True
+    print(f"Batch job (separate process): {run_batch_job()}")
+    after_ms, found = search_latency(vector_index, queries)
+    after = vector_index.count("FOUND")
+    print(f"After expiry: {after} OPEN items, search p50 {after_ms:.2f} ms")
+    ok &= check("pool shrank to the OPEN items", after == before - len(stale) == db.get_status_counts()["OPEN"],
+                f"{before} -> {after}")
+    ok &= check("applied from status_log, no reload",
+                metrics.snapshot().get("index.load_bucket", {}).get("count", 0) == loads)
+    ok &= check("expired items are not returned", not found & set(stale))
+
+    # Archive: back-date the expiry so the next run moves them to cold storage.
+    conn = db.get_connection()
+    with conn:
+        conn.execute("UPDATE items SET status_changed_at = datetime('now', '-31 days') WHERE status = 'EXPIRED'")
+    print(f"Batch job (separate process): {run_batch_job()}")
+    vector_index.count("FOUND")
+    counts = db.get_status_counts()
+    ok &= check("expired items archived", counts.get("EXPIRED", 0) == 0 and counts["ARCHIVED"] == len(stale),
+                str(counts))
+    blobs = conn.execute("SELECT COUNT(*) FROM item_features_archive WHERE features_color IS NOT NULL").fetchone()[0]
+    ok &= check("archive kept the feature BLOBs", blobs == len(stale))
+    owned = db.get_user_items(user_id, include_archived=True)
+    ok &= check("archived items listed for their owner",
+                len(owned) == args.items and sum(row['archived'] for row in owned) == len(stale))
+    ok &= check("hot tables shrank", conn.execute("SELECT COUNT(*) FROM item_features").fetchone()[0] == after)
+
+    # Owner transitions (in this process: applied through the change listener).
+    item_id = next(i for i in range(1, args.items + 1) if i not in set(stale))
+    ok &= check("OPEN -> CLAIMED", lifecycle.change_status(item_id, lifecycle.CLAIMED)
+                and vector_index.count("FOUND") == after - 1)
+    ok &= check("CLAIMED -> EXPIRED refused", not lifecycle.change_status(item_id, lifecycle.EXPIRED))
+    ok &= check("CLAIMED -> OPEN", lifecycle.change_status(item_id, lifecycle.OPEN)
+                and vector_index.count("FOUND") == after)
+    ok &= check("OPEN -> CLOSED", lifecycle.change_status(item_id, lifecycle.CLOSED))
+    ok &= check("CLOSED is final", not lifecycle.change_status(item_id, lifecycle.OPEN))
+
+    # Renewal: an old report that expired and was renewed gets a fresh TTL.
+    renewed = next(i for i in range(item_id + 1, args.items + 1) if i not in set(stale))
+    with conn:
+        conn.execute("UPDATE items SET timestamp = datetime('now', ?) WHERE id = ?",
+                     (f"-{lifecycle.TTL_DAYS['FOUND'] + 1} days", renewed))
+    run_batch_job()
+    ok &= check("old report expired", db.get_item(renewed)['status'] == lifecycle.EXPIRED)
+    ok &= check("EXPIRED -> OPEN (renew)", lifecycle.change_status(renewed, lifecycle.OPEN))
+    print(f"Batch job (separate process): {run_batch_job()}")
+    ok &= check("renewed report survives the next sweep", db.get_item(renewed)['status'] == lifecycle.OPEN)
+
+    print(f"\nSearch p50: {before_ms:.2f} ms for {before} OPEN items -> {after_ms:.2f} ms for {after}")
+    print("[SUCCESS] Lifecycle checks passed." if ok else "[ERROR] Lifecycle checks failed.")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# File: evaluation/load_test.py
+# Purpose: Local load test for the headless matching service (service.py).
+# Method: N client threads, each with its own keep-alive connection (modules/service_client.py),
+#         send requests back to back for a fixed duration. Reports requests/sec, latency
+#         percentiles and errors per endpoint. Query photos come from data/raw_dataset and are
+#         re-encoded with a small per-request perturbation so the service's content-hash memo
+#         does not turn every image search into a cache hit (use --repeat-images to test that).
+# Usage: python evaluation/load_test.py [--url http://127.0.0.1:8765 | --spawn]
+#                                       [--endpoints health,text,image,hybrid,predict]
+#                                       [--concurrency 8] [--duration 10] [--json results.json]
+#        --spawn starts `python service.py` on a free port and stops it afterwards.
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from modules import service_client
+
+RAW_DATA_DIR = os.path.join(PROJECT_DIR, "data", "raw_dataset")
+QUERY_IMAGES = 32
+QUERY_TEXTS = ["black backpack", "silver laptop charger", "blue water bottle", "car keys with red tag",
+               "wireless earphones case", "calculator casio", "leather wristwatch", "smartphone cracked screen"]
+SPAWN_TIMEOUT_S = 120
+
+# ==========================
+# 1. WORKLOAD
+# ==========================
+
+def load_query_images(count, seed=0):
+    """Encoded JPEG bytes of up to `count` dataset images."""
+    import cv2
+    paths = []
+    for dir_path, _, filenames in os.walk(RAW_DATA_DIR):
+        paths += [os.path.join(dir_path, f) for f in filenames if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    random.Random(seed).shuffle(paths)
+    images = []
+    for path in paths[:count]:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(img)
+    return images
+
+def encode(img, rng, perturb):
+    import cv2
+    if perturb:
+        noise = rng.integers(-3, 4, size=img.shape, dtype=np.int16)
+        img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+def make_request(endpoint, client, images, rng, perturb):
+    """One call of the given kind."""
+    text = QUERY_TEXTS[rng.integers(len(QUERY_TEXTS))]
+    target = "FOUND" if rng.random() < 0.5 else "LOST"
+    if endpoint == "health":
+        return client.health()
+    if endpoint == "text":
+        return client.search(target, text=text)
+    image = encode(images[rng.integers(len(images))], rng, perturb)
+    if endpoint == "image":
+        return client.search(target, image=image)
+    if endpoint == "hybrid":
+        return client.search(target, text=text, image=image)
+    if endpoint == "predict":
+        return client.predict_category(image)
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+# ==========================
+# 2. RUNNER
+# ==========================
+
+def run(url, endpoint, concurrency, duration, images, perturb):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        client = service_client.ServiceClient(url)
+        rng = np.random.default_rng(seed)
+        mine, failed = [], []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                make_request(endpoint, client, images, rng, perturb)
+                mine.append(time.perf_counter() - start)
+            except service_client.ServiceClientError as err:
+                failed.append(str(err))
+        with lock:
+            latencies.extend(mine)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "endpoint": endpoint, "concurrency": concurrency, "seconds": elapsed,
+        "requests": len(latencies), "errors": len(errors), "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)), "first_error": errors[0] if errors else None,
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def spawn_service(workers):
+    port = free_port()
+    cmd = [sys.executable, "service.py", "--port", str(port)]
+    if workers is not None:
+        cmd += ["--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=PROJECT_DIR)
+    url = f"http://127.0.0.1:{port}"
+    client = service_client.ServiceClient(url, timeout=5)
+    deadline = time.time() + SPAWN_TIMEOUT_S
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"[FAIL] service.py exited with code {proc.returncode}")
+        try:
+            client.health()
+            return proc, url
+        except service_client.ServiceClientError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("[FAIL] service.py did not become healthy in time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/sec of the matching service.")
+    parser.add_argument("--url", default=service_client.SERVICE_URL or "http://127.0.0.1:8765")
+    parser.add_argument("--spawn", action="store_true", help="start service.py for the run")
+    parser.add_argument("--workers", type=int, default=None, help="--workers for the spawned service")
+    parser.add_argument("--endpoints", default="health,text,image,hybrid,predict")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--repeat-images", action="store_true", help="send identical image bytes (memo hits)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    images = load_query_images(QUERY_IMAGES) if set(endpoints) - {"health", "text"} else []
+    if set(endpoints) - {"health", "text"} and not images:
+        raise SystemExit(f"[FAIL] No query images found in {RAW_DATA_DIR}")
+
+    proc, url = spawn_service(args.workers) if args.spawn else (None, args.url)
+    results = []
+    try:
+        print(f"Target: {url}  concurrency={args.concurrency}  duration={args.duration:.0f}s per endpoint")
+        print(f"{'endpoint':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for endpoint in endpoints:
+            res = run(url, endpoint, args.concurrency, args.duration, images, not args.repeat_images)
+            results.append(res)
+            print(f"{endpoint:<10}{res['requests']:>10}{res['rps']:>10.1f}{res['p50_ms']:>10.1f}"
+                  f"{res['p95_ms']:>10.1f}{res['p99_ms']:>10.1f}{res['errors']:>8}")
+            if res["first_error"]:
+                print(f"  first error: {res['first_error']}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    failed = [r for r in results if r["errors"] or not r["requests"]]
+    print("[FAIL] Some requests failed." if failed else "[OK] All requests succeeded.")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# File: evaluation/query_plans.py
+# Purpose: Guards the hot SQL paths in modules/db.py against full table scans.
+# Runs EXPLAIN QUERY PLAN for each query on a freshly migrated database and checks
+# the plan against EXPECTED_PLANS (the plans are checked in here, next to the queries' owner).
+# Exits with status 1 if a query scans `items` without an index, needs a temp sort,
+# or loses its expected index.
+# Usage: python evaluation/query_plans.py [--db data/campus.db]
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules import db
+
+# query name -> (SQL, sample parameters, substrings that must appear in the plan)
+EXPECTED_PLANS = {
+    "get_candidates": (
+        db.CANDIDATES_QUERY, ("FOUND", "OPEN", 0),
+        ["SEARCH items USING INDEX idx_items_type_status (type=? AND status=? AND rowid>?)",
+         "SEARCH users USING INTEGER PRIMARY KEY (rowid=?)",
+         "SEARCH item_features USING INTEGER PRIMARY KEY (rowid=?)"],
+    ),
+    "get_item": (
+        db.ITEM_COLUMNS + " WHERE items.id = ?", (1,),
+        ["SEARCH items USING INTEGER PRIMARY KEY (rowid=?)"],
+    ),
+    "get_pool_stats": (
+        db.POOL_STATS_QUERY, (),
+        ["SCAN items USING COVERING INDEX idx_items_type_status"],
+    ),
+    "get_item_paths": (
+        db.ITEM_PATHS_QUERY, (1,),
+        ["SEARCH items USING INDEX idx_items_user (user_id=?)"],
+    ),
+    "get_user_items": (
+        db.USER_ITEMS_QUERY, (1,),
+        ["SEARCH items USING INDEX idx_items_user (user_id=?)"],
+    ),
+    "get_new_items": (
+        db.NEW_ITEMS_QUERY, (0, 64),
+        ["SEARCH items USING INTEGER PRIMARY KEY (rowid>?)"],
+    ),
+    "get_user_items (archive)": (
+        db.USER_ARCHIVE_QUERY, (1,),
+        ["SEARCH items_archive USING INDEX idx_items_archive_user (user_id=?)"],
+    ),
+    "expire_items": (
+        db.EXPIRE_QUERY, ("-60 days", "FOUND", 500),
+        ["SEARCH items USING INDEX idx_items_status_timestamp (status=? AND timestamp<?)"],
+    ),
+    "archive_items": (
+        db.ARCHIVE_QUERY, ("CLOSED", "-30 days", 500),
+        ["SEARCH items USING COVERING INDEX idx_items_status_changed (status=? AND status_changed_at<?)"],
+    ),
+    "get_status_changes": (
+        db.STATUS_LOG_QUERY, (0, 500),
+        ["SEARCH status_log USING INTEGER PRIMARY KEY (rowid>?)"],
+    ),
+    "get_status_counts": (
+        db.STATUS_COUNTS_QUERY, (),
+        ["SCAN items USING COVERING INDEX idx_items_status_"],
+    ),
+    "get_matches": (
+        db.MATCHES_QUERY, (1, 5),
+        ["SEARCH matches USING COVERING INDEX idx_matches_item_score (item_id=?)",
+         "SEARCH items USING INTEGER PRIMARY KEY (rowid=?)"],
+    ),
+}
+
+def query_plan(conn, sql, params):
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [row[3] for row in rows]
+
+def full_scans(plan):
+    """Plan steps that walk the whole items table (no index involved)."""
+    return [step for step in plan if step.startswith("SCAN items") and "INDEX" not in step]
+
+def check_plans(conn):
+    ok = True
+    for name, (sql, params, expected) in EXPECTED_PLANS.items():
+        plan = query_plan(conn, sql, params)
+        missing = [want for want in expected if not any(want in step for step in plan)]
+        sorts = [step for step in plan if "TEMP B-TREE" in step]
+        scans = full_scans(plan) + sorts
+        status = "OK" if not missing and not scans else "FAIL"
+        ok = ok and status == "OK"
+        print(f"[{status}] {name}")
+        for step in plan:
+            print(f"       {step}")
+        for step in missing:
+            print(f"       missing: {step}")
+    return ok
+
+if __name__ == "__main__":
+    if "--db" in sys.argv:
+        db.DB_PATH = sys.argv[sys.argv.index("--db") + 1]
+    else:
+        db.DB_PATH = os.path.join(tempfile.mkdtemp(), "plans.db")
+    db.init_db()
+    print(f"--- Query plans (schema v{db.get_schema_version()}, {db.DB_PATH}) ---")
+    passed = check_plans(db.get_connection())
+    print("[SUCCESS] All queries use their indexes." if passed else "[ERROR] Query plan regression.")
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,333 @@
+# File: evaluation/retrieval_benchmark.py
+# Purpose: End-to-end retrieval benchmark on synthetic catalogues with the REAL vector layout
+#          (64 HSV colour bins + 1764 HOG values, hashed term-count text blobs from
+#          modules.features, corpus IDF from modules.text_model), scored by the app's own code.
+# Reports per (backend, catalogue size, query mode):
+#   build time, RSS growth, search latency p50/p95/p99, throughput, recall@1/3/5/10
+#   (the same metric as report_graphs.py), plus the modules/metrics.py stage timings.
+# Backends: matrix -> search.CandidateMatrix (what a per-request rebuild costs)
+#           index  -> index.Bucket, exact (what the app uses); also reports batched throughput
+#           ann    -> index.Bucket with the IVF shortlist for image-only queries (hybrid/text stay exact)
+#           sharded -> index.Bucket scored exactly across worker processes (modules/shards.py)
+#           store  -> vector_store.VectorStore, memory-mapped segments on disk (build = append + fsync)
+#           db     -> SQLite ingest (add_items_bulk) + cold VectorIndex load + search
+# Usage: python evaluation/retrieval_benchmark.py [--sizes 1000,10000,100000]
+#        [--backends matrix,index,ann,sharded,store,db] [--modes hybrid,text,image] [--queries 200]
+#        [--shard-workers N]
+#        [--photo-noise 0.05] [--json results.json] [--baseline previous.json [--fail-on-regression]]
+# Catalogues of 1M items need ~7.5 GB per copy of the visual vectors (1828 float32 each).
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules import codec, db, features, index, metrics, search, text_model, vector_store
+
+# Benchmark Configuration
+CATEGORIES = ["Backpack", "Bracelet", "Calculator", "Charger", "Earphones", "Headphones", "Keyboard",
+              "Keys", "Laptop", "Mouse", "Smartphone", "Waterbottle", "Wristwatch", "Other"]
+COLORS = ["Blue", "Red", "Matte Black", "White", "Silver", "Neon Green", "Yellow", "Grey"]
+PLACES = ["Library 2nd Floor", "Gym Lockers", "Main Cafeteria", "Student Union",
+          "Parking Garage B", "Lecture Hall A", "Corridor"]
+DETAILS = ["scratched corner", "sticker on the back", "in a leather case", "name tag attached",
+           "cracked screen", "small dent", "keychain attached", "brand new", ""]
+COLOR_BINS = 64
+HOG_DIM = 1764
+RANKS = [1, 3, 5, 10]
+DEFAULT_SIZES = "1000,10000,50000"
+DEFAULT_BACKENDS = "matrix,index,ann,db"
+SHARD_WORKERS = None         # sharded backend: worker processes (None = one per core)
+DB_MAX_ITEMS = 200000        # the db backend writes every vector to disk
+CHUNK = 20000
+PHOTO_NOISE = 0.05           # std-dev of the "second photo" perturbation (vector values are ~0-1)
+# --baseline: flag a run whose p50 grew by more than this factor or whose recall@10 dropped
+LATENCY_REGRESSION = 1.25
+RECALL_REGRESSION = 0.02
+
+# ==========================
+# 1. SYNTHETIC CATALOGUE
+# ==========================
+
+class Catalogue:
+    """n FOUND items: rows shaped like db.get_candidates() output + the raw visual matrix."""
+
+    def __init__(self, n, seed=7, latent_dim=48):
+        rng = np.random.default_rng(seed)
+        self.n = n
+        self.category = rng.integers(0, len(CATEGORIES), n)
+        self.color = rng.integers(0, len(COLORS), n)
+        detail = rng.integers(0, len(DETAILS), n)
+        place = rng.integers(0, len(PLACES), n)
+
+        # Colour: a peaky histogram per colour name plus per-photo jitter, min-max scaled
+        # like cv2.NORM_MINMAX. HOG: a low-rank shape signal per category plus per-item
+        # variation, kept in the L2-Hys range [0, 0.2].
+        palette = rng.random((len(COLORS), COLOR_BINS)) ** 6
+        centers = rng.normal(0, 1, (len(CATEGORIES), latent_dim)).astype(np.float32)
+        basis = rng.random((latent_dim, HOG_DIM), dtype=np.float32)
+        self.visual = np.empty((n, COLOR_BINS + HOG_DIM), dtype=np.float32)
+        for start in range(0, n, CHUNK):
+            end = min(n, start + CHUNK)
+            color = palette[self.color[start:end]] + rng.random((end - start, COLOR_BINS)) * 0.15
+            color /= color.max(axis=1, keepdims=True)
+            latent = centers[self.category[start:end]] + rng.normal(0, 0.7, (end - start, latent_dim)).astype(np.float32)
+            hog = np.maximum(latent @ basis, 0)
+            hog *= 0.2 / np.maximum(hog.max(axis=1, keepdims=True), 1e-6)
+            hog += rng.random(hog.shape, dtype=np.float32) * 0.02
+            self.visual[start:end, :COLOR_BINS] = color
+            self.visual[start:end, COLOR_BINS:] = np.minimum(hog, 0.2)
+
+        self.descriptions = [
+            f"{COLORS[c]} {CATEGORIES[k]} found near {PLACES[p]}. {DETAILS[d]}".strip()
+            for c, k, p, d in zip(self.color, self.category, place, detail)
+        ]
+        self.details = [DETAILS[d] for d in detail]
+        text_blobs = []
+        for start in range(0, n, CHUNK):
+            text_blobs += features.extract_text_vectors(self.descriptions[start:start + CHUNK])
+        self.rows = [
+            {"id": i + 1, "type": "FOUND", "status": "OPEN", "category": CATEGORIES[self.category[i]],
+             "description": self.descriptions[i], "image_path": f"synthetic/{i + 1}.jpg",
+             "contact_info": "bench@example.com",
+             "features_color": codec.encode_vector(self.visual[i], features.VISUAL_FEATURE_VERSION),
+             "features_text": text_blobs[i]}
+            for i in range(n)
+        ]
+
+    def queries(self, count, noise=PHOTO_NOISE, seed=11):
+        """
+        "Lost" reports of randomly picked items: a second photo (the stored vector plus
+        noise) and the owner's own wording. Returns (visual blobs, text blobs, true ids).
+        """
+        rng = np.random.default_rng(seed)
+        picks = rng.choice(self.n, min(count, self.n), replace=False)
+        photos = self.visual[picks] + rng.normal(0, noise, (len(picks), self.visual.shape[1])).astype(np.float32)
+        photos = np.maximum(photos, 0)
+        q_visual = [codec.encode_vector(v, features.VISUAL_FEATURE_VERSION) for v in photos]
+        q_text = features.extract_text_vectors([
+            f"I lost my {COLORS[self.color[i]].lower()} {CATEGORIES[self.category[i]].lower()} {self.details[i]}"
+            for i in picks
+        ])
+        return q_visual, q_text, picks + 1
+
+# ==========================
+# 2. BACKENDS
+# ==========================
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+    except (OSError, StopIteration):
+        import resource  # peak, not current: deltas are an upper bound off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def build_backend(name, catalogue, work_dir, warm_query):
+    """Returns (search(q_visual, q_text, k) -> [ids], batch(q_visuals, q_texts, k) or None, extra)."""
+    extra = {}
+    if name == "matrix":
+        matrix = search.CandidateMatrix(catalogue.rows)
+        return (lambda qv, qt, k: [r['id'] for _, r in matrix.search(qv, qt, k)]), None, extra
+
+    if name in ("index", "ann"):
+        bucket = index.Bucket()
+        for row in catalogue.rows:
+            bucket.append(row)
+        pool = 1 if name == "ann" else None
+        if pool:
+            bucket.search(warm_query, None, RANKS[-1], ann_min_pool=pool)  # builds the IVF lists
+        run = lambda qv, qt, k: [r['id'] for _, r in bucket.search(qv, qt, k, ann_min_pool=pool)]
+        batch = None
+        if name == "index":
+            batch = lambda qvs, qts, k: [[r['id'] for _, r in hits] for hits in bucket.search_many(qvs, qts, k)]
+        return run, batch, extra
+
+    if name == "sharded":
+        bucket = index.Bucket()
+        for row in catalogue.rows:
+            bucket.append(row)
+        options = {"shard_min_pool": 1, "shard_workers": SHARD_WORKERS}
+        bucket.search(warm_query, None, RANKS[-1], **options)  # copies the pool into shared memory
+        extra["shard_workers"] = bucket.sharded.workers
+        run = lambda qv, qt, k: [r['id'] for _, r in bucket.search(qv, qt, k, **options)]
+        batch = lambda qvs, qts, k: [[r['id'] for _, r in hits] for hits in bucket.search_many(qvs, qts, k, **options)]
+        return run, batch, extra
+
+    if name == "store":
+        store = vector_store.VectorStore(os.path.join(work_dir, f"vectors_{catalogue.n}"))
+        for i in range(0, catalogue.n, CHUNK):
+            store.append_rows(catalogue.rows[i:i + CHUNK])
+        extra["store_mb"] = sum(os.path.getsize(os.path.join(store.directory, f))
+                                for f in os.listdir(store.directory)) / 1024 / 1024
+        store.search("FOUND", warm_query, None, RANKS[-1])  # weights the text rows once
+        run = lambda qv, qt, k: [item_id for _, item_id in store.search("FOUND", qv, qt, k)]
+        batch = lambda qvs, qts, k: [[item_id for _, item_id in hits] for hits in store.search_many("FOUND", qvs, qts, k)]
+        return run, batch, extra
+
+    if name == "db":
+        db.close_connection()
+        db.DB_PATH = os.path.join(work_dir, f"bench_{catalogue.n}.db")
+        db.init_db()
+        user_id = db.add_user("bench", "x", "bench@example.com")
+        start = time.perf_counter()
+        for i in range(0, catalogue.n, CHUNK):
+            db.add_items_bulk(
+                (user_id, "FOUND", r['category'], r['description'], r['image_path'],
+                 r['features_color'], r['features_text'])
+                for r in catalogue.rows[i:i + CHUNK]
+            )
+        extra["ingest_s"] = time.perf_counter() - start
+        extra["db_mb"] = os.path.getsize(db.DB_PATH) / 1024 / 1024
+        vector_index = index.VectorIndex()
+        vector_index.count("FOUND")  # cold load from SQLite (timed as the build)
+        return (lambda qv, qt, k: [r['id'] for _, r in vector_index.search("FOUND", qv, qt, k)]), None, extra
+
+    raise ValueError(f"Unknown backend: {name}")
+
+MODES = {
+    "hybrid": lambda qv, qt: (qv, qt),
+    "image": lambda qv, qt: (qv, None),
+    "text": lambda qv, qt: (None, qt),
+}
+
+def run_backend(name, catalogue, queries, modes, work_dir):
+    q_visual, q_text, truth = queries
+    gc.collect()
+    metrics.reset()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    run, batch, extra = build_backend(name, catalogue, work_dir, q_visual[0])
+    build_s = time.perf_counter() - start
+    memory_mb = rss_mb() - rss_before
+
+    results = []
+    for mode in modes:
+        latencies, hits = [], {k: 0 for k in RANKS}
+        for qv, qt, expected in zip(q_visual, q_text, truth):
+            args = MODES[mode](qv, qt)
+            start = time.perf_counter()
+            found = run(*args, RANKS[-1])
+            latencies.append(time.perf_counter() - start)
+            for k in RANKS:
+                hits[k] += expected in found[:k]
+        latencies = np.array(latencies) * 1000
+        result = {
+            "backend": name, "size": catalogue.n, "mode": mode, "queries": len(truth),
+            "build_s": build_s, "memory_mb": memory_mb,
+            "latency_ms": {"p50": float(np.percentile(latencies, 50)), "p95": float(np.percentile(latencies, 95)),
+                           "p99": float(np.percentile(latencies, 99)), "mean": float(latencies.mean())},
+            "qps": float(len(latencies) / (latencies.sum() / 1000)),
+            "recall": {str(k): hits[k] / len(truth) for k in RANKS},
+            **extra,
+        }
+        if batch is not None:
+            qvs, qts = zip(*(MODES[mode](qv, qt) for qv, qt in zip(q_visual, q_text)))
+            start = time.perf_counter()
+            batch(list(qvs), list(qts), RANKS[-1])
+            result["batch_qps"] = len(truth) / (time.perf_counter() - start)
+        results.append(result)
+
+    stages = metrics.snapshot()
+    stages.pop("counters")
+    for result in results:
+        result["stages"] = {stage: {"count": s["count"], "p50_ms": s["p50_ms"], "p95_ms": s["p95_ms"]}
+                            for stage, s in stages.items()}
+    return results
+
+# ==========================
+# 3. REPORTING
+# ==========================
+
+def print_result(r):
+    extra = f"  batch {r['batch_qps']:8.0f} q/s" if "batch_qps" in r else ""
+    if "ingest_s" in r:
+        extra += f"  ingest {r['ingest_s']:.1f}s ({r['db_mb']:.0f} MB)"
+    recall = " ".join(f"@{k}={r['recall'][str(k)]:.3f}" for k in RANKS)
+    print(f"{r['backend']:<7}{r['size']:>9} {r['mode']:<7} build {r['build_s']:7.2f}s {r['memory_mb']:7.0f} MB  "
+          f"p50 {r['latency_ms']['p50']:7.2f} p95 {r['latency_ms']['p95']:7.2f} ms  "
+          f"{r['qps']:7.0f} q/s  recall {recall}{extra}")
+
+def compare(results, baseline_path):
+    """Prints latency/recall changes vs. an earlier --json file; returns the regressed runs."""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["backend"], r["size"], r["mode"]): r for r in json.load(f)["runs"]}
+    regressions = []
+    print(f"\n--- Compared with {baseline_path} ---")
+    for r in results:
+        old = baseline.get((r["backend"], r["size"], r["mode"]))
+        if old is None:
+            continue
+        ratio = r["latency_ms"]["p50"] / max(old["latency_ms"]["p50"], 1e-9)
+        recall_delta = r["recall"]["10"] - old["recall"]["10"]
+        regressed = ratio > LATENCY_REGRESSION or recall_delta < -RECALL_REGRESSION
+        status = "FAIL" if regressed else "OK"
+        print(f"[{status}] {r['backend']:<7}{r['size']:>9} {r['mode']:<7} p50 x{ratio:5.2f}  "
+              f"recall@10 {recall_delta:+.3f}")
+        if regressed:
+            regressions.append(r)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval latency/recall benchmark on synthetic catalogues.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated catalogue sizes (1000 to 1000000)")
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS, help="comma-separated: matrix,index,ann,sharded,store,db")
+    parser.add_argument("--shard-workers", type=int, default=None, help="processes for the sharded backend")
+    parser.add_argument("--modes", default="hybrid", help="comma-separated query modes: hybrid,image,text")
+    parser.add_argument("--queries", type=int, default=200, help="queries per run")
+    parser.add_argument("--photo-noise", type=float, default=PHOTO_NOISE, help="perturbation of query photos")
+    parser.add_argument("--json", help="write all results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if a run regressed vs. --baseline")
+    args = parser.parse_args()
+    SHARD_WORKERS = args.shard_workers
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    backends = args.backends.split(",")
+    modes = args.modes.split(",")
+    work_dir = tempfile.mkdtemp(prefix="lf_bench_")
+    # Never read or write the real database / IDF model.
+    db.DB_PATH = os.path.join(work_dir, "unused.db")
+
+    all_results = []
+    for size in sizes:
+        start = time.perf_counter()
+        catalogue = Catalogue(size)
+        model = text_model.TextModel(model_dir=os.path.join(work_dir, f"text_model_{size}"))
+        model.fit(row['features_text'] for row in catalogue.rows)
+        text_model.set_model(model)
+        queries = catalogue.queries(args.queries, args.photo_noise)
+        print(f"\n--- {size} items ({time.perf_counter() - start:.1f}s to generate), {len(queries[2])} queries ---")
+        for backend in backends:
+            if backend == "db" and size > DB_MAX_ITEMS:
+                print(f"db     {size:>9} skipped (more than {DB_MAX_ITEMS} items)")
+                continue
+            for result in run_backend(backend, catalogue, queries, modes, work_dir):
+                print_result(result)
+                all_results.append(result)
+        del catalogue, queries
+        gc.collect()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {"sizes": sizes, "backends": backends, "modes": modes, "queries": args.queries,
+                           "photo_noise": args.photo_noise,
+                           "visual_dim": COLOR_BINS + HOG_DIM, "text_dim": features.TEXT_HASH_FEATURES},
+                "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                                "platform": platform.platform(), "cpus": os.cpu_count()},
+                "runs": all_results,
+            }, f, indent=2)
+        print(f"\n[OK] Results written to {args.json}")
+
+    if args.baseline:
+        regressions = compare(all_results, args.baseline)
+        if regressions and args.fail_on_regression:
+            print(f"[FAIL] {len(regressions)} run(s) regressed")
+            sys.exit(1)
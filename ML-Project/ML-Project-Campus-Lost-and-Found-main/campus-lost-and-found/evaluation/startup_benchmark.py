@@ -0,0 +1,120 @@
+# File: evaluation/startup_benchmark.py
+# Purpose: Tracks cold-start cost of the app's modules and first-upload latency.
+# Reports: 1) `python -X importtime` total for the modules app.py imports, plus the
+#             slowest imports (each run in a fresh interpreter, so nothing is cached),
+#          2) latency of the first analyze_image() call in a fresh process,
+#             cold vs. after features.start_warmup() has finished.
+# Usage: python evaluation/startup_benchmark.py [--runs 3] [--json results.json]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_DATA_DIR = os.path.join(PROJECT_DIR, "data", "raw_dataset")
+
+# What app.py imports from this project (Streamlit itself is not measured).
+APP_MODULES = ["modules.auth", "modules.db", "modules.features", "modules.index",
+               "modules.search", "modules.text_model"]
+TOP_IMPORTS = 8
+
+def run_python(code, *flags):
+    """Runs code in a fresh interpreter from the project folder; returns (stdout, stderr)."""
+    proc = subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+    )
+    return proc.stdout, proc.stderr
+
+# ==========================
+# 1. IMPORT TIME
+# ==========================
+
+def parse_importtime(stderr):
+    """[(name, self_us, cumulative_us, depth)] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+def measure_imports():
+    code = "import " + ", ".join(APP_MODULES)
+    _, stderr = run_python(code, "-X", "importtime")
+    entries = parse_importtime(stderr)
+    total_us = sum(cum for _, _, cum, depth in entries if depth == 0)
+    slowest = sorted((e for e in entries if e[3] <= 1), key=lambda e: -e[2])[:TOP_IMPORTS]
+    return total_us / 1000, [(name, cum / 1000) for name, _, cum, _ in slowest]
+
+# ==========================
+# 2. FIRST-UPLOAD LATENCY
+# ==========================
+
+FIRST_CALL = """
+import time, sys
+from modules import features
+if {warm}:
+    features.start_warmup().join()
+start = time.perf_counter()
+result = features.analyze_image({path!r})
+print((time.perf_counter() - start) * 1000, features.warmup_seconds or 0.0, result is not None)
+"""
+
+def sample_image():
+    """A dataset image if available, otherwise a synthetic one written to a temp file."""
+    if os.path.exists(RAW_DATA_DIR):
+        for dir_path, _, filenames in sorted(os.walk(RAW_DATA_DIR)):
+            for fname in sorted(filenames):
+                if fname.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    return os.path.join(dir_path, fname)
+    import cv2
+    rng = np.random.default_rng(5)
+    img = cv2.GaussianBlur((rng.random((480, 640, 3)) * 255).astype(np.uint8), (0, 0), 3)
+    path = os.path.join(tempfile.mkdtemp(), "sample.jpg")
+    cv2.imwrite(path, img)
+    return path
+
+def measure_first_call(path, warm):
+    stdout, _ = run_python(FIRST_CALL.format(warm=warm, path=path))
+    first_ms, warmup_s, ok = stdout.split()
+    return float(first_ms), float(warmup_s) * 1000, ok == "True"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start and first-upload latency benchmark.")
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement (median reported)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    import_runs = [measure_imports() for _ in range(args.runs)]
+    import_ms = float(np.median([total for total, _ in import_runs]))
+    print(f"--- Import time of app modules (median of {args.runs} fresh interpreters) ---")
+    print(f"total: {import_ms:8.1f} ms")
+    for name, ms in import_runs[-1][1]:
+        print(f"  {name:<40} {ms:8.1f} ms")
+
+    path = sample_image()
+    has_model = any(os.path.exists(os.path.join(PROJECT_DIR, "modules", name))
+                    for name in ("category_classifier.pkl", "category_classifier.lfrf"))
+    print(f"\n--- First analyze_image() in a fresh process ({os.path.basename(path)}, "
+          f"classifier {'present' if has_model else 'missing'}) ---")
+    cold = [measure_first_call(path, warm=False) for _ in range(args.runs)]
+    warm = [measure_first_call(path, warm=True) for _ in range(args.runs)]
+    cold_ms = float(np.median([c[0] for c in cold]))
+    warm_ms = float(np.median([w[0] for w in warm]))
+    warmup_ms = float(np.median([w[1] for w in warm]))
+    print(f"cold (no warm-up):        {cold_ms:8.1f} ms")
+    print(f"after warm-up thread:     {warm_ms:8.1f} ms  (warm-up itself took {warmup_ms:.1f} ms)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"import_ms": import_ms, "first_upload_cold_ms": cold_ms,
+                       "first_upload_warm_ms": warm_ms, "warmup_ms": warmup_ms,
+                       "classifier_present": has_model}, f, indent=2)
+        print(f"\n[OK] Results written to {args.json}")
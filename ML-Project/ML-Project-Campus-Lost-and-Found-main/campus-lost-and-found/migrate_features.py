@@ -0,0 +1,103 @@
+# File: migrate_features.py
+# Description: One-shot migration that rewrites legacy pickled feature BLOBs
+#              into the compact float32 format from modules/codec.py, and
+#              re-encodes retired text vectors as hashed term counts (modules/text_model.py).
+# Usage: python migrate_features.py [--vacuum] [--reextract]
+#        --reextract recomputes visual vectors whose feature version differs from
+#        the active HOG extractor (features.HOG_EXTRACTOR), using each item's image.
+#        Safe to re-run: rows that are already encoded are skipped.
+
+import argparse
+from modules import db, codec, features, text_model
+
+BATCH_SIZE = 500
+
+FEATURE_COLUMNS = ["features_color", "features_text"]
+
+def convert_blob(blob):
+    """Returns the re-encoded blob, or None if the row needs no change."""
+    if blob is None or codec.is_encoded(blob):
+        return None
+    return codec.encode_vector(codec.decode_vector(blob), codec.LEGACY_VERSION)
+
+def reextract_blob(blob, image_path):
+    """Fresh visual vector for rows produced by a different extractor version."""
+    if blob is not None and codec.vector_version(blob) == features.VISUAL_FEATURE_VERSION:
+        return None
+    vector = features.extract_visual_vector(image_path)
+    if vector is None:
+        raise ValueError(f"cannot read image '{image_path}'")
+    return vector
+
+def migrate_column(conn, column, convert=None):
+    """Rewrites one BLOB column in id order, one transaction per batch."""
+    converted, failed, last_id = 0, 0, 0
+
+    while True:
+        rows = conn.execute(
+            f"SELECT items.id, items.image_path, item_features.{column} FROM items "
+            f"JOIN item_features ON item_features.item_id = items.id "
+            f"WHERE items.id > ? ORDER BY items.id LIMIT ?",
+            (last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            try:
+                if convert is None:
+                    new_blob = convert_blob(row[column])
+                else:
+                    new_blob = convert(row[column], row['image_path'])
+            except Exception as err:
+                print(f"   [ERR] Item {row['id']} ({column}): {err}")
+                failed += 1
+                continue
+            if new_blob is not None:
+                updates.append((new_blob, row['id']))
+
+        with conn:
+            conn.executemany(f"UPDATE item_features SET {column} = ? WHERE item_id = ?", updates)
+
+        converted += len(updates)
+        last_id = rows[-1]['id']
+
+    return converted, failed
+
+def run_migration(vacuum=False, reextract=False):
+    print(">>> MIGRATING FEATURE BLOBS <<<")
+    db.init_db()
+    conn = db.get_connection()
+
+    for column in FEATURE_COLUMNS:
+        converted, failed = migrate_column(conn, column)
+        print(f"   [OK] {column}: {converted} rewritten, {failed} failed")
+
+    # Same job the app's background worker does, run to completion here.
+    model = text_model.get_model()
+    batches = 0
+    while model.revectorize_stale():
+        batches += 1
+    print(f"   [OK] features_text: re-vectorized with text feature v{features.TEXT_FEATURE_VERSION} "
+          f"({batches} batches scanned, {model.n_docs} documents in the IDF model)")
+
+    if reextract:
+        print(f"   [*] Re-extracting visual vectors with '{features.HOG_EXTRACTOR}'...")
+        converted, failed = migrate_column(conn, "features_color", reextract_blob)
+        print(f"   [OK] features_color: {converted} re-extracted, {failed} failed")
+
+    if vacuum:
+        # Rewritten rows leave free pages behind; VACUUM hands them back to the OS.
+        print("   [*] Reclaiming space (VACUUM)...")
+        conn.execute("VACUUM")
+
+    print(">>> MIGRATION COMPLETE <<<")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encode stored feature BLOBs in the current formats.")
+    parser.add_argument("--vacuum", action="store_true", help="reclaim the freed pages afterwards (VACUUM)")
+    parser.add_argument("--reextract", action="store_true",
+                        help="recompute visual vectors made by another HOG extractor version from the images")
+    args = parser.parse_args()
+    run_migration(vacuum=args.vacuum, reextract=args.reextract)
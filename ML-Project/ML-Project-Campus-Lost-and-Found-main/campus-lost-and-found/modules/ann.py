@@ -0,0 +1,103 @@
+# File: modules/ann.py
+# Purpose: Approximate nearest-neighbour search for the visual (Color + HOG) vectors.
+# Tech: TruncatedSVD (Scikit-Learn) to shrink ~1.8k dims -> 128, plus an IVF coarse
+#       quantizer (MiniBatchKMeans inverted lists). Shortlists are re-ranked exactly.
+#       SVD rather than PCA: no mean-centering, so dot products in the reduced
+#       space approximate the original cosine scores.
+#
+# Recall/latency knob: n_probe = how many inverted lists are scanned per query.
+# More lists -> higher recall@k, more work. See evaluation/ann_recall.py.
+
+import numpy as np
+from modules import search
+
+DEFAULT_COMPONENTS = 128
+DEFAULT_PROBE = 16
+TRAIN_SAMPLE = 20000   # rows used to fit the SVD + k-means
+SHORTLIST_FACTOR = 10  # shortlist = k * factor rows get exact re-ranking
+CHUNK = 8192
+
+class IVFIndex:
+    """
+    Inverted-file index over unit vectors.
+    Rows are grouped by nearest centroid and stored contiguously per list,
+    so a query only touches the n_probe lists closest to it.
+    """
+
+    def __init__(self, n_components=DEFAULT_COMPONENTS, n_lists=None, seed=101):
+        self.n_components = n_components
+        self.n_lists = n_lists
+        self.seed = seed
+        self.n_built = 0
+        self.svd = None
+        self.centroids = None
+        self.centroid_sq = None
+        self.list_offsets = None
+        self.list_members = None
+        self.reduced = None
+
+    # ==========================
+    # 1. BUILD
+    # ==========================
+
+    def build(self, matrix):
+        """Fits the projection + quantizer on `matrix` (N, D) of unit rows."""
+        # Deferred: scikit-learn costs ~1.5 s to import and only large pools need it.
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import TruncatedSVD
+        n, dim = matrix.shape
+        rng = np.random.default_rng(self.seed)
+        sample = matrix[np.sort(rng.choice(n, min(n, TRAIN_SAMPLE), replace=False))]
+
+        n_components = min(self.n_components, dim - 1, len(sample))
+        self.svd = TruncatedSVD(n_components=n_components, random_state=self.seed)
+        self.svd.fit(sample)
+        reduced = self._project(matrix)
+
+        n_lists = self.n_lists or int(np.clip(np.sqrt(n), 1, 4096))
+        n_lists = min(n_lists, len(sample))
+        kmeans = MiniBatchKMeans(
+            n_clusters=n_lists, random_state=self.seed, n_init=1, batch_size=4096
+        )
+        kmeans.fit(self._project(sample))
+        self.centroids = kmeans.cluster_centers_.astype(np.float32)
+        self.centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        assignment = np.concatenate([
+            np.argmin(self.centroid_sq - 2 * (reduced[i:i + CHUNK] @ self.centroids.T), axis=1)
+            for i in range(0, n, CHUNK)
+        ])
+        order = np.argsort(assignment, kind="stable")
+        self.list_members = order
+        self.list_offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self.reduced = np.ascontiguousarray(reduced[order])
+        self.n_built = n
+        return self
+
+    def _project(self, matrix):
+        parts = [self.svd.transform(matrix[i:i + CHUNK]) for i in range(0, matrix.shape[0], CHUNK)]
+        return np.vstack(parts).astype(np.float32)
+
+    # ==========================
+    # 2. QUERY
+    # ==========================
+
+    def candidates(self, q_unit, k, n_probe=DEFAULT_PROBE):
+        """
+        Row positions (into the matrix given to build) worth scoring exactly.
+        q_unit must be the normalized full-dimension query vector.
+        """
+        q_red = self._project(q_unit.reshape(1, -1))[0]
+        n_probe = max(1, min(n_probe, self.centroids.shape[0]))
+        # Nearest centroids by squared L2 (the |q|^2 term is constant per query).
+        probe = np.argpartition(self.centroid_sq - 2 * (self.centroids @ q_red), n_probe - 1)[:n_probe]
+
+        spans = [np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe]
+        slots = np.concatenate(spans) if spans else np.zeros(0, dtype=np.int64)
+        if slots.size == 0:
+            return slots
+
+        shortlist = min(slots.size, max(k, 1) * SHORTLIST_FACTOR)
+        approx = self.reduced[slots] @ q_red
+        best = np.argpartition(-approx, shortlist - 1)[:shortlist]
+        return self.list_members[slots[best]]
@@ -1,44 +1,227 @@
 # File: modules/auth.py
 # Purpose: Manages user security and authentication logic.
-# Security: Uses SHA-256 hashing so plain passwords are never stored.
+# Security: Passwords are stored as salted, deliberately slow KDF hashes (hashlib.scrypt, or
+#           PBKDF2-HMAC-SHA256 where OpenSSL lacks scrypt). Each stored hash carries its own
+#           parameters, so raising the cost only affects new hashes; older ones (including the
+#           original unsalted SHA-256 hex digests) are re-hashed at the user's next login.
+# Cache:    user records are kept in a bounded per-process TTL cache (by username and by id),
+#           so dashboard reruns do not query SQLite; writes made through this module refresh it.
+# Rate limiting: failed logins are counted per username over a sliding window, in memory
+#           (per process); after MAX_FAILED_LOGINS the username is locked until the window passes.
+# Pick the KDF cost for the expected login rate with evaluation/kdf_benchmark.py.
 
+import base64
 import hashlib
-from modules import db
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from modules import db, metrics
 
-def hash_password(password):
+# --- KDF settings (apply to NEW hashes; stored hashes keep their own parameters) ---
+KDF = os.environ.get("LF_PASSWORD_KDF", "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256")
+SCRYPT_N = int(os.environ.get("LF_SCRYPT_N", 2 ** 14))   # cost; memory is 128 * N * r bytes (16 MB)
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get("LF_PBKDF2_ITERATIONS", 600000))
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+USER_CACHE_SIZE = 1024        # user records kept per process
+USER_CACHE_TTL_S = 300        # changes made by other processes show up after at most this long
+MAX_FAILED_LOGINS = 5         # per username within FAILED_LOGIN_WINDOW_S
+FAILED_LOGIN_WINDOW_S = 300
+MAX_TRACKED_USERNAMES = 10000  # bound on the failure bookkeeping (oldest entries dropped)
+PUBLIC_FIELDS = ("id", "username", "contact_info", "created_at")
+
+# ==========================
+# 1. PASSWORD HASHING
+# ==========================
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+def _derive(password, kdf, params, salt):
+    secret = password.encode("utf-8")
+    if kdf == "scrypt":
+        n, r, p = params
+        # maxmem: OpenSSL's 32 MB default rejects n * r above 2**15.
+        return hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES, maxmem=256 * n * r * p + (1 << 20))
+    if kdf == "pbkdf2_sha256":
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, iterations, dklen=HASH_BYTES)
+    if kdf == "sha256":
+        return hashlib.sha256(secret).digest()  # legacy, verification only
+    raise ValueError(f"Unknown password KDF: {kdf}")
+
+def _current_params(kdf):
+    return (SCRYPT_N, SCRYPT_R, SCRYPT_P) if kdf == "scrypt" else (PBKDF2_ITERATIONS,)
+
+def _parse(stored):
+    """(kdf, params, salt, digest) of a stored hash; None if it is not one this module wrote."""
+    if len(stored) == 64 and all(c in "0123456789abcdef" for c in stored):
+        return "sha256", (), b"", bytes.fromhex(stored)  # pre-KDF accounts
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            return ("scrypt", tuple(int(v) for v in parts[1:4]),
+                    base64.b64decode(parts[4], validate=True), base64.b64decode(parts[5], validate=True))
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            return ("pbkdf2_sha256", (int(parts[1]),),
+                    base64.b64decode(parts[2], validate=True), base64.b64decode(parts[3], validate=True))
+    except ValueError:
+        pass
+    return None
+
+def hash_password(password, kdf=None):
     """
-    Converts a plain text password into a SHA-256 hash.
-    Example: 'secret' -> '2bb80d53...'
+    Salted KDF hash with the current settings, e.g.
+    'scrypt$16384$8$1$<salt>$<hash>' or 'pbkdf2_sha256$600000$<salt>$<hash>' (base64 fields).
     """
-    return hashlib.sha256(password.encode()).hexdigest()
+    kdf = kdf or KDF
+    params = _current_params(kdf)
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _derive(password, kdf, params, salt)
+    return "$".join([kdf, *(str(v) for v in params), _b64(salt), _b64(digest)])
+
+def verify_password(password, stored):
+    """(matches, needs_rehash): needs_rehash is True for hashes older than the current settings."""
+    parsed = _parse(stored or "")
+    if parsed is None:
+        return False, False
+    kdf, params, salt, expected = parsed
+    with metrics.timer(f"auth.kdf.{kdf}"):
+        try:
+            matches = hmac.compare_digest(_derive(password, kdf, params, salt), expected)
+        except ValueError:
+            return False, False  # Corrupt parameters (e.g. scrypt n not a power of 2).
+    return matches, (kdf, params) != (KDF, _current_params(KDF))
+
+_dummy_hash = None
+
+def _burn_kdf(password):
+    """Same work as checking a real account, so unknown usernames cannot be told apart by timing."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password("dummy password")
+    verify_password(password, _dummy_hash)
+
+# ==========================
+# 2. USER CACHE
+# ==========================
+
+_user_cache = OrderedDict()  # ("name", username) / ("id", user_id) -> (expires_at, record dict)
+_cache_lock = threading.Lock()
 
+def _cached_user(key, loader):
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _user_cache.get(key)
+        if entry is not None and entry[0] > now:
+            _user_cache.move_to_end(key)
+            metrics.count("auth.user_cache.hit")
+            return entry[1]
+    metrics.count("auth.user_cache.miss")
+    row = loader(key[1])
+    return _remember(dict(row)) if row is not None else None
+
+def _remember(record):
+    expires_at = time.monotonic() + USER_CACHE_TTL_S
+    with _cache_lock:
+        for key in (("name", record['username']), ("id", record['id'])):
+            _user_cache[key] = (expires_at, record)
+            _user_cache.move_to_end(key)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    return record
+
+def clear_cache():
+    with _cache_lock:
+        _user_cache.clear()
+
+def public_user(record):
+    """The user fields safe to keep in a session (never the password hash)."""
+    return {field: record[field] for field in PUBLIC_FIELDS if field in record}
+
+def get_user(user_id):
+    """Public record of a user by id (cached), or None if there is no such user."""
+    record = _cached_user(("id", user_id), db.get_user_by_id)
+    return public_user(record) if record is not None else None
+
+# ==========================
+# 3. RATE LIMITING
+# ==========================
+
+_failures = OrderedDict()  # username -> deque of failure times (monotonic), least recent first
+_failures_lock = threading.Lock()
+
+def lockout_remaining(username):
+    """Seconds until `username` may try again (0 if it is not locked)."""
+    now = time.monotonic()
+    with _failures_lock:
+        times = _failures.get(username)
+        if not times:
+            return 0
+        while times and times[0] <= now - FAILED_LOGIN_WINDOW_S:
+            times.popleft()
+        if len(times) < MAX_FAILED_LOGINS:
+            return 0
+        return int(times[-MAX_FAILED_LOGINS] + FAILED_LOGIN_WINDOW_S - now) + 1
+
+def _record_failure(username):
+    metrics.count("auth.login_failed")
+    with _failures_lock:
+        times = _failures.get(username)
+        if times is None:
+            times = _failures[username] = deque(maxlen=MAX_FAILED_LOGINS)
+        times.append(time.monotonic())
+        _failures.move_to_end(username)
+        while len(_failures) > MAX_TRACKED_USERNAMES:
+            _failures.popitem(last=False)
+
+def _clear_failures(username):
+    with _failures_lock:
+        _failures.pop(username, None)
+
+# ==========================
+# 4. LOGIN & REGISTRATION
+# ==========================
+
+@metrics.timed("auth.login")
 def login_user(username, password):
     """
-    Verifies credentials against the database.
-    Returns: User object (dict) if valid, None if invalid.
+    Verifies credentials against the (cached) user record.
+    Returns: the public user dict if valid; None if invalid or locked out (see lockout_remaining).
     """
-    # 1. Fetch user from DB
-    user = db.get_user_by_username(username)
-    
-    if not user:
+    if lockout_remaining(username):
+        metrics.count("auth.login_locked")
+        return None
+
+    record = _cached_user(("name", username), db.get_user_by_username)
+    if record is None:
+        _burn_kdf(password)
+        _record_failure(username)
         return None  # User does not exist
 
-    # 2. Hash the provided password
-    input_hash = hash_password(password)
+    matches, needs_rehash = verify_password(password, record['password_hash'])
+    if not matches:
+        _record_failure(username)
+        return None  # Wrong password
 
-    # 3. Compare with stored hash
-    # Note: We access columns by name because we set row_factory in db.py
-    if input_hash == user['password_hash']:
-        return user
-    
-    return None  # Wrong password
+    _clear_failures(username)
+    if needs_rehash:
+        # Transparent upgrade: the plain password is only available right now.
+        new_hash = hash_password(password)
+        db.update_password_hash(record['id'], new_hash)
+        record = _remember(dict(record, password_hash=new_hash))
+        metrics.count("auth.rehashed")
+    return public_user(record)
 
 def register_user(username, password, contact_info):
     """
-    Creates a new user with a hashed password.
+    Creates a new user with a salted KDF hash.
     Returns: New User ID or None if username exists.
     """
-    # Hash the password before sending to DB
-    secure_hash = hash_password(password)
-    
-    return db.add_user(username, secure_hash, contact_info)
\ No newline at end of file
+    return db.add_user(username, hash_password(password), contact_info)
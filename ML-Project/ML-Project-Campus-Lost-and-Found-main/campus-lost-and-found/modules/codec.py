@@ -0,0 +1,133 @@
+# File: modules/codec.py
+# Purpose: Compact binary format for the feature vectors stored in SQLite.
+# Layout: 12-byte header + raw little-endian payload (readable with np.frombuffer, no copy).
+#
+#   offset  size  field
+#   0       4     magic  b"LFVC"
+#   4       1     format version (currently 1)
+#   5       1     dtype code     (1 = dense float32, 2 = sparse float32)
+#   6       2     feature version (which extractor produced the vector)
+#   8       4     dimension
+#   12      ...   payload
+#                   dense : 4*D   float32 values
+#                   sparse: 4*NNZ int32 indices (ascending), then 4*NNZ float32 values;
+#                           NNZ = (len(blob) - 12) / 8
+
+import io
+import pickle
+import struct
+import numpy as np
+
+MAGIC = b"LFVC"
+FORMAT_VERSION = 1
+DTYPE_DENSE_F32 = 1
+DTYPE_SPARSE_F32 = 2
+
+HEADER = struct.Struct("<4sBBHI")
+PAYLOAD_DTYPE = np.dtype("<f4")
+INDEX_DTYPE = np.dtype("<i4")
+
+# Feature version reported for rows written before the header existed
+# (all of them came from the original v1 extractors).
+LEGACY_VERSION = 1
+
+# ==========================
+# 1. ENCODE / DECODE
+# ==========================
+
+def encode_vector(vector, feature_version):
+    """Serializes a 1-D vector as header + float32 bytes."""
+    payload = np.ascontiguousarray(np.asarray(vector).ravel(), dtype=PAYLOAD_DTYPE)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_DENSE_F32, feature_version, payload.shape[0])
+    return header + payload.tobytes()
+
+def encode_sparse(indices, values, dim, feature_version):
+    """Serializes the non-zero entries of a `dim`-wide vector (text features are mostly zeros)."""
+    indices = np.ascontiguousarray(np.asarray(indices).ravel(), dtype=INDEX_DTYPE)
+    values = np.ascontiguousarray(np.asarray(values).ravel(), dtype=PAYLOAD_DTYPE)
+    if indices.shape != values.shape:
+        raise ValueError("Sparse vector needs one value per index")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_SPARSE_F32, feature_version, dim)
+    return header + indices.tobytes() + values.tobytes()
+
+def is_encoded(blob):
+    """True for blobs written by encode_vector, False for legacy pickles."""
+    return blob is not None and bytes(blob[:4]) == MAGIC
+
+def read_header(blob):
+    """Returns (dtype_code, feature_version, dim) for an encoded blob."""
+    magic, fmt, dtype_code, feature_version, dim = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector format (magic={magic!r}, version={fmt})")
+    return dtype_code, feature_version, dim
+
+def decode_vector(blob):
+    """
+    Returns the stored vector as a flat NumPy array.
+    Encoded blobs come back as a read-only float32 view over the bytes;
+    legacy pickled rows are still accepted (through a restricted unpickler).
+    """
+    if blob is None:
+        return None
+    if not is_encoded(blob):
+        return np.asarray(_load_legacy(blob)).ravel()
+
+    dtype_code, _, dim = read_header(blob)
+    if dtype_code == DTYPE_SPARSE_F32:
+        indices, values, _ = decode_sparse(blob)
+        dense = np.zeros(dim, dtype=PAYLOAD_DTYPE)
+        dense[indices] = values
+        return dense
+    if dtype_code != DTYPE_DENSE_F32:
+        raise ValueError(f"Unknown vector dtype code: {dtype_code}")
+    return np.frombuffer(blob, dtype=PAYLOAD_DTYPE, count=dim, offset=HEADER.size)
+
+def decode_sparse(blob):
+    """
+    Returns (indices, values, dim) for any stored vector.
+    Sparse blobs are read-only views over the bytes; dense and legacy rows are converted.
+    """
+    if blob is None:
+        return None
+    if is_sparse(blob):
+        dim = read_header(blob)[2]
+        nnz = (len(blob) - HEADER.size) // 8
+        indices = np.frombuffer(blob, dtype=INDEX_DTYPE, count=nnz, offset=HEADER.size)
+        values = np.frombuffer(blob, dtype=PAYLOAD_DTYPE, count=nnz, offset=HEADER.size + 4 * nnz)
+        return indices, values, dim
+    dense = decode_vector(blob)
+    indices = np.flatnonzero(dense).astype(INDEX_DTYPE)
+    return indices, dense[indices].astype(PAYLOAD_DTYPE), dense.shape[0]
+
+def is_sparse(blob):
+    return is_encoded(blob) and read_header(blob)[0] == DTYPE_SPARSE_F32
+
+def vector_version(blob):
+    """Feature version of a stored blob (LEGACY_VERSION for pickles)."""
+    if not is_encoded(blob):
+        return LEGACY_VERSION
+    return read_header(blob)[1]
+
+# ==========================
+# 2. LEGACY PICKLE SUPPORT
+# ==========================
+
+# Only what numpy needs to rebuild a plain ndarray.
+_ALLOWED_GLOBALS = {
+    ("numpy", "ndarray"),
+    ("numpy", "dtype"),
+    ("numpy.core.multiarray", "_reconstruct"),
+    ("numpy._core.multiarray", "_reconstruct"),
+    ("_codecs", "encode"),
+}
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """Refuses anything in a legacy blob that is not an ndarray."""
+
+    def find_class(self, module, name):
+        if (module, name) in _ALLOWED_GLOBALS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Blocked global in feature blob: {module}.{name}")
+
+def _load_legacy(blob):
+    return _ArrayUnpickler(io.BytesIO(bytes(blob))).load()
@@ -1,24 +1,76 @@
 # File: modules/db.py
 import sqlite3
 import os
+import threading
+import numpy as np
+from modules import metrics
 
 DB_FOLDER = "data"
 DB_NAME = "campus.db"
 DB_PATH = os.path.join(DB_FOLDER, DB_NAME)
 
+# --- CONNECTION TUNING ---
+# One long-lived connection per thread (Streamlit runs each session in its own thread).
+# WAL lets readers keep searching while the seeder writes; NORMAL sync is safe under WAL.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA cache_size = -32000;",      # ~32 MB page cache per connection
+    "PRAGMA mmap_size = 268435456;",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY;",
+)
+BUSY_TIMEOUT_S = 10.0       # wait for a competing writer instead of "database is locked"
+STATEMENT_CACHE_SIZE = 128  # prepared statements kept per connection
+
+_local = threading.local()
+
 def get_connection():
-    if not os.path.exists(DB_FOLDER):
-        os.makedirs(DB_FOLDER)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    """
+    Returns this thread's pooled connection, opening it on first use.
+    Callers must NOT close it; use `with conn:` for transactions.
+    """
+    conn = getattr(_local, "conn", None)
+    metrics.count("db.get_connection")
+    # Reconnect if the DB path changed or we are in a forked child process.
+    if conn is not None and _local.key == (DB_PATH, os.getpid()):
+        return conn
+
+    with metrics.timer("db.connect"):
+        conn = _open_connection()
+    _local.conn = conn
+    _local.key = (DB_PATH, os.getpid())
+    return conn
+
+def _open_connection():
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_S,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db():
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
+def close_connection():
+    """Closes this thread's pooled connection (e.g. at worker shutdown)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# ==========================
+# SCHEMA MIGRATIONS
+# ==========================
+# The schema version lives in PRAGMA user_version. Each step runs once, in order,
+# inside its own transaction; append new steps to MIGRATIONS, never edit old ones.
+
+def _migration_1_base_schema(conn):
+    """Original tables (IF NOT EXISTS: databases created before versioning are at 0)."""
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT UNIQUE NOT NULL,
@@ -28,7 +80,7 @@ def init_db():
     );
     """)
 
-    cursor.execute("""
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS items (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id INTEGER NOT NULL,
@@ -43,56 +95,597 @@ def init_db():
         FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
     );
     """)
-    conn.commit()
-    conn.close()
+
+def _migration_2_item_indexes(conn):
+    """Search filters on (type, status[, category]); seeder resume looks up by owner."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_type_status_category ON items (type, status, category);")
+    # Index entries end in the rowid, so this one also returns a pool already in id
+    # order: get_candidates' ORDER BY id / id > ? need no sort of the joined BLOB rows.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_type_status ON items (type, status);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_user ON items (user_id);")
+
+def _migration_3_split_features(conn):
+    """
+    Moves the feature BLOBs into item_features so metadata scans
+    (filters, counts, stats) never pull vector pages through the cache.
+    SQLite cannot drop columns portably, so `items` is rebuilt.
+    """
+    conn.execute("""
+    CREATE TABLE item_features (
+        item_id INTEGER PRIMARY KEY,
+        features_color BLOB,
+        features_text BLOB,
+        FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE
+    );
+    """)
+    conn.execute("""
+        INSERT INTO item_features (item_id, features_color, features_text)
+        SELECT id, features_color, features_text FROM items
+    """)
+
+    conn.execute("""
+    CREATE TABLE items_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        status TEXT DEFAULT 'OPEN',
+        type TEXT NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        image_path TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    conn.execute("""
+        INSERT INTO items_new (id, user_id, status, type, category, description, image_path, timestamp)
+        SELECT id, user_id, status, type, category, description, image_path, timestamp FROM items
+    """)
+    conn.execute("DROP TABLE items;")
+    conn.execute("ALTER TABLE items_new RENAME TO items;")
+    _migration_2_item_indexes(conn)  # indexes were dropped with the old table
+
+def _migration_4_matches(conn):
+    """
+    Precomputed LOST <-> FOUND candidates (modules/matcher.py), stored in both
+    directions, plus the high-water marks of background jobs.
+    """
+    conn.execute("""
+    CREATE TABLE matches (
+        item_id INTEGER NOT NULL,
+        match_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (item_id, match_id),
+        FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE,
+        FOREIGN KEY (match_id) REFERENCES items (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """)
+    # Best-first reads per item; match_id side also needs one for the cascade.
+    conn.execute("CREATE INDEX idx_matches_item_score ON matches (item_id, score DESC);")
+    conn.execute("CREATE INDEX idx_matches_match ON matches (match_id);")
+    conn.execute("""
+    CREATE TABLE job_state (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+
+def _migration_5_lifecycle(conn):
+    """
+    Item lifecycle (modules/lifecycle.py): when an item last changed status, a log of
+    every status change (written by triggers, so writes from any process or tool are
+    captured) and the cold archive tables that closed items are moved into.
+    """
+    conn.execute("ALTER TABLE items ADD COLUMN status_changed_at TIMESTAMP;")
+    conn.execute("UPDATE items SET status_changed_at = timestamp WHERE status != 'OPEN';")
+    # TTL expiry scans OPEN items by age; archival scans closed items by status age.
+    conn.execute("CREATE INDEX idx_items_status_timestamp ON items (status, timestamp);")
+    conn.execute("CREATE INDEX idx_items_status_changed ON items (status, status_changed_at);")
+
+    # AUTOINCREMENT: sequence numbers are never reused after old entries are pruned.
+    conn.execute("""
+    CREATE TABLE status_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        status TEXT,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    conn.execute("CREATE INDEX idx_status_log_changed ON status_log (changed_at);")
+    conn.execute("""
+    CREATE TRIGGER trg_items_status AFTER UPDATE OF status ON items
+    WHEN NEW.status IS NOT OLD.status
+    BEGIN
+        UPDATE items SET status_changed_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        INSERT INTO status_log (item_id, status) VALUES (NEW.id, NEW.status);
+    END;
+    """)
+    # A deleted (archived) item is logged with a NULL status.
+    conn.execute("""
+    CREATE TRIGGER trg_items_delete AFTER DELETE ON items
+    BEGIN
+        INSERT INTO status_log (item_id, status) VALUES (OLD.id, NULL);
+    END;
+    """)
+
+    # Cold storage: same columns, no foreign keys (users are never deleted in practice,
+    # and nothing joins archived rows on the search path).
+    conn.execute("""
+    CREATE TABLE items_archive (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        status TEXT,
+        type TEXT NOT NULL,
+        category TEXT NOT NULL,
+        description TEXT,
+        image_path TEXT,
+        timestamp TIMESTAMP,
+        status_changed_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    conn.execute("CREATE INDEX idx_items_archive_user ON items_archive (user_id);")
+    conn.execute("""
+    CREATE TABLE item_features_archive (
+        item_id INTEGER PRIMARY KEY,
+        features_color BLOB,
+        features_text BLOB
+    );
+    """)
+
+MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_item_indexes),
+    (3, _migration_3_split_features),
+    (4, _migration_4_matches),
+    (5, _migration_5_lifecycle),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn=None):
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def init_db():
+    """Brings the database up to SCHEMA_VERSION (safe to call on every start)."""
+    conn = get_connection()
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return
+
+    # Table rebuilds must not fire ON DELETE CASCADE; the pragma is a no-op inside a transaction.
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        for version, step in MIGRATIONS:
+            with conn:
+                # IMMEDIATE takes the write lock first, so a concurrent process
+                # (e.g. the seeder) cannot run the same step twice.
+                conn.execute("BEGIN IMMEDIATE;")
+                if get_schema_version(conn) >= version:
+                    continue
+                step(conn)
+                broken = conn.execute("PRAGMA foreign_key_check;").fetchall()
+                if broken:
+                    raise sqlite3.IntegrityError(f"Migration {version} left {len(broken)} dangling references")
+                conn.execute(f"PRAGMA user_version = {version};")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON;")
 
 def add_user(username, password_hash, contact_info):
     conn = get_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO users (username, password_hash, contact_info) VALUES (?, ?, ?)", 
-                       (username, password_hash, contact_info))
-        conn.commit()
+        # `with conn` commits, or rolls back so the pooled connection is never left mid-transaction
+        with conn:
+            cursor = conn.execute("INSERT INTO users (username, password_hash, contact_info) VALUES (?, ?, ?)", 
+                                  (username, password_hash, contact_info))
         return cursor.lastrowid
     except sqlite3.IntegrityError:
         return None
-    finally:
-        conn.close()
 
 def get_user_by_username(username):
     conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
     user = cursor.fetchone()
-    conn.close()
     return user
 
-def add_item(user_id, item_type, category, description, image_path, features_col, features_txt):
+def get_user_by_id(user_id):
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO items (user_id, status, type, category, description, image_path, features_color, features_text)
-        VALUES (?, 'OPEN', ?, ?, ?, ?, ?, ?)
-    """, (user_id, item_type, category, description, image_path, features_col, features_txt))
-    conn.commit()
-    item_id = cursor.lastrowid
-    conn.close()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    user = cursor.fetchone()
+    return user
+
+def update_password_hash(user_id, password_hash):
+    """Replaces a user's stored hash (auth.py re-hashes on login). Returns True if a row changed."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+    return cursor.rowcount > 0
+
+# ==========================
+# CHANGE LISTENERS
+# ==========================
+# In-process caches (e.g. modules/index.py) subscribe here so writes made
+# through this module update them in place instead of forcing a reload.
+_listeners = []
+
+def add_listener(callback):
+    """Registers callback(event, item_id) for 'add', 'status', 'category', 'features' and 'archive' events."""
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+def _notify(event, item_id):
+    for callback in list(_listeners):
+        callback(event, item_id)
+
+# Shared SQL text, so the per-connection prepared statement cache gets hits
+INSERT_ITEM = """
+        INSERT INTO items (user_id, status, type, category, description, image_path)
+        VALUES (?, 'OPEN', ?, ?, ?, ?)
+"""
+INSERT_FEATURES = "INSERT INTO item_features (item_id, features_color, features_text) VALUES (?, ?, ?)"
+
+@metrics.timed("db.add_item")
+def add_item(user_id, item_type, category, description, image_path, features_col, features_txt):
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(INSERT_ITEM, (user_id, item_type, category, description, image_path))
+        item_id = cursor.lastrowid
+        conn.execute(INSERT_FEATURES, (item_id, features_col, features_txt))
+    _notify("add", item_id)
     return item_id
 
-def get_candidates(target_type):
+@metrics.timed("db.add_items_bulk")
+def add_items_bulk(rows):
     """
-    Retrieves matches AND joins with users table to get contact info.
+    Inserts many items in ONE transaction (executemany).
+    rows: iterable of (user_id, item_type, category, description, image_path, features_col, features_txt)
+    Returns the new item ids.
     """
+    rows = list(rows)
+    if not rows:
+        return []
+    conn = get_connection()
+    with conn:
+        conn.executemany(INSERT_ITEM, (row[:5] for row in rows))
+        # The transaction holds the write lock, so the new ids are contiguous.
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        item_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+        conn.executemany(INSERT_FEATURES, ((item_id,) + tuple(row[5:]) for item_id, row in zip(item_ids, rows)))
+    for item_id in item_ids:
+        _notify("add", item_id)
+    return item_ids
+
+ITEM_PATHS_QUERY = "SELECT image_path FROM items WHERE user_id = ?"
+ARCHIVE_PATHS_QUERY = "SELECT image_path FROM items_archive WHERE user_id = ?"
+USER_ITEMS_QUERY = """
+        SELECT id, type, status, category, description, image_path, timestamp, 0 AS archived
+        FROM items WHERE user_id = ? ORDER BY id DESC
+"""
+USER_ARCHIVE_QUERY = """
+        SELECT id, type, status, category, description, image_path, timestamp, 1 AS archived
+        FROM items_archive WHERE user_id = ? ORDER BY id DESC
+"""
+
+def get_user_items(user_id, include_archived=False):
+    """A user's own reports, newest first (optionally with the archived ones, marked by row['archived'])."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(USER_ITEMS_QUERY, (user_id,))
+    items = cursor.fetchall()
+    if include_archived:
+        # Two indexed reads merged here: a UNION ... ORDER BY would need a temp sort.
+        items = sorted(items + conn.execute(USER_ARCHIVE_QUERY, (user_id,)).fetchall(),
+                       key=lambda row: row['id'], reverse=True)
+    return items
+
+def get_item_paths(user_id):
+    """Image paths of every item owned by a user, archived ones included (used to skip already-ingested files)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(ITEM_PATHS_QUERY, (user_id,))
+    paths = {row[0] for row in cursor.fetchall()}
+    cursor.execute(ARCHIVE_PATHS_QUERY, (user_id,))
+    paths.update(row[0] for row in cursor.fetchall())
+    return paths
+
+def update_item_status(item_id, status, expected=None):
+    """
+    Changes an item's status (e.g. OPEN -> CLAIMED). With `expected`, only if the
+    item is currently in one of those statuses. Returns True if a row changed.
+    """
+    conn = get_connection()
+    with conn:
+        if expected is None:
+            cursor = conn.execute("UPDATE items SET status = ? WHERE id = ?", (status, item_id))
+        else:
+            expected = list(expected)
+            placeholders = ",".join("?" * len(expected))
+            cursor = conn.execute(f"UPDATE items SET status = ? WHERE id = ? AND status IN ({placeholders})",
+                                  [status, item_id] + expected)
+    changed = cursor.rowcount > 0
+    if changed:
+        _notify("status", item_id)
+    return changed
+
+def update_item_categories(pairs):
+    """Re-labels items in one transaction. pairs: iterable of (item_id, category)."""
+    pairs = list(pairs)
+    if not pairs:
+        return
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE items SET category = ? WHERE id = ?",
+                         [(category, item_id) for item_id, category in pairs])
+    for item_id, _ in pairs:
+        _notify("category", item_id)
+
+def get_image_rows(after_id=0, limit=500, item_type=None):
+    """(id, category, image_path) of items past after_id, in id order (batched scans)."""
     conn = get_connection()
     cursor = conn.cursor()
-    # CRITICAL FIX: explicit JOIN to fetch contact_info
     cursor.execute("""
-        SELECT items.id, items.category, items.description, items.image_path, 
-               items.features_color, items.features_text, users.contact_info
+        SELECT id, category, image_path
+        FROM items
+        WHERE id > ? AND (? IS NULL OR type = ?)
+        ORDER BY id
+        LIMIT ?
+    """, (after_id, item_type, item_type, limit))
+    rows = cursor.fetchall()
+    return rows
+
+def update_text_features(pairs):
+    """Rewrites stored text vectors in one transaction. pairs: iterable of (item_id, features_text)."""
+    pairs = list(pairs)
+    if not pairs:
+        return
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE item_features SET features_text = ? WHERE item_id = ?",
+                         [(blob, item_id) for item_id, blob in pairs])
+    for item_id, _ in pairs:
+        _notify("features", item_id)
+
+def get_text_rows(after_id=0, limit=500):
+    """(id, description, features_text) of every item past after_id, in id order (batched scans)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT items.id, items.description, item_features.features_text
+        FROM items
+        LEFT JOIN item_features ON item_features.item_id = items.id
+        WHERE items.id > ?
+        ORDER BY items.id
+        LIMIT ?
+    """, (after_id, limit))
+    rows = cursor.fetchall()
+    return rows
+
+ITEM_COLUMNS = """
+        SELECT items.id, items.type, items.status, items.category, items.description, items.image_path, 
+               item_features.features_color, item_features.features_text, users.contact_info
         FROM items 
         JOIN users ON items.user_id = users.id 
-        WHERE items.type = ? AND items.status = 'OPEN'
-    """, (target_type,))
+        LEFT JOIN item_features ON item_features.item_id = items.id
+"""
+
+def get_item(item_id):
+    """Single item with the same columns as get_candidates (plus type/status)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(ITEM_COLUMNS + " WHERE items.id = ?", (item_id,))
+    item = cursor.fetchone()
+    return item
+
+def get_item_owner(item_id):
+    """user_id of a live item, or None if there is no such item (archived ones included)."""
+    row = get_connection().execute("SELECT user_id FROM items WHERE id = ?", (item_id,)).fetchone()
+    return row[0] if row else None
+
+DISPLAY_COLUMNS = """
+        SELECT items.id, items.type, items.status, items.category, items.description,
+               items.image_path, users.contact_info
+        FROM items
+        JOIN users ON items.user_id = users.id
+"""
+IDS_BATCH = 500  # stays under SQLite's bound-parameter limit
+
+def get_items(item_ids):
+    """{id: row} with the display columns (no feature BLOBs) for the given ids."""
+    item_ids = list(item_ids)
+    conn = get_connection()
+    rows = {}
+    for start in range(0, len(item_ids), IDS_BATCH):
+        chunk = item_ids[start:start + IDS_BATCH]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(DISPLAY_COLUMNS + f" WHERE items.id IN ({placeholders})", chunk):
+            rows[row['id']] = row
+    return rows
+
+def get_item_ids(status='OPEN'):
+    """Sorted int64 array of the ids of every item with this status."""
+    cursor = get_connection().execute("SELECT id FROM items WHERE status = ? ORDER BY id", (status,))
+    return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+
+# Query text is shared with evaluation/query_plans.py, which checks the index is used.
+CANDIDATES_QUERY = ITEM_COLUMNS + """
+        WHERE items.type = ? AND items.status = ? AND items.id > ?
+        ORDER BY items.id
+"""
+POOL_STATS_QUERY = "SELECT type, status, COUNT(*), MAX(id) FROM items GROUP BY type, status"
+
+@metrics.timed("db.get_candidates")
+def get_candidates(target_type, status='OPEN', after_id=0):
+    """
+    Retrieves matches AND joins with users table to get contact info.
+    after_id lets incremental readers fetch only rows newer than the last one they saw.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    # CRITICAL FIX: explicit JOIN to fetch contact_info
+    cursor.execute(CANDIDATES_QUERY, (target_type, status, after_id))
     candidates = cursor.fetchall()
-    conn.close()
-    return candidates
\ No newline at end of file
+    return candidates
+
+def get_pool_stats():
+    """
+    Cheap change detector: {(type, status): (row_count, max_id)} for the whole table.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(POOL_STATS_QUERY)
+    stats = {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+    return stats
+
+# ==========================
+# MATCHES & BACKGROUND JOBS
+# ==========================
+
+NEW_ITEMS_QUERY = ITEM_COLUMNS + """
+        WHERE items.id > ?
+        ORDER BY items.id
+        LIMIT ?
+"""
+MATCHES_QUERY = """
+        SELECT matches.score, items.id, items.type, items.status, items.category,
+               items.description, items.image_path, users.contact_info
+        FROM matches
+        JOIN items ON items.id = matches.match_id
+        JOIN users ON users.id = items.user_id
+        WHERE matches.item_id = ? AND items.status = 'OPEN'
+        ORDER BY matches.score DESC
+        LIMIT ?
+"""
+
+def get_new_items(after_id=0, limit=500):
+    """Items of any type/status past after_id, in id order, with features (job feeds)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(NEW_ITEMS_QUERY, (after_id, limit))
+    rows = cursor.fetchall()
+    return rows
+
+def get_job_state(name):
+    """Last item id a background job has fully processed (0 if it never ran)."""
+    row = get_connection().execute("SELECT last_id FROM job_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+def save_matches(triples, job_name=None, last_id=None):
+    """
+    Stores (item_id, match_id, score) in both directions and, in the SAME
+    transaction, advances job_name's high-water mark, so a crash never loses
+    or double-counts a batch.
+    """
+    rows = [(a, b, s) for a, b, s in triples] + [(b, a, s) for a, b, s in triples]
+    conn = get_connection()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO matches (item_id, match_id, score) VALUES (?, ?, ?)", rows)
+        if job_name is not None:
+            conn.execute("INSERT OR REPLACE INTO job_state (name, last_id) VALUES (?, ?)", (job_name, last_id))
+
+@metrics.timed("db.get_matches")
+def get_matches(item_id, limit=5):
+    """Precomputed best OPEN counterparts of an item, best first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(MATCHES_QUERY, (item_id, limit))
+    matches = cursor.fetchall()
+    return matches
+
+# ==========================
+# LIFECYCLE & ARCHIVE (modules/lifecycle.py)
+# ==========================
+
+# Age counts from the last (re)opening: a renewed or reopened report gets a full TTL again.
+# status_changed_at is never earlier than timestamp, so the timestamp range still drives the index.
+EXPIRE_QUERY = """
+        SELECT id FROM items
+        WHERE status = 'OPEN' AND timestamp < datetime('now', ?1)
+          AND (status_changed_at IS NULL OR status_changed_at < datetime('now', ?1)) AND type = ?2
+        LIMIT ?3
+"""
+ARCHIVE_QUERY = """
+        SELECT id FROM items
+        WHERE status = ? AND status_changed_at < datetime('now', ?)
+        LIMIT ?
+"""
+STATUS_LOG_QUERY = "SELECT seq, item_id, status FROM status_log WHERE seq > ? ORDER BY seq LIMIT ?"
+STATUS_COUNTS_QUERY = "SELECT status, COUNT(*) FROM items GROUP BY status"
+
+def get_last_item_id():
+    """Highest item id ever assigned (AUTOINCREMENT keeps it even after archival deletes rows)."""
+    row = get_connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'items'").fetchone()
+    return row[0] if row else 0
+
+@metrics.timed("db.expire_items")
+def expire_items(item_type, max_age_days, limit=IDS_BATCH):
+    """Marks one batch of OPEN items of a type open for over max_age_days EXPIRED. Returns their ids."""
+    conn = get_connection()
+    with conn:
+        # IMMEDIATE: no other writer can change these rows between the SELECT and the UPDATE.
+        conn.execute("BEGIN IMMEDIATE;")
+        item_ids = [row[0] for row in conn.execute(EXPIRE_QUERY, (f"-{max_age_days} days", item_type, limit))]
+        conn.executemany("UPDATE items SET status = 'EXPIRED' WHERE id = ?", [(item_id,) for item_id in item_ids])
+    for item_id in item_ids:
+        _notify("status", item_id)
+    return item_ids
+
+@metrics.timed("db.archive_items")
+def archive_items(status, min_age_days, limit=IDS_BATCH):
+    """
+    Moves one batch of items that have been in `status` for at least min_age_days,
+    with their feature BLOBs, into the archive tables (one transaction). Returns their ids.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        item_ids = [row[0] for row in conn.execute(ARCHIVE_QUERY, (status, f"-{min_age_days} days", limit))]
+        if item_ids:
+            placeholders = ",".join("?" * len(item_ids))
+            conn.execute(f"""
+                INSERT INTO items_archive (id, user_id, status, type, category, description, image_path,
+                                           timestamp, status_changed_at)
+                SELECT id, user_id, status, type, category, description, image_path, timestamp, status_changed_at
+                FROM items WHERE id IN ({placeholders})
+            """, item_ids)
+            conn.execute(f"""
+                INSERT INTO item_features_archive (item_id, features_color, features_text)
+                SELECT item_id, features_color, features_text FROM item_features WHERE item_id IN ({placeholders})
+            """, item_ids)
+            # Cascades to item_features and matches; the delete trigger logs each id.
+            conn.execute(f"DELETE FROM items WHERE id IN ({placeholders})", item_ids)
+    for item_id in item_ids:
+        _notify("archive", item_id)
+    return item_ids
+
+def get_status_seq():
+    """Sequence number of the latest status_log entry (0 if none was ever written)."""
+    row = get_connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'status_log'").fetchone()
+    return row[0] if row else 0
+
+def get_status_changes(after_seq, limit=IDS_BATCH):
+    """
+    status_log entries past after_seq, oldest first: rows of (seq, item_id, status),
+    status NULL = archived. Returns None if some of them were already pruned.
+    """
+    conn = get_connection()
+    first = conn.execute("SELECT MIN(seq) FROM status_log").fetchone()[0]
+    if first is None:
+        first = get_status_seq() + 1
+    if after_seq < first - 1:
+        return None
+    return conn.execute(STATUS_LOG_QUERY, (after_seq, limit)).fetchall()
+
+def prune_status_log(max_age_days):
+    """Drops status_log entries older than max_age_days. Returns how many."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("DELETE FROM status_log WHERE changed_at < datetime('now', ?)", (f"-{max_age_days} days",))
+    return cursor.rowcount
+
+def get_status_counts():
+    """{status: count} of the live items table, plus 'ARCHIVED' for the archive."""
+    conn = get_connection()
+    counts = dict(conn.execute(STATUS_COUNTS_QUERY).fetchall())
+    counts["ARCHIVED"] = conn.execute("SELECT COUNT(*) FROM items_archive").fetchone()[0]
+    return counts
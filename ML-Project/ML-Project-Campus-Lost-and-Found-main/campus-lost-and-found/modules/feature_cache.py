@@ -0,0 +1,174 @@
+# File: modules/feature_cache.py
+# Purpose: Persistent on-disk cache of Color+HOG training vectors.
+# Layout: data/feature_cache/v<feature version>/
+#           features-<generation>.npy -> (N, D) float32 matrix, opened memory-mapped
+#           manifest.json             -> {sha256 of image bytes: row index} + current matrix file
+# A new matrix generation is fully written before the manifest switches to it,
+# so an interrupted run never leaves the manifest pointing at the wrong rows.
+# Retraining only extracts images whose content hash is not cached yet,
+# fanning the extraction out across CPU cores.
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from modules import features
+
+CACHE_DIR = "data/feature_cache"
+MANIFEST_FORMAT = 1
+FAILED = -1             # manifest marker for images that could not be decoded
+COMPACT_RATIO = 0.25    # rewrite the matrix once this share of rows is unused
+
+def file_digest(path):
+    """SHA-256 of the file contents (renames/moves keep their cache entry)."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def _extract(path):
+    """Worker: combined Color+HOG vector as float32, or None."""
+    try:
+        img = features.decode_image(path)
+        if img is None:
+            return None
+        color = features.get_raw_color_hist(img)
+        hog_feats = features.get_hog_features(img)
+        return np.concatenate([color, hog_feats]).astype(np.float32)
+    except Exception:
+        return None
+
+class FeatureCache:
+    """Content-addressed cache for one feature version (see module header)."""
+
+    def __init__(self, cache_dir=CACHE_DIR, feature_version=None):
+        self.feature_version = feature_version or features.VISUAL_FEATURE_VERSION
+        self.root = os.path.join(cache_dir, f"v{self.feature_version}")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        os.makedirs(self.root, exist_ok=True)
+        self.generation = 0
+        self.rows = self._load_manifest()
+
+    # ==========================
+    # 1. PUBLIC API
+    # ==========================
+
+    def load(self, paths, workers=None, log=print):
+        """
+        Returns (X, ok): X holds one row per readable image (in `paths` order),
+        ok is a boolean mask over `paths` marking which images made it into X.
+        Missing entries are extracted in parallel and appended to the cache.
+        """
+        digests = [file_digest(p) for p in paths]
+        missing = {}
+        for path, digest in zip(paths, digests):
+            if digest not in self.rows and digest not in missing:
+                missing[digest] = path
+
+        if missing:
+            log(f"    -> Feature cache: {len(paths) - len(missing)} hits, extracting {len(missing)} new images...")
+            self._extract_missing(missing, workers)
+        else:
+            log(f"    -> Feature cache: all {len(paths)} images cached.")
+
+        self._compact(set(digests))
+
+        matrix = self._open_matrix()
+        index = np.array([self.rows[d] for d in digests], dtype=np.int64)
+        ok = index != FAILED
+        # Fancy indexing copies the rows out, so the mapping can be released right away.
+        X = matrix[index[ok]] if matrix is not None else np.zeros((0, 0), np.float32)
+        del matrix
+        return X, ok
+
+    # ==========================
+    # 2. STORAGE
+    # ==========================
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != MANIFEST_FORMAT:
+            return {}
+        self.generation = manifest["generation"]
+        return manifest["rows"]
+
+    def _matrix_path(self, generation):
+        return os.path.join(self.root, f"features-{generation}.npy")
+
+    def _save_manifest(self, generation=None):
+        """Atomically publishes the row map (and optionally a new matrix generation)."""
+        previous = self.generation
+        if generation is not None:
+            self.generation = generation
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": MANIFEST_FORMAT, "feature_version": self.feature_version,
+                       "generation": self.generation, "rows": self.rows}, f)
+        os.replace(tmp_path, self.manifest_path)
+        if self.generation != previous and os.path.exists(self._matrix_path(previous)):
+            os.remove(self._matrix_path(previous))
+
+    def _open_matrix(self, mmap=True):
+        path = self._matrix_path(self.generation)
+        if not os.path.exists(path):
+            return None
+        # Rewrites read a private copy: Windows cannot delete a file that is still mapped.
+        return np.load(path, mmap_mode="r" if mmap else None)
+
+    def _write_matrix(self, old_rows, new_vectors):
+        """Writes old_rows + new_vectors as the next generation; returns its number."""
+        dim = new_vectors.shape[1] if len(new_vectors) else old_rows.shape[1]
+        total = len(old_rows) + len(new_vectors)
+        generation = self.generation + 1
+        out = np.lib.format.open_memmap(
+            self._matrix_path(generation), mode="w+", dtype=np.float32, shape=(total, dim)
+        )
+        if len(old_rows):
+            out[:len(old_rows)] = old_rows
+        if len(new_vectors):
+            out[len(old_rows):] = new_vectors
+        out.flush()
+        del out
+        return generation
+
+    def _extract_missing(self, missing, workers):
+        digests = list(missing)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            vectors = list(pool.map(_extract, [missing[d] for d in digests], chunksize=16))
+
+        matrix = self._open_matrix(mmap=False)
+        start = 0 if matrix is None else matrix.shape[0]
+        fresh = []
+        for digest, vec in zip(digests, vectors):
+            if vec is None:
+                self.rows[digest] = FAILED
+            else:
+                self.rows[digest] = start + len(fresh)
+                fresh.append(vec)
+
+        generation = None
+        if fresh:
+            old = matrix if matrix is not None else np.zeros((0, len(fresh[0])), np.float32)
+            generation = self._write_matrix(old, np.vstack(fresh))
+        self._save_manifest(generation)
+
+    def _compact(self, keep):
+        """Drops rows for images that no longer exist in the dataset."""
+        stale = [d for d in self.rows if d not in keep]
+        used = sum(1 for r in self.rows.values() if r != FAILED)
+        if not stale or used == 0 or len(stale) < COMPACT_RATIO * used:
+            return
+
+        matrix = self._open_matrix(mmap=False)
+        kept = [(d, r) for d, r in self.rows.items() if d in keep]
+        live = [(d, r) for d, r in kept if r != FAILED]
+        order = np.array([r for _, r in live], dtype=np.int64)
+        generation = self._write_matrix(matrix[order], np.zeros((0, matrix.shape[1]), np.float32))
+        self.rows = {d: i for i, (d, _) in enumerate(live)}
+        self.rows.update({d: FAILED for d, r in kept if r == FAILED})
+        self._save_manifest(generation)
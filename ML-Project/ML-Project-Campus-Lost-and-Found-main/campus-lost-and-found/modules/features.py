@@ -1,68 +1,178 @@
 # File: modules/features.py
 # Purpose: Advanced Feature Extraction (Color + HOG) & Auto-Classification.
-# Tech: OpenCV (HSV Histograms), Scikit-Image (HOG), Scikit-Learn (TF-IDF).
+# Tech: OpenCV (HSV Histograms), Scikit-Image / NumPy (HOG), Scikit-Learn (hashed term counts).
 
-import cv2
 import numpy as np
 import pickle
 import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from skimage.feature import hog
-from skimage.transform import resize
+import threading
+import time
+from modules import codec, metrics
+
+# Heavy libraries (cv2, scikit-image, scikit-learn: ~2 s together) are imported
+# inside the functions that need them, so importing this module stays cheap.
+# start_warmup() pays for them, and for the classifier, off the request path.
 
 # --- CONFIGURATION ---
 MODEL_PATH = "modules/category_classifier.pkl"
-SEED_VOCAB = [
-    "blue", "red", "green", "black", "white", "silver", "gold", "yellow", "grey", "orange", "purple",
-    "keys", "wallet", "phone", "iphone", "samsung", "laptop", "macbook", "dell",
-    "backpack", "bag", "purse", "bottle", "water", "hydroflask",
-    "jacket", "coat", "hoodie", "sweater", "glasses", "sunglasses",
-    "id", "card", "student", "license", "credit",
-    "bracelet", "calculator", "charger", "earphones", "headphones", 
-    "keyboard", "mouse", "smartphone", "waterbottle", "wristwatch",
-    "lost", "found", "campus", "library", "cafeteria", "gym", "room", "hall"
-]
-
-text_engine = TfidfVectorizer(vocabulary=SEED_VOCAB)
-text_engine.fit(SEED_VOCAB)
+# Compact inference export of the same model (modules/forest.py), preferred when current.
+COMPACT_MODEL_PATH = "modules/category_classifier.lfrf"
+# Bump when an extractor changes so stored vectors are never compared across versions.
+# HOG extractors -> the visual feature version their vectors are tagged with:
+#   skimage     : reference implementation (skimage resize + skimage hog)
+#   opencv      : cv2 anti-aliased resize + vectorized NumPy HOG, numerically
+#                 equivalent to 'skimage' (same version), ~2.5x faster
+#   opencv-area : cv2 INTER_AREA resize, ~20x faster but a different vector
+HOG_EXTRACTORS = {"skimage": 1, "opencv": 1, "opencv-area": 2}
+HOG_EXTRACTOR = os.environ.get("LF_HOG_EXTRACTOR", "opencv")
+if HOG_EXTRACTOR not in HOG_EXTRACTORS:
+    raise ValueError(f"LF_HOG_EXTRACTOR must be one of {sorted(HOG_EXTRACTORS)}, got {HOG_EXTRACTOR!r}")
+VISUAL_FEATURE_VERSION = HOG_EXTRACTORS[HOG_EXTRACTOR]
+# Text feature versions: 1 = TF-IDF over a fixed 57-word seed vocabulary (retired),
+#                        2 = hashed term counts (IDF from the item corpus at score time)
+TEXT_FEATURE_VERSION = 2
+HOG_SIZE = 64
+# Words are hashed straight to columns, so new vocabulary never changes existing vectors.
+# Stored text vectors hold raw term counts; IDF (modules/text_model.py) is applied at score time.
+TEXT_HASH_FEATURES = 2 ** 18
+# predict_categories() extracts batches at least this big in a process pool.
+PARALLEL_MIN_BATCH = 16
 
+_text_engine = None
+_text_analyzer = None
 _classifier = None
+_classifier_lock = threading.Lock()
+
+def get_text_engine():
+    """HashingVectorizer for descriptions (stateless, built on first use)."""
+    global _text_engine, _text_analyzer
+    if _text_engine is None:
+        from sklearn.feature_extraction.text import HashingVectorizer
+        engine = HashingVectorizer(n_features=TEXT_HASH_FEATURES, alternate_sign=False, norm=None)
+        _text_analyzer = engine.build_analyzer()
+        _text_engine = engine
+    return _text_engine
+
+def _compact_model_is_current():
+    if not os.path.exists(COMPACT_MODEL_PATH):
+        return False
+    # A pickle retrained after the last export wins over the stale compact copy.
+    return not os.path.exists(MODEL_PATH) or os.path.getmtime(COMPACT_MODEL_PATH) >= os.path.getmtime(MODEL_PATH)
 
 def load_ml_model():
     global _classifier
-    if _classifier is None and os.path.exists(MODEL_PATH):
-        with open(MODEL_PATH, "rb") as f:
-            _classifier = pickle.load(f)
+    if _classifier is None and (os.path.exists(MODEL_PATH) or os.path.exists(COMPACT_MODEL_PATH)):
+        # A request arriving mid-warm-up waits for that load instead of starting another.
+        with _classifier_lock:
+            if _classifier is None:
+                if _compact_model_is_current():
+                    from modules import forest
+                    _classifier = forest.load_forest(COMPACT_MODEL_PATH)
+                else:
+                    with open(MODEL_PATH, "rb") as f:
+                        _classifier = pickle.load(f)
     return _classifier
 
+# ==========================
+# 0. WARM-UP
+# ==========================
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+warmup_seconds = None  # wall time of the last completed warm-up (None until it finishes)
+
+def start_warmup():
+    """
+    Starts (once per process) a daemon thread that imports the heavy libraries,
+    loads the classifier and runs one tiny extraction, so the first real
+    upload does not pay for any of it. Returns the thread.
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_up, name="features-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+def _warm_up():
+    global warmup_seconds
+    start = time.perf_counter()
+    try:
+        get_text_engine()
+        import scipy.sparse  # used by the text search path (modules/search.py)
+        load_ml_model()
+        analyze_image(np.zeros((HOG_SIZE, HOG_SIZE, 3), dtype=np.uint8))
+        extract_text_vector("warm up")
+    except Exception as err:
+        print(f"[features] Warm-up failed: {err}")
+    warmup_seconds = time.perf_counter() - start
+
 # ==========================
 # 1. VISUAL FEATURES (COLOR + HOG)
 # ==========================
 
+def decode_image(source):
+    """
+    Returns a BGR image array from any supported source:
+      - file path (str / os.PathLike)
+      - raw encoded bytes (bytes, bytearray, memoryview)
+      - an upload object exposing getvalue() (e.g. Streamlit's UploadedFile)
+      - an already-decoded ndarray (returned as-is)
+    Returns None if the image cannot be decoded.
+    """
+    if source is None:
+        return None
+    if isinstance(source, np.ndarray):
+        return source
+    import cv2
+    if isinstance(source, (str, os.PathLike)):
+        return cv2.imread(os.fspath(source))
+    if hasattr(source, "getvalue"):
+        source = source.getvalue()
+    buffer = np.frombuffer(source, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+@metrics.timed("features.color_hist")
 def get_raw_color_hist(image_path):
     """
     Extracts Color Histogram (The 'Paint' of the object).
+    Accepts a path or anything decode_image understands.
     """
-    img = cv2.imread(image_path)
+    img = decode_image(image_path)
     if img is None: return None
+    import cv2
     hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
     # 8x8 bins = 64 features. Compact and fast.
     hist = cv2.calcHist([hsv], [0, 1], None, [8, 8], [0, 180, 0, 256])
     cv2.normalize(hist, hist, alpha=0, beta=1, norm_type=cv2.NORM_MINMAX)
     return hist.flatten()
 
-def get_hog_features(image_path):
+@metrics.timed("features.hog")
+def get_hog_features(image_path, extractor=None):
     """
     FEATURE ENGINEERING UPGRADE: HOG (Histogram of Oriented Gradients).
     Captures texture and edge directions (e.g., differentiates keys from a phone).
+    Accepts a path or anything decode_image understands.
+    extractor: one of HOG_EXTRACTORS (defaults to HOG_EXTRACTOR).
     """
-    img = cv2.imread(image_path)
+    img = decode_image(image_path)
     if img is None: return None
+    extractor = extractor or HOG_EXTRACTOR
+    if extractor == "opencv":
+        return _fast_hog(_resize_antialiased(img, HOG_SIZE))
+    if extractor == "opencv-area":
+        import cv2
+        resized = cv2.resize(img, (HOG_SIZE, HOG_SIZE), interpolation=cv2.INTER_AREA)
+        return _fast_hog(resized.astype(np.float32) / 255.0)
+    if extractor != "skimage":
+        raise ValueError(f"Unknown HOG extractor: {extractor}")
+    from skimage.feature import hog
+    from skimage.transform import resize
     
     # 1. Resize to fixed standard size (Critical for HOG)
     # We use 64x64 pixels to keep the vector size manageable (~1000 features)
-    resized_img = resize(img, (64, 64))
+    resized_img = resize(img, (HOG_SIZE, HOG_SIZE))
     
     # 2. Calculate HOG
     # orientations=9, pixels_per_cell=(8, 8) -> Standard config
@@ -78,75 +188,264 @@ def get_hog_features(image_path):
     
     return hog_features
 
-def extract_visual_vector(image_path):
+def _resize_antialiased(img, size):
     """
-    Combines Color (64 feats) + HOG (~1700 feats) into one robust vector.
+    Reproduces skimage.transform.resize (anti_aliasing=True, order=1) with OpenCV:
+    Gaussian pre-filter with sigma = (scale - 1) / 2, truncated at 4 sigma,
+    mirrored borders, then bilinear sampling on pixel centres.
     """
-    color = get_raw_color_hist(image_path)
-    hog_feats = get_hog_features(image_path)
-    
-    if color is None or hog_feats is None: return None
-    
-    # Concatenate features
-    # Color is small, so we might want to weigh it, but Random Forest handles scale well.
+    import cv2
+    img = img.astype(np.float64) / 255.0  # float64 like skimage, so HOG bins agree
+    rows, cols = img.shape[:2]
+    kernels = []
+    for scale in (cols / size, rows / size):
+        sigma = max(0.0, (scale - 1) / 2)
+        radius = int(4.0 * sigma + 0.5)
+        kernels.append(cv2.getGaussianKernel(2 * radius + 1, sigma) if radius else np.ones((1, 1)))
+    img = cv2.sepFilter2D(img, -1, kernels[0], kernels[1], borderType=cv2.BORDER_REFLECT_101)
+    return cv2.resize(img, (size, size), interpolation=cv2.INTER_LINEAR)
+
+def _fast_hog(image, orientations=9, cell=8, block=2):
+    """
+    Vectorized HOG with the same layout and maths as skimage.feature.hog
+    (central differences, strongest channel per pixel, unsigned bins,
+    L2-Hys block norm), so both produce interchangeable vectors.
+    """
+    g_row = np.zeros_like(image)
+    g_col = np.zeros_like(image)
+    g_row[1:-1] = image[2:] - image[:-2]
+    g_col[:, 1:-1] = image[:, 2:] - image[:, :-2]
+
+    # Keep the channel with the largest gradient magnitude at each pixel
+    if image.ndim == 3:
+        best = np.hypot(g_row, g_col).argmax(axis=2)[..., None]
+        g_row = np.take_along_axis(g_row, best, axis=2)[..., 0]
+        g_col = np.take_along_axis(g_col, best, axis=2)[..., 0]
+
+    magnitude = np.hypot(g_row, g_col)
+    angle = np.rad2deg(np.arctan2(g_row, g_col)) % 180
+    bins = np.minimum((angle // (180.0 / orientations)).astype(np.intp), orientations - 1)
+
+    # Per-cell orientation histograms (mean magnitude per bin)
+    n_rows, n_cols = magnitude.shape[0] // cell, magnitude.shape[1] // cell
+    magnitude = magnitude[:n_rows * cell, :n_cols * cell]
+    bins = bins[:n_rows * cell, :n_cols * cell]
+    cell_ids = (np.arange(n_rows * cell)[:, None] // cell) * n_cols + np.arange(n_cols * cell)[None, :] // cell
+    hist = np.bincount(
+        (cell_ids * orientations + bins).ravel(),
+        weights=magnitude.ravel(),
+        minlength=n_rows * n_cols * orientations
+    ).reshape(n_rows, n_cols, orientations) / (cell * cell)
+
+    # Overlapping blocks of block x block cells, L2-Hys normalized
+    blocks = np.lib.stride_tricks.sliding_window_view(hist, (block, block), axis=(0, 1))
+    blocks = blocks.transpose(0, 1, 3, 4, 2).reshape(n_rows - block + 1, n_cols - block + 1, -1)
+    eps = 1e-5
+    blocks = blocks / np.sqrt(np.sum(blocks ** 2, axis=-1, keepdims=True) + eps ** 2)
+    blocks = np.minimum(blocks, 0.2)
+    blocks = blocks / np.sqrt(np.sum(blocks ** 2, axis=-1, keepdims=True) + eps ** 2)
+    return blocks.ravel()
+
+@metrics.timed("features.analyze_image")
+def analyze_image(source, predict=True, extractor=None):
+    """
+    Single-decode pipeline: reads the image ONCE and derives everything from it.
+    Returns a dict with:
+      color    -> 64-bin HSV histogram
+      hog      -> HOG descriptor
+      vector   -> encoded Color+HOG blob (what add_item stores)
+      category -> classifier prediction (None if no model or predict=False)
+      ranking  -> [(category, probability), ...] most probable first ([] if no prediction)
+    Returns None if the image cannot be decoded.
+    """
+    img = decode_image(source)
+    if img is None: return None
+
+    extractor = extractor or HOG_EXTRACTOR
+    color = get_raw_color_hist(img)
+    hog_feats = get_hog_features(img, extractor)
     combined = np.concatenate([color, hog_feats])
-    return pickle.dumps(combined)
 
+    ranking = []
+    if predict:
+        # The classifier must see the same feature version it was trained on.
+        model_version = classifier_feature_version()
+        if model_version is not None and model_version != HOG_EXTRACTORS[extractor]:
+            model_hog = get_hog_features(img, extractor_for_version(model_version))
+            ranking = _rank_from_vector(np.concatenate([color, model_hog]))
+        else:
+            ranking = _rank_from_vector(combined)
+
+    return {
+        "color": color,
+        "hog": hog_feats,
+        "vector": codec.encode_vector(combined, HOG_EXTRACTORS[extractor]),
+        "category": ranking[0][0] if ranking else None,
+        "ranking": ranking,
+    }
+
+def extract_visual_vector(image_path, extractor=None):
+    """
+    Combines Color (64 feats) + HOG (~1700 feats) into one robust vector.
+    """
+    analysis = analyze_image(image_path, predict=False, extractor=extractor)
+    if analysis is None: return None
+    return analysis["vector"]
+
+def extractor_for_version(version):
+    """Fastest HOG extractor that produces vectors of the given feature version."""
+    for name in ("opencv-area", "opencv", "skimage"):
+        if HOG_EXTRACTORS[name] == version:
+            return name
+    raise ValueError(f"No HOG extractor produces feature version {version}")
+
+def classifier_feature_version():
+    """Visual feature version the classifier was trained on (None if no model)."""
+    clf = load_ml_model()
+    if clf is None:
+        return None
+    # Models trained before versioning used the skimage (v1) features.
+    return getattr(clf, "feature_version_", 1)
+
+@metrics.timed("features.predict_category")
 def predict_category(image_path):
     """
     Predicts category using the improved Color+HOG vector.
-    Returns None if model not trained (graceful fallback).
+    Returns None if model not trained or the image cannot be read (graceful fallback).
     """
+    ranking = predict_categories([image_path], top_k=1)[0]
+    return ranking[0][0] if ranking else None
+
+@metrics.timed("features.predict_categories")
+def predict_categories(sources, top_k=3, workers=None):
+    """
+    Batch classification: extracts the Color+HOG vectors (in parallel for larger
+    batches) and runs ONE predict_proba over all of them.
+    sources: paths, encoded bytes or decoded arrays (anything decode_image takes).
+    Returns one entry per source, in order:
+      [(category, probability), ...] top_k best first ([] if no model is trained),
+      or None if that image could not be decoded.
+    """
+    sources = list(sources)
     clf = load_ml_model()
-    if clf is None: 
-        return None  # Model not trained yet
-    
+    if clf is None:
+        return [[] for _ in sources]
+
+    # Extract with the HOG variant the classifier was trained on.
+    extractor = extractor_for_version(classifier_feature_version())
+    # Upload objects do not pickle; their bytes do.
+    jobs = [(s.getvalue() if hasattr(s, "getvalue") else s, extractor) for s in sources]
+    if len(jobs) >= PARALLEL_MIN_BATCH and workers != 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            vectors = list(pool.map(_classifier_input, jobs, chunksize=8))
+    else:
+        vectors = [_classifier_input(job) for job in jobs]
+
+    readable = [i for i, vec in enumerate(vectors) if vec is not None]
+    results = [None] * len(sources)
+    if readable:
+        with metrics.timer("features.classifier"):
+            probs = clf.predict_proba(np.vstack([vectors[i] for i in readable]))
+        for i, row in zip(readable, _rank_rows(clf, probs, top_k)):
+            results[i] = row
+    return results
+
+def _classifier_input(job):
+    """Worker: (source, extractor) -> float32 Color+HOG vector, or None if unreadable."""
+    import cv2
+    source, extractor = job
     try:
-        color = get_raw_color_hist(image_path)
-        hog_feats = get_hog_features(image_path)
-        
-        if color is not None and hog_feats is not None:
-            features = np.concatenate([color, hog_feats])
-            prediction = clf.predict([features])
-            return prediction[0]
-    except Exception as e:
+        img = decode_image(source)
+        if img is None:
+            return None
+        return np.concatenate([get_raw_color_hist(img), get_hog_features(img, extractor)]).astype(np.float32)
+    except (cv2.error, ValueError) as err:
+        # Decodes but cannot be processed (e.g. an odd channel layout). Anything else propagates.
+        print(f"[features] Skipping unreadable image: {err}")
         return None
-    return None
+
+def _rank_rows(clf, probs, top_k=None):
+    """[(category, probability), ...] per row of predict_proba output, best first."""
+    order = np.argsort(-probs, axis=1, kind="stable")[:, :top_k]
+    classes = [str(c) for c in clf.classes_]
+    return [[(classes[j], float(row[j])) for j in idx] for row, idx in zip(probs, order)]
+
+def _rank_from_vector(combined):
+    """
+    Runs the classifier on an already-extracted Color+HOG vector.
+    Returns [(category, probability), ...] best first; the head equals clf.predict.
+    """
+    clf = load_ml_model()
+    if clf is None:
+        return []
+    try:
+        with metrics.timer("features.classifier"):
+            probs = clf.predict_proba([combined])
+    except ValueError as err:
+        # Vector length differs from what the model was trained on (legacy model or vector).
+        print(f"[features] Classifier rejected the feature vector: {err}")
+        return []
+    return _rank_rows(clf, probs)[0]
 
 def get_visual_similarity(blob_a, blob_b):
     """
     Compares two vectors using Cosine Similarity.
     """
     if blob_a is None or blob_b is None: return 0.0
-    vec_a = pickle.loads(blob_a)
-    vec_b = pickle.loads(blob_b)
-    score = cosine_similarity(vec_a.reshape(1, -1), vec_b.reshape(1, -1))[0][0]
-    return float(score)
+    vec_a = codec.decode_vector(blob_a)
+    vec_b = codec.decode_vector(blob_b)
+    return _cosine(vec_a, vec_b)
+
+def _cosine(vec_a, vec_b):
+    """Cosine similarity of two flat vectors (0.0 if either is all zeros, like sklearn)."""
+    vec_a = np.asarray(vec_a, dtype=np.float64).ravel()
+    vec_b = np.asarray(vec_b, dtype=np.float64).ravel()
+    norm = np.linalg.norm(vec_a) * np.linalg.norm(vec_b)
+    return float(vec_a @ vec_b / norm) if norm > 0 else 0.0
 
 # ==========================
-# 2. TEXT FEATURES & XAI (Unchanged)
+# 2. TEXT FEATURES & XAI
 # ==========================
+@metrics.timed("features.text_vector")
 def extract_text_vector(text):
+    """Hashed term counts, stored sparse: only the words actually present are written."""
     if not text: text = ""
-    vector = text_engine.transform([text.lower()]).toarray()
-    return pickle.dumps(vector)
+    row = get_text_engine().transform([text])
+    row.sum_duplicates()
+    return codec.encode_sparse(row.indices, row.data, row.shape[1], TEXT_FEATURE_VERSION)
+
+@metrics.timed("features.text_vectors")
+def extract_text_vectors(texts):
+    """extract_text_vector for many descriptions, with one vectorizer pass."""
+    matrix = get_text_engine().transform([text or "" for text in texts])
+    matrix.sum_duplicates()
+    bounds = zip(matrix.indptr[:-1], matrix.indptr[1:])
+    return [codec.encode_sparse(matrix.indices[a:b], matrix.data[a:b], matrix.shape[1], TEXT_FEATURE_VERSION)
+            for a, b in bounds]
+
+def text_terms(text):
+    """
+    {column: word} for the words in `text`, in order of first appearance.
+    Hashing is one-way, so explanations map columns back through the query's own words.
+    """
+    engine = get_text_engine()
+    words = list(dict.fromkeys(_text_analyzer(text or "")))
+    if not words:
+        return {}
+    rows = engine.transform(words)  # one row per word
+    return {int(rows.indices[rows.indptr[i]]): word for i, word in enumerate(words)}
 
 def get_text_similarity(blob_a, blob_b):
     if blob_a is None or blob_b is None: return 0.0
-    vec_a = pickle.loads(blob_a)
-    vec_b = pickle.loads(blob_b)
-    score = cosine_similarity(vec_a, vec_b)[0][0]
-    return float(score)
+    vec_a = codec.decode_vector(blob_a)
+    vec_b = codec.decode_vector(blob_b)
+    return _cosine(vec_a, vec_b)
 
 def explain_text_match(text_query, text_candidate):
     if not text_query or not text_candidate: return []
-    vocab_words = text_engine.get_feature_names_out()
-    try:
-        vec_query = text_engine.transform([text_query.lower()]).toarray()[0]
-        vec_candidate = text_engine.transform([text_candidate.lower()]).toarray()[0]
-        overlap_indices = np.where((vec_query > 0) & (vec_candidate > 0))[0]
-        return [vocab_words[i] for i in overlap_indices]
-    except: return []
+    candidate_columns = text_terms(text_candidate)
+    return [word for column, word in text_terms(text_query).items() if column in candidate_columns]
 
 # ==========================
 # 3. HYBRID MATCHING
@@ -0,0 +1,194 @@
+# File: modules/forest.py
+# Purpose: Compact inference artifact for the category Random Forest.
+# Layout: one file, memory-mapped read-only on load (so worker processes share the pages):
+#
+#   offset  size  field
+#   0       4     magic  b"LFRF"
+#   4       4     header length H (uint32, little-endian)
+#   8       H     JSON header: format, classes, feature_version, input_dim, tree depth,
+#                 and {name: [dtype, shape, offset]} for every array below
+#   ...           arrays, each 64-byte aligned:
+#                   selected   int32   (n_selected,)        input dims the splits use
+#                   roots      int32   (n_trees,)           root node of each tree
+#                   feature    int16   (n_nodes,)           split dim (in `selected` space), -1 = leaf
+#                   threshold  float32 (n_nodes,)           go left if x <= threshold
+#                   left/right int32   (n_nodes,)           children; for leaves `left` is the leaf row
+#                   leaf_proba float32 (n_leaves, n_classes) class distribution per leaf
+#
+# Dimension selection: only the input dims some split actually uses are recorded
+# (`selected`); all others have zero importance, so dropping them is lossless.
+# Thresholds are rounded DOWN to float32, which keeps `x <= t` identical to
+# scikit-learn for float32 inputs (sklearn itself casts X to float32).
+
+import json
+import struct
+import numpy as np
+
+MAGIC = b"LFRF"
+FORMAT_VERSION = 1
+ALIGN = 64
+PREAMBLE = struct.Struct("<4sI")
+
+class CompactForest:
+    """Read-only forest with the subset of the sklearn classifier API that features.py uses."""
+
+    def __init__(self, header, arrays):
+        self.classes_ = np.array(header["classes"])
+        self.feature_version_ = header["feature_version"]
+        self.n_features_in_ = header["input_dim"]
+        self.selected = arrays["selected"]
+        self.roots = arrays["roots"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.leaf_proba = arrays["leaf_proba"]
+        self.max_depth = header["max_depth"]
+
+    def apply(self, X):
+        """Leaf row reached in every tree: (n_samples, n_trees)."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features_in_)[:, self.selected]
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        # All (sample, tree) pairs descend one level per step; leaves stay put.
+        for _ in range(self.max_depth):
+            feat = self.feature[node]
+            inner = feat >= 0
+            if not inner.any():
+                break
+            go_left = X[rows, np.where(inner, feat, 0)] <= self.threshold[node]
+            node = np.where(inner, np.where(go_left, self.left[node], self.right[node]), node)
+        return self.left[node]
+
+    def predict_proba(self, X):
+        """Mean leaf class distribution over trees (same as RandomForestClassifier)."""
+        return self.leaf_proba[self.apply(X)].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+# ==========================
+# 1. EXPORT
+# ==========================
+
+def _float32_floor(values):
+    """Largest float32 <= each float64 value."""
+    rounded = values.astype(np.float32)
+    too_big = rounded.astype(np.float64) > values
+    rounded[too_big] = np.nextafter(rounded[too_big], np.float32(-np.inf))
+    return rounded
+
+def _flatten_tree(tree, max_depth):
+    """Node arrays of one sklearn tree, optionally cut off at max_depth."""
+    children_left, children_right = tree.children_left, tree.children_right
+    keep, depth_of, stack = [], {0: 0}, [0]
+    while stack:  # pre-order walk, dropping everything below the depth limit
+        node = stack.pop()
+        keep.append(node)
+        is_split = children_left[node] != -1 and (max_depth is None or depth_of[node] < max_depth)
+        if is_split:
+            for child in (children_right[node], children_left[node]):
+                depth_of[child] = depth_of[node] + 1
+                stack.append(child)
+    new_id = {old: i for i, old in enumerate(keep)}
+
+    leaves = [old for old in keep if children_left[old] == -1 or new_id.get(children_left[old]) is None]
+    leaf_row = {old: i for i, old in enumerate(leaves)}
+    value = tree.value[:, 0, :]
+    proba = value[leaves] / np.maximum(value[leaves].sum(axis=1, keepdims=True), 1e-12)
+
+    feature = np.array([-1 if old in leaf_row else tree.feature[old] for old in keep], dtype=np.int64)
+    threshold = np.array([0.0 if old in leaf_row else tree.threshold[old] for old in keep])
+    left = np.array([leaf_row[old] if old in leaf_row else new_id[children_left[old]] for old in keep])
+    right = np.array([0 if old in leaf_row else new_id[children_right[old]] for old in keep])
+    depth = max(depth_of[old] for old in keep)
+    return feature, threshold, left, right, proba, depth
+
+def export_forest(model, path, feature_version=None, max_depth=None):
+    """
+    Writes a fitted RandomForestClassifier as a compact artifact.
+    max_depth (optional) truncates every tree there, turning cut nodes into leaves
+    (smaller/faster, slightly lossy; evaluation/classifier_benchmark.py reports the effect).
+    Returns the artifact's header dict.
+    """
+    parts = [_flatten_tree(est.tree_, max_depth) for est in model.estimators_]
+
+    used = np.unique(np.concatenate([p[0][p[0] >= 0] for p in parts]))
+    remap = np.full(model.n_features_in_, -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+
+    roots, features, thresholds, lefts, rights, probas = [], [], [], [], [], []
+    node_base = leaf_base = 0
+    for feature, threshold, left, right, proba, _ in parts:
+        inner = feature >= 0
+        roots.append(node_base)
+        features.append(np.where(inner, remap[feature], -1))
+        thresholds.append(threshold)
+        lefts.append(np.where(inner, left + node_base, left + leaf_base))
+        rights.append(np.where(inner, right + node_base, 0))
+        probas.append(proba)
+        node_base += len(feature)
+        leaf_base += len(proba)
+
+    arrays = {
+        "selected": used.astype(np.int32),
+        "roots": np.array(roots, dtype=np.int32),
+        "feature": np.concatenate(features).astype(np.int16 if len(used) < 2 ** 15 else np.int32),
+        "threshold": _float32_floor(np.concatenate(thresholds)),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "leaf_proba": np.vstack(probas).astype(np.float32),
+    }
+    header = {
+        "format": FORMAT_VERSION,
+        "classes": [str(c) for c in model.classes_],
+        "feature_version": feature_version if feature_version is not None else getattr(model, "feature_version_", 1),
+        "input_dim": int(model.n_features_in_),
+        "n_selected": int(len(used)),
+        "max_depth": int(max(p[5] for p in parts)) + 1,
+        "n_trees": len(parts),
+    }
+    _write(path, header, arrays)
+    return header
+
+def _write(path, header, arrays):
+    # Offsets depend on the header size, which depends on the offsets: iterate until stable.
+    layout = {}
+    while True:
+        header["arrays"] = layout
+        blob = json.dumps(header).encode("utf-8")
+        offset = PREAMBLE.size + len(blob)
+        new_layout = {}
+        for name, arr in arrays.items():
+            offset = -(-offset // ALIGN) * ALIGN
+            new_layout[name] = [arr.dtype.str, list(arr.shape), offset]
+            offset += arr.nbytes
+        if new_layout == layout:
+            break
+        layout = new_layout
+
+    with open(path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, len(blob)))
+        f.write(blob)
+        for name, arr in arrays.items():
+            f.seek(layout[name][2])
+            f.write(np.ascontiguousarray(arr).tobytes())
+
+# ==========================
+# 2. LOAD
+# ==========================
+
+def load_forest(path):
+    """Memory-maps an artifact written by export_forest (no copy, shared page cache)."""
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, header_len = PREAMBLE.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compact forest artifact")
+    header = json.loads(bytes(mm[PREAMBLE.size:PREAMBLE.size + header_len]).decode("utf-8"))
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported forest format {header['format']}")
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(mm, dtype=np.dtype(dtype), count=count, offset=offset).reshape(shape)
+    return CompactForest(header, arrays)
@@ -0,0 +1,112 @@
+# File: modules/image_store.py
+# Purpose: Content-addressed storage for uploaded images + memoized feature extraction.
+# Layout: data/item_images/<first 2 hex chars>/<sha256 of the bytes>.<jpg|png>
+#         The path is a function of the content, so the same photo is stored once,
+#         no matter how often Streamlit reruns or how many users upload it, and
+#         two different uploads can never collide.
+# Cache:  analyze() keeps the last ANALYSIS_CACHE_SIZE results per process keyed by
+#         the same hash, so re-analysing an upload on a rerun or re-searching with
+#         the same photo costs one SHA-256 instead of decode + HOG.
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from modules import features
+
+STORE_DIR = "data/item_images"
+ANALYSIS_CACHE_SIZE = 256
+HASH_CHUNK = 1 << 20
+
+_analysis_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _buffer(file_obj):
+    """Zero-copy view of an upload's bytes (Streamlit UploadedFile, BytesIO, bytes...)."""
+    if hasattr(file_obj, "getbuffer"):
+        return file_obj.getbuffer()
+    if hasattr(file_obj, "getvalue"):
+        return memoryview(file_obj.getvalue())
+    return memoryview(file_obj)
+
+def content_digest(file_obj):
+    """SHA-256 hex digest of the upload's bytes."""
+    view = _buffer(file_obj)
+    sha = hashlib.sha256()
+    for start in range(0, len(view), HASH_CHUNK):
+        sha.update(view[start:start + HASH_CHUNK])
+    return sha.hexdigest()
+
+def path_for(digest, data):
+    """Store path of an image; the extension comes from its magic bytes, not the upload name."""
+    ext = ".png" if bytes(data[:8]) == b"\x89PNG\r\n\x1a\n" else ".jpg"
+    return os.path.join(STORE_DIR, digest[:2], digest + ext)
+
+# ==========================
+# 1. STORAGE
+# ==========================
+
+def save(file_obj, digest=None):
+    """
+    Stores the upload once and returns its path (existing copies are reused).
+    Pass the digest from analyze() to skip hashing again.
+    """
+    view = _buffer(file_obj)
+    digest = digest or content_digest(file_obj)
+    path = path_for(digest, view)
+    if os.path.exists(path):
+        return path
+
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    # Written to a temp file then renamed, so readers never see half an image
+    # and concurrent saves of the same bytes simply replace each other.
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for start in range(0, len(view), HASH_CHUNK):
+                out.write(view[start:start + HASH_CHUNK])
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+# ==========================
+# 2. MEMOIZED ANALYSIS
+# ==========================
+
+def analyze(file_obj, predict=True):
+    """
+    features.analyze_image() for an upload, memoized by content hash.
+    Returns (digest, analysis); analysis is None if the image cannot be decoded.
+    The returned dict is shared between callers and must not be modified.
+    """
+    digest = content_digest(file_obj)
+    found, analysis = lookup(digest, predict)
+    if not found:
+        analysis = remember(digest, predict, features.analyze_image(_buffer(file_obj), predict=predict))
+    return digest, analysis
+
+def lookup(digest, predict=True):
+    """(True, analysis) on a memo hit, else (False, None). For callers that extract elsewhere (service.py)."""
+    key = (digest, features.HOG_EXTRACTOR, predict)
+    with _cache_lock:
+        if key in _analysis_cache:
+            _analysis_cache.move_to_end(key)
+            return True, _analysis_cache[key]
+    return False, None
+
+def remember(digest, predict, analysis):
+    """Memoizes an analysis computed for `digest`; returns it."""
+    with _cache_lock:
+        _analysis_cache[(digest, features.HOG_EXTRACTOR, predict)] = analysis
+        while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+    return analysis
+
+def clear_cache():
+    with _cache_lock:
+        _analysis_cache.clear()
@@ -0,0 +1,536 @@
+# File: modules/index.py
+# Purpose: Process-wide in-memory vector index (kept warm across Streamlit reruns).
+# Design: One bucket per (type, status). Writes through modules/db.py append or
+#         tombstone rows in place; other processes (e.g. database_seeder.py) are
+#         detected through PRAGMA data_version and synced incrementally (new rows by
+#         id; status changes and archival by replaying db's status_log).
+#         Large pools can optionally use the IVF backend from modules/ann.py, or be
+#         scored exactly across worker processes (modules/shards.py).
+#         With store_dir set, OPEN pools are served from the memory-mapped segments of
+#         modules/vector_store.py instead of being loaded into RAM.
+
+import threading
+import numpy as np
+from modules import ann, db, features, metrics, search, shards, text_model, vector_store
+
+# Columns kept in memory for rendering (BLOBs live only in the matrices).
+ROW_FIELDS = ("id", "type", "status", "category", "description", "image_path", "contact_info")
+INITIAL_CAPACITY = 256
+# Rebuild the ANN structure once rows appended since the last build exceed this share.
+ANN_REBUILD_RATIO = 0.1
+# Same for the shared-memory shard snapshot (rows past it are scored in-process).
+SHARD_REBUILD_RATIO = 0.1
+
+# ==========================
+# 1. BUCKET (ONE CANDIDATE POOL)
+# ==========================
+
+class _GrowableMatrix:
+    """Row-normalized float32 matrix with amortized O(1) appends."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.capacity = capacity
+        self.dim = None
+        self.data = None
+
+    def put(self, pos, vector):
+        if vector is None:
+            return
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if self.dim is None:
+            self.dim = vector.shape[0]
+            self.data = np.zeros((self.capacity, self.dim), dtype=np.float32)
+        if vector.shape[0] != self.dim:
+            return  # Stale vector from another extractor: leave a zero row.
+        unit = search.normalize_query(vector, self.dim)
+        self.data[pos] = unit
+
+    def grow(self, capacity):
+        if self.data is not None:
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self.data.shape[0]] = self.data
+            self.data = grown
+        self.capacity = capacity
+
+    def view(self, size):
+        if self.data is None:
+            return np.zeros((size, 0), dtype=np.float32)
+        return self.data[:size]
+
+class _GrowableSparse:
+    """
+    CSR text matrix with amortized O(1) row appends. Keeps the raw term counts
+    plus an IDF-weighted, row-normalized copy of them for the current
+    text_model generation; reweight() refreshes that copy when the IDF changes.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.dim = None
+        self.indptr = np.zeros(capacity + 1, dtype=np.int32)
+        self.indices = np.zeros(capacity * 8, dtype=np.int32)
+        self.raw = np.zeros(capacity * 8, dtype=np.float32)
+        self.data = np.zeros(capacity * 8, dtype=np.float32)  # weighted unit rows
+        self.nnz = 0
+        self.generation = None
+        self.idf = None
+
+    def put(self, pos, entry):
+        """Appends row `pos` (rows arrive in order); entry is (indices, values, dim) or None."""
+        indices, values = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        if entry is not None:
+            if self.dim is None:
+                self.dim = entry[2]
+            if entry[2] == self.dim:  # Stale vector from another version: leave an empty row.
+                indices, values = entry[0], np.asarray(entry[1], dtype=np.float32)
+        end = self.nnz + len(indices)
+        if end > self.data.shape[0]:
+            capacity = max(end, self.data.shape[0] * 2)
+            self.indices = np.resize(self.indices, capacity)
+            self.raw = np.resize(self.raw, capacity)
+            self.data = np.resize(self.data, capacity)
+        self.indices[self.nnz:end] = indices
+        self.raw[self.nnz:end] = values
+        weighted = values * self.idf[indices] if self.idf is not None else values
+        self.data[self.nnz:end] = search.unit_values(weighted)
+        self.nnz = end
+        self.indptr[pos + 1] = end
+
+    def grow(self, capacity):
+        self.indptr = np.concatenate([self.indptr, np.zeros(capacity + 1 - self.indptr.shape[0], dtype=np.int32)])
+
+    def reweight(self, size, generation, idf):
+        """Re-applies a new IDF snapshot to every stored row (O(nnz), once per generation)."""
+        if generation == self.generation:
+            return
+        self.generation, self.idf = generation, idf
+        self._apply(size, idf)
+
+    def _apply(self, size, idf):
+        if self.dim is not None and self.dim != idf.shape[0]:
+            return
+        indptr = self.indptr[:size + 1]
+        weighted = self.raw[:self.nnz] * idf[self.indices[:self.nnz]]
+        sums = np.concatenate([[0.0], np.cumsum(weighted.astype(np.float64) ** 2)])
+        norms = np.sqrt(sums[indptr[1:]] - sums[indptr[:-1]]).astype(np.float32)
+        norms[norms == 0] = 1.0
+        self.data[:self.nnz] = weighted / np.repeat(norms, np.diff(indptr))
+
+    def view(self, size, raw=False):
+        # Wraps the live prefix without copying it.
+        from scipy import sparse  # deferred: ~0.3 s import, see features.start_warmup
+        values = self.raw if raw else self.data
+        return sparse.csr_matrix(
+            (values[:self.nnz], self.indices[:self.nnz], self.indptr[:size + 1]),
+            shape=(size, self.dim or 0), copy=False
+        )
+
+    @classmethod
+    def from_rows(cls, matrix, dim, capacity, generation, idf):
+        """Builds a fresh growable copy of a raw-count CSR matrix (used by compaction)."""
+        grown = cls(capacity)
+        grown.dim = dim
+        grown.nnz = matrix.nnz
+        grown.indptr[:matrix.shape[0] + 1] = matrix.indptr
+        grown.indptr[matrix.shape[0] + 1:] = matrix.nnz
+        length = max(matrix.nnz, capacity * 8)
+        grown.indices = np.resize(matrix.indices.astype(np.int32), length)
+        grown.raw = np.resize(matrix.data.astype(np.float32), length)
+        grown.data = np.zeros(length, dtype=np.float32)
+        grown._apply(matrix.shape[0], idf if idf is not None else np.ones(dim or 0, dtype=np.float32))
+        grown.generation, grown.idf = generation, idf
+        return grown
+
+class Bucket:
+    """All items of one (type, status) pool, in insertion (id) order."""
+
+    def __init__(self):
+        self.size = 0
+        self.max_id = 0
+        self.rows = []
+        self.positions = {}  # item id -> row position
+        self.by_category = {}  # lower-cased category -> [row positions] (dead rows filtered by `alive`)
+        self._category_arrays = {}  # category -> cached np.array of by_category[category]
+        self.alive = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.visual = _GrowableMatrix()
+        self.text = _GrowableSparse()
+        self.ann = None  # built lazily, covers rows [0, ann.n_built)
+        self.sharded = None  # shards.ShardedSnapshot, built lazily, covers rows [0, sharded.n_built)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def append(self, row):
+        if row['id'] in self.positions:
+            return
+        if self.size == self.alive.shape[0]:
+            capacity = self.size * 2
+            self.alive = np.concatenate([self.alive, np.zeros(capacity - self.size, dtype=bool)])
+            self.visual.grow(capacity)
+            self.text.grow(capacity)
+
+        pos = self.size
+        self.visual.put(pos, search.as_vector(row['features_color'], features.VISUAL_FEATURE_VERSION))
+        self.text.put(pos, search.as_sparse(row['features_text'], features.TEXT_FEATURE_VERSION))
+        self.rows.append({field: row[field] for field in ROW_FIELDS})
+        self.alive[pos] = True
+        self.positions[row['id']] = pos
+        category = str(row['category']).lower()
+        self.by_category.setdefault(category, []).append(pos)
+        self._category_arrays.pop(category, None)
+        self.size += 1
+        self.max_id = max(self.max_id, row['id'])
+
+    def remove(self, item_id):
+        """Tombstones a row; the slot is reclaimed on the next compaction."""
+        pos = self.positions.pop(item_id, None)
+        if pos is None:
+            return False
+        self.alive[pos] = False
+        if self.sharded is not None:
+            self.sharded.kill(pos)
+        if self.size > INITIAL_CAPACITY and len(self.positions) < self.size // 2:
+            self._compact()
+        return True
+
+    def _compact(self):
+        if self.sharded is not None:
+            self.sharded.close()  # Positions change: the next sharded search rebuilds it.
+        live = np.flatnonzero(self.alive[:self.size])
+        capacity = max(INITIAL_CAPACITY, len(live))
+        fresh = Bucket()
+        fresh.visual.dim = self.visual.dim
+        if self.visual.data is not None:
+            fresh.visual.data = np.zeros((capacity, self.visual.dim), dtype=np.float32)
+            fresh.visual.data[:len(live)] = self.visual.data[live]
+        fresh.text = _GrowableSparse.from_rows(self.text.view(self.size, raw=True)[live], self.text.dim,
+                                               capacity, self.text.generation, self.text.idf)
+        fresh.alive = np.zeros(capacity, dtype=bool)
+        fresh.alive[:len(live)] = True
+        fresh.rows = [self.rows[i] for i in live]
+        fresh.positions = {row['id']: i for i, row in enumerate(fresh.rows)}
+        for i, row in enumerate(fresh.rows):
+            fresh.by_category.setdefault(str(row['category']).lower(), []).append(i)
+        fresh.size = len(live)
+        fresh.max_id = self.max_id
+        fresh.visual.capacity = capacity
+        self.__dict__.update(fresh.__dict__)
+
+    def search(self, q_visual=None, q_text=None, k=None, min_score=search.MIN_SCORE,
+               ann_min_pool=None, ann_probe=ann.DEFAULT_PROBE, categories=None,
+               shard_min_pool=None, shard_workers=None):
+        """
+        Exact by default. With `categories`, only rows of those categories are scored.
+        Otherwise, with shard_min_pool set, pools at least that large are scored exactly
+        across worker processes; else, with ann_min_pool set, image-only queries on pools at
+        least that large score only the IVF shortlist (plus rows added since the last build).
+        Queries with text stay exact: the shortlist is visual, so it would drop strong text matches.
+        Text is scored with the current corpus IDF (modules/text_model.py).
+        """
+        generation, idf = text_model.current_weights()
+        self.text.reweight(self.size, generation, idf)
+        if categories is None and shard_min_pool and len(self) >= shard_min_pool:
+            return self._sharded_search([q_visual], [q_text], k, min_score, generation, idf, shard_workers)[0]
+        visual, text, alive = self.visual.view(self.size), self.text.view(self.size), self.alive[:self.size]
+        positions = None
+        if categories is not None:
+            positions = self._category_positions(categories)
+        elif ann_min_pool and k and q_visual is not None and q_text is None and len(self) >= ann_min_pool:
+            positions = self._ann_candidates(q_visual, k, ann_probe)
+        if positions is not None:
+            visual, text, alive = visual[positions], text[positions], alive[positions]
+
+        scores = search.score_matrices(visual, text, q_visual, q_text, text_weights=idf)
+        scores = np.where(alive, scores, -np.inf)
+        winners = search.top_k(scores, k, min_score)
+        if positions is not None:
+            return [(float(scores[i]), self.rows[positions[i]]) for i in winners]
+        return [(float(scores[i]), self.rows[i]) for i in winners]
+
+    def search_many(self, q_visuals, q_texts, k=None, min_score=None, shard_min_pool=None, shard_workers=None):
+        """search() for a batch of queries (exact, one matrix product); one result list per query."""
+        min_score = search.MIN_SCORE if min_score is None else min_score
+        generation, idf = text_model.current_weights()
+        self.text.reweight(self.size, generation, idf)
+        if shard_min_pool and len(self) >= shard_min_pool:
+            return self._sharded_search(q_visuals, q_texts, k, min_score, generation, idf, shard_workers)
+        scores = search.score_matrices_batch(self.visual.view(self.size), self.text.view(self.size),
+                                             q_visuals, q_texts, text_weights=idf)
+        scores[~self.alive[:self.size]] = -np.inf
+        return [
+            [(float(column[i]), self.rows[i]) for i in search.top_k(column, k, min_score)]
+            for column in scores.T
+        ]
+
+    def explain(self, query, item_ids):
+        """Shared query keywords per item id, from the stored text matrix (one bulk slice)."""
+        ids = [item_id for item_id in item_ids if item_id in self.positions]
+        rows = self.text.view(self.size)[[self.positions[item_id] for item_id in ids]]
+        keywords = search.keyword_overlap(rows, features.text_terms(query))
+        return dict(zip(ids, keywords))
+
+    def _category_positions(self, categories):
+        # Case-insensitive: classifier labels come from dataset folder names.
+        arrays = []
+        for category in {str(c).lower() for c in categories}:
+            if category not in self._category_arrays:
+                self._category_arrays[category] = np.array(self.by_category.get(category, []), dtype=np.int64)
+            arrays.append(self._category_arrays[category])
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+
+    def _ann_candidates(self, q_visual, k, n_probe):
+        q_vector = search.decode_query(q_visual, features.VISUAL_FEATURE_VERSION)
+        q_unit = search.normalize_query(q_vector, self.visual.dim or 0)
+        if q_unit is None:
+            return None
+        stale = self.ann is None or self.size - self.ann.n_built > ANN_REBUILD_RATIO * self.ann.n_built
+        if stale:
+            self.ann = ann.IVFIndex().build(self.visual.view(self.size))
+        tail = np.arange(self.ann.n_built, self.size)
+        return np.concatenate([self.ann.candidates(q_unit, k, n_probe), tail])
+
+    def _sharded_search(self, q_visuals, q_texts, k, min_score, generation, idf, workers):
+        """Exact search via the shard snapshot; rows appended since it was built are scored here."""
+        stale = (self.sharded is None or self.sharded.generation != generation
+                 or self.size - self.sharded.n_built > SHARD_REBUILD_RATIO * self.sharded.n_built)
+        if stale:
+            if self.sharded is not None:
+                self.sharded.close()
+            with metrics.timer("index.build_shards"):
+                self.sharded = shards.ShardedSnapshot(self.visual.view(self.size), self.text.view(self.size),
+                                                      self.alive[:self.size], generation, workers)
+        prepared = search.prepare_queries(self.visual.dim or 0, q_visuals, q_texts, text_weights=idf)
+        with metrics.timer("index.sharded_search"):
+            merged = self.sharded.search(prepared, k, min_score)
+
+        n_built = self.sharded.n_built
+        if n_built < self.size:
+            tail = search.score_prepared(self.visual.view(self.size)[n_built:],
+                                         self.text.view(self.size)[n_built:], prepared)
+            tail[~self.alive[n_built:self.size]] = -np.inf
+            for j, column in enumerate(tail.T):
+                winners = search.top_k(column, k, min_score)
+                positions = np.concatenate([merged[j][0], winners + n_built])
+                scores = np.concatenate([merged[j][1], column[winners]])
+                best = search.top_k(scores, k, -np.inf)
+                merged[j] = (positions[best], scores[best])
+        return [[(float(score), self.rows[pos]) for pos, score in zip(positions, scores)]
+                for positions, scores in merged]
+
+# ==========================
+# 2. PROCESS-WIDE INDEX
+# ==========================
+
+class VectorIndex:
+    """
+    Lazily warms each (type, status) bucket from SQLite on first use,
+    then keeps it current through db change events and data_version checks.
+    """
+
+    def __init__(self, ann_min_pool=None, ann_probe=ann.DEFAULT_PROBE, shard_min_pool=None, shard_workers=None,
+                 store_dir=None):
+        self.ann_min_pool = ann_min_pool  # None = always exact
+        self.ann_probe = ann_probe
+        self.shard_min_pool = shard_min_pool  # None = never shard across processes
+        self.shard_workers = shard_workers  # None = one worker per CPU core
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._watch_conn = None
+        self._data_version = None
+        self._status_seq = None  # last status_log entry applied
+        self.store = None  # vector_store.VectorStore serving the OPEN pools (None = RAM buckets)
+        if store_dir:
+            db.init_db()
+            self.store = vector_store.VectorStore(store_dir)
+            self.store.sync()
+            self.store.reconcile()  # status changes made while no process had the store open
+        db.add_listener(self._on_db_event)
+
+    # --- Reads ---
+    def count(self, item_type, status='OPEN'):
+        with self._lock:
+            if self._uses_store(status):
+                return self.store.count(item_type, status)
+            return len(self._bucket(item_type, status))
+
+    @metrics.timed("index.search")
+    def search(self, item_type, q_visual=None, q_text=None, k=None, status='OPEN', categories=None):
+        """
+        Returns [(score, row), ...] best first, like search.CandidateMatrix.search.
+        `categories` restricts scoring to items of those categories (None = all).
+        """
+        with self._lock:
+            if self._uses_store(status):
+                hits = self.store.search(item_type, q_visual, q_text, k, status=status, categories=categories)
+                return self._display_rows([hits])[0]
+            return self._bucket(item_type, status).search(
+                q_visual, q_text, k,
+                ann_min_pool=self.ann_min_pool, ann_probe=self.ann_probe, categories=categories,
+                shard_min_pool=self.shard_min_pool, shard_workers=self.shard_workers
+            )
+
+    @metrics.timed("index.search_many")
+    def search_many(self, item_type, q_visuals, q_texts, k=None, status='OPEN', min_score=None):
+        """Exact search for many queries against one pool; one [(score, row), ...] list per query."""
+        with self._lock:
+            if self._uses_store(status):
+                return self._display_rows(self.store.search_many(item_type, q_visuals, q_texts, k, min_score, status))
+            return self._bucket(item_type, status).search_many(q_visuals, q_texts, k, min_score,
+                                                               self.shard_min_pool, self.shard_workers)
+
+    @metrics.timed("index.explain_keywords")
+    def explain_keywords(self, item_type, query, item_ids, status='OPEN'):
+        """{item_id: [shared keywords]} for results of a text query (missing ids are skipped)."""
+        with self._lock:
+            if self._uses_store(status):
+                return self.store.explain(query, item_ids)
+            return self._bucket(item_type, status).explain(query, item_ids)
+
+    def search_by_category(self, item_type, q_visual=None, q_text=None, k=None, status='OPEN',
+                           tiers=(None,), min_hits=None):
+        """
+        Tries each category tier from search.category_tiers (narrowest first) and
+        returns (results, categories) for the first tier with at least min_hits
+        matches (default search.CATEGORY_MIN_HITS); the last tier's results are
+        returned whatever their count.
+        """
+        min_hits = search.CATEGORY_MIN_HITS if min_hits is None else min_hits
+        needed = min(min_hits, k) if k else min_hits
+        results, categories = [], None
+        for categories in tiers:
+            results = self.search(item_type, q_visual, q_text, k, status, categories)
+            if len(results) >= needed:
+                break
+        return results, categories
+
+    # --- Vector store ---
+    def _uses_store(self, status):
+        if self.store is None or status != 'OPEN':
+            return False
+        self._sync_external_writes()
+        return True
+
+    def _display_rows(self, results):
+        """Store hits [(score, item_id)] -> [(score, row)]; only the winners are read from SQLite."""
+        rows = db.get_items({item_id for hits in results for _, item_id in hits})
+        return [
+            [(score, {field: rows[item_id][field] for field in ROW_FIELDS}) for score, item_id in hits if item_id in rows]
+            for hits in results
+        ]
+
+    def _store_event(self, event, item_id, row):
+        if event == "add":
+            self.store.sync()
+        elif event == "status":
+            status = row['status'] if row is not None else 'ARCHIVED'
+            if not self.store.set_status(item_id, status) and status == 'OPEN':
+                self.store.replace(row)  # Reopened after it was compacted away (or never synced as OPEN).
+        elif row is None:
+            return
+        elif event == "category":
+            self.store.set_category(item_id, row['category'])
+        elif event == "features":
+            self.store.replace(row)
+
+    # --- Loading & syncing ---
+    def _bucket(self, item_type, status):
+        self._sync_external_writes()
+        key = (item_type, status)
+        if key not in self._buckets:
+            with metrics.timer("index.load_bucket"):
+                bucket = Bucket()
+                for row in db.get_candidates(item_type, status):
+                    bucket.append(row)
+            self._buckets[key] = bucket
+        return self._buckets[key]
+
+    def _current_data_version(self):
+        # data_version only moves when *another* connection commits,
+        # so this connection must stay open for the life of the index.
+        if self._watch_conn is None:
+            db.get_connection()  # ensures the data folder + WAL database exist
+            self._watch_conn = db.sqlite3.connect(db.DB_PATH, check_same_thread=False)
+        return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync_external_writes(self):
+        version = self._current_data_version()
+        if version == self._data_version:
+            return
+        self._data_version = version
+        if self.store is not None:
+            self.store.sync()  # Items added by other processes.
+        self._apply_status_log()
+        if not self._buckets:
+            return
+
+        stats = db.get_pool_stats()
+        for key, bucket in list(self._buckets.items()):
+            db_count, db_max_id = stats.get(key, (0, 0))
+            if (len(bucket), bucket.max_id) == (db_count, db_max_id or 0):
+                continue
+            # Pure appends (e.g. the seeder) only need the rows past max_id.
+            new_rows = db.get_candidates(key[0], key[1], after_id=bucket.max_id)
+            if len(bucket) + len(new_rows) == db_count:
+                for row in new_rows:
+                    bucket.append(row)
+            else:
+                del self._buckets[key]  # Rows changed or vanished: reload on next use.
+
+    def _apply_status_log(self):
+        """Replays status changes and archival committed by any process since the last call."""
+        if self._status_seq is None or (not self._buckets and self.store is None):
+            self._status_seq = db.get_status_seq()  # Nothing loaded yet: later loads are current.
+            return
+        while True:
+            changes = db.get_status_changes(self._status_seq)
+            if changes is None:
+                # Idle for longer than the log is kept: reload the pools instead.
+                self._buckets.clear()
+                if self.store is not None:
+                    self.store.reconcile()
+                self._status_seq = db.get_status_seq()
+                return
+            if not changes:
+                return
+            for item_id in dict.fromkeys(change['item_id'] for change in changes):
+                self._apply_status(item_id, db.get_item(item_id))
+            self._status_seq = changes[-1]['seq']
+
+    def _apply_status(self, item_id, row):
+        """Moves an item to the bucket of its current (type, status); row None = archived. Idempotent."""
+        key = (row['type'], row['status']) if row is not None else None
+        for bucket_key, bucket in self._buckets.items():
+            if bucket_key != key:
+                bucket.remove(item_id)
+        if key in self._buckets:
+            self._buckets[key].append(row)  # No-op if it is already there.
+        if self.store is not None:
+            self._store_event("status", item_id, row)
+
+    # --- Incremental updates from this process ---
+    def _on_db_event(self, event, item_id):
+        with self._lock:
+            row = db.get_item(item_id)
+            if event in ("status", "archive"):
+                self._apply_status(item_id, row)
+                return
+            if self.store is not None:
+                self._store_event(event, item_id, row)
+            if event in ("category", "features"):
+                for bucket in self._buckets.values():
+                    bucket.remove(item_id)
+            if row is not None and (row['type'], row['status']) in self._buckets:
+                self._buckets[(row['type'], row['status'])].append(row)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index(**options):
+    """
+    Process-wide singleton (app.py additionally pins it with st.cache_resource).
+    Options (see VectorIndex) only apply when the index is first created.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex(**options)
+        return _index
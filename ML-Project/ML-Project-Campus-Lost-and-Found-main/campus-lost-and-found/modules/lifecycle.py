@@ -0,0 +1,112 @@
+# File: modules/lifecycle.py
+# Purpose: Item lifecycle: OPEN -> CLAIMED -> CLOSED (returned), OPEN -> EXPIRED, and archival.
+# Design: Owners move their own reports along TRANSITIONS; each move is one conditional
+#         UPDATE, so two sessions racing on the same item cannot both win. A periodic
+#         batch job expires OPEN reports older than their type's TTL and moves items that
+#         have been CLOSED/EXPIRED for ARCHIVE_AFTER_DAYS, BLOBs included, into the cold
+#         archive tables (small transactions, so searches and new reports interleave).
+#         Every status change is also recorded in db's status_log by a trigger; that is how
+#         indexes in other processes drop the rows incrementally (index.VectorIndex), so the
+#         searched pools only ever hold OPEN items.
+
+import threading
+import time
+from modules import db, metrics
+
+OPEN, CLAIMED, CLOSED, EXPIRED = "OPEN", "CLAIMED", "CLOSED", "EXPIRED"
+# Allowed owner actions: status -> statuses it may move to.
+TRANSITIONS = {
+    OPEN: (CLAIMED, CLOSED),
+    CLAIMED: (OPEN, CLOSED),      # a claim that fell through reopens the report
+    EXPIRED: (OPEN,),             # the owner renews an expired report
+    CLOSED: (),
+}
+TTL_DAYS = {"LOST": 90, "FOUND": 60}   # reports OPEN this long (since creation or renewal) expire
+ARCHIVE_AFTER_DAYS = 30                # CLOSED/EXPIRED items move to the archive after this
+ARCHIVED_STATUSES = (CLOSED, EXPIRED)
+STATUS_LOG_DAYS = 7                    # status_log entries kept for other processes to catch up
+WORKER_INTERVAL_S = 3600
+
+# ==========================
+# 1. OWNER ACTIONS
+# ==========================
+
+def allowed_transitions(status):
+    return TRANSITIONS.get(status, ())
+
+def change_status(item_id, status):
+    """
+    Moves an item to `status` if that is allowed from its current status.
+    Returns True if it moved, False otherwise (not allowed, or changed concurrently).
+    Ownership is checked by the caller (app.py only offers a user their own items;
+    service.py compares the item's owner with the request's user_id).
+    """
+    sources = [current for current, targets in TRANSITIONS.items() if status in targets]
+    if not sources:
+        return False
+    return db.update_item_status(item_id, status, expected=sources)
+
+# ==========================
+# 2. BATCH JOB
+# ==========================
+
+def expire_stale(ttl_days=None):
+    """Expires OPEN items past their type's TTL, one batch at a time. Returns how many."""
+    ttl_days = ttl_days or TTL_DAYS
+    total = 0
+    for item_type, days in ttl_days.items():
+        while True:
+            expired = db.expire_items(item_type, days)
+            total += len(expired)
+            if len(expired) < db.IDS_BATCH:
+                break
+    return total
+
+def archive_closed(min_age_days=ARCHIVE_AFTER_DAYS):
+    """Moves items CLOSED/EXPIRED for at least min_age_days into the archive. Returns how many."""
+    total = 0
+    for status in ARCHIVED_STATUSES:
+        while True:
+            archived = db.archive_items(status, min_age_days)
+            total += len(archived)
+            if len(archived) < db.IDS_BATCH:
+                break
+    return total
+
+@metrics.timed("lifecycle.run")
+def run_once():
+    """One pass of the batch job: {"expired": n, "archived": n, "log_pruned": n}."""
+    result = {
+        "expired": expire_stale(),
+        "archived": archive_closed(),
+        "log_pruned": db.prune_status_log(STATUS_LOG_DAYS),
+    }
+    metrics.count("lifecycle.expired", result["expired"])
+    metrics.count("lifecycle.archived", result["archived"])
+    return result
+
+# ==========================
+# 3. BACKGROUND WORKER
+# ==========================
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_background_worker(interval=WORKER_INTERVAL_S):
+    """Starts (once per process) the daemon thread that runs the batch job."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work_loop, args=(interval,), name="lifecycle", daemon=True)
+            _worker.start()
+    return _worker
+
+def _work_loop(interval):
+    while True:
+        try:
+            result = run_once()
+            if result["expired"] or result["archived"]:
+                print(f"[lifecycle] Expired {result['expired']}, archived {result['archived']} items")
+        except Exception as err:
+            print(f"[lifecycle] Batch job failed: {err}")
+        time.sleep(interval)
@@ -0,0 +1,77 @@
+# File: modules/matcher.py
+# Purpose: Background matching of new reports against the opposite pool.
+# Design: Polls `items` past a high-water mark (job_state 'matcher'), so it sees rows
+#         written by any process (app, seeder). Each batch of new OPEN reports is scored
+#         with ONE matrix product per pool (LOST reports vs. OPEN FOUND items and the
+#         reverse), and the top MATCH_TOP_K pairs above MIN_MATCH_SCORE are written to
+#         `matches` (both directions) in the same transaction that advances the mark.
+#         A burst of N new reports therefore costs N / BATCH_SIZE pool scans, not N.
+# The UI reads `matches` (db.get_matches) instead of scoring on page load.
+
+import threading
+import time
+from modules import db
+
+JOB_NAME = "matcher"
+MATCH_TOP_K = 5
+MIN_MATCH_SCORE = 0.45      # the results list's "possible match" (yellow) threshold
+BATCH_SIZE = 64
+WORKER_INTERVAL_S = 5
+OPPOSITE = {"LOST": "FOUND", "FOUND": "LOST"}
+
+def process_pending(search_index, limit=BATCH_SIZE):
+    """Matches one batch of reports added since the last run. Returns how many were read."""
+    rows = db.get_new_items(db.get_job_state(JOB_NAME), limit)
+    if not rows:
+        return 0
+
+    triples = []
+    for item_type, opposite in OPPOSITE.items():
+        reports = [r for r in rows if r['type'] == item_type and r['status'] == 'OPEN']
+        if not reports:
+            continue
+        results = search_index.search_many(
+            opposite,
+            [r['features_color'] for r in reports],
+            [r['features_text'] for r in reports],
+            k=MATCH_TOP_K, min_score=MIN_MATCH_SCORE
+        )
+        for report, found in zip(reports, results):
+            triples.extend((report['id'], row['id'], score) for score, row in found)
+
+    db.save_matches(triples, JOB_NAME, rows[-1]['id'])
+    return len(rows)
+
+def catch_up(search_index):
+    """Processes everything pending (e.g. after a bulk seed). Returns how many reports were read."""
+    total = 0
+    while True:
+        done = process_pending(search_index)
+        if not done:
+            return total
+        total += done
+
+# ==========================
+# BACKGROUND WORKER
+# ==========================
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_background_worker(search_index, interval=WORKER_INTERVAL_S):
+    """Starts (once per process) the daemon thread that keeps `matches` current."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work_loop, args=(search_index, interval),
+                                       name="matcher", daemon=True)
+            _worker.start()
+    return _worker
+
+def _work_loop(search_index, interval):
+    while True:
+        try:
+            catch_up(search_index)
+        except Exception as err:
+            print(f"[matcher] Background matching failed: {err}")
+        time.sleep(interval)
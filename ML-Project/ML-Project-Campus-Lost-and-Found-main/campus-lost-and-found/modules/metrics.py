@@ -0,0 +1,198 @@
+# File: modules/metrics.py
+# Purpose: Lightweight in-process timing/counting for the hot paths (db, features, search).
+# Design: Each stage keeps a count, a running total and the last SAMPLE_WINDOW durations
+#         (a ring buffer), which is what p50/p95 are computed from. Recording costs one
+#         perf_counter pair and a lock, so the timers stay on in production.
+# Export: to_prometheus() renders the Prometheus text format; write_prometheus() drops it
+#         into a file for node_exporter's textfile collector (set LF_METRICS_FILE to have
+#         start_exporter() refresh it periodically).
+# Profiling: profile() captures one block with pyinstrument when installed, else cProfile.
+# Depends only on the standard library + NumPy, so every module can import it.
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+SAMPLE_WINDOW = 1024
+PROFILE_DIR = "data/profiles"
+METRICS_FILE = os.environ.get("LF_METRICS_FILE")
+EXPORT_INTERVAL_S = 15
+PREFIX = "lostfound"
+
+class _Stage:
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+_stages = {}
+_counters = {}
+_lock = threading.Lock()
+
+# ==========================
+# 1. RECORDING
+# ==========================
+
+def observe(stage, seconds):
+    """Records one duration for `stage`."""
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = _Stage()
+        entry.count += 1
+        entry.total += seconds
+        entry.samples.append(seconds)
+
+def count(name, amount=1):
+    """Increments a plain event counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+@contextmanager
+def timer(stage):
+    """with metrics.timer("db.get_candidates"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def wrap(func):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+        return inner
+    return wrap
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+# ==========================
+# 2. REPORTING
+# ==========================
+
+def snapshot():
+    """
+    {stage: {count, total_s, mean_ms, p50_ms, p95_ms}} (percentiles over the last
+    SAMPLE_WINDOW calls) plus {"counters": {name: value}}.
+    """
+    with _lock:
+        stages = {name: (s.count, s.total, np.array(s.samples)) for name, s in _stages.items()}
+        counters = dict(_counters)
+    report = {}
+    for name, (n, total, samples) in sorted(stages.items()):
+        p50, p95 = np.percentile(samples, [50, 95]) * 1000 if samples.size else (0.0, 0.0)
+        report[name] = {"count": n, "total_s": total, "mean_ms": total / n * 1000 if n else 0.0,
+                        "p50_ms": float(p50), "p95_ms": float(p95)}
+    report["counters"] = counters
+    return report
+
+def to_prometheus():
+    """Prometheus text exposition format (summaries per stage + counters)."""
+    snap = snapshot()
+    counters = snap.pop("counters")
+    lines = [f"# HELP {PREFIX}_stage_seconds Time spent per instrumented stage.",
+             f"# TYPE {PREFIX}_stage_seconds summary"]
+    for stage, s in snap.items():
+        label = f'stage="{stage}"'
+        lines.append(f'{PREFIX}_stage_seconds{{{label},quantile="0.5"}} {s["p50_ms"] / 1000:.9f}')
+        lines.append(f'{PREFIX}_stage_seconds{{{label},quantile="0.95"}} {s["p95_ms"] / 1000:.9f}')
+        lines.append(f"{PREFIX}_stage_seconds_sum{{{label}}} {s['total_s']:.9f}")
+        lines.append(f"{PREFIX}_stage_seconds_count{{{label}}} {s['count']}")
+    lines += [f"# HELP {PREFIX}_events_total Instrumented event counters.",
+              f"# TYPE {PREFIX}_events_total counter"]
+    for name, value in sorted(counters.items()):
+        lines.append(f'{PREFIX}_events_total{{name="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path):
+    """Atomically replaces `path` with the current metrics (textfile collector format)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(to_prometheus())
+    os.replace(tmp_path, path)
+    return path
+
+_exporter = None
+
+def start_exporter(path=METRICS_FILE, interval=EXPORT_INTERVAL_S):
+    """Starts (once per process) a daemon thread rewriting `path` every interval; no-op without a path."""
+    global _exporter
+    if not path:
+        return None
+    with _lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, args=(path, interval),
+                                         name="metrics-export", daemon=True)
+            _exporter.start()
+    return _exporter
+
+def _export_loop(path, interval):
+    while True:
+        try:
+            write_prometheus(path)
+        except OSError as err:
+            print(f"[metrics] Export failed: {err}")
+        time.sleep(interval)
+
+# ==========================
+# 3. PROFILING
+# ==========================
+
+class ProfileResult:
+    """Where a profile() capture was written (path is None until the block finishes)."""
+    path = None
+
+@contextmanager
+def profile(name, enabled=True):
+    """
+    Profiles the block and writes data/profiles/<name>-<timestamp>.(html|prof):
+    an HTML call tree with pyinstrument, else a cProfile dump (open with snakeviz
+    or pstats). enabled=False makes it a no-op, so call sites can pass a UI toggle.
+    """
+    result = ProfileResult()
+    if not enabled:
+        yield result
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    try:
+        from pyinstrument import Profiler  # optional dependency
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result.path = stem + ".html"
+            with open(result.path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result.path = stem + ".prof"
+            profiler.dump_stats(result.path)
@@ -0,0 +1,283 @@
+# File: modules/search.py
+# Purpose: Vectorized Search Engine (one matrix-vector product per query).
+# Tech: NumPy (row-normalized matrices + argpartition top-k), SciPy CSR for text.
+
+import numpy as np
+from modules import codec, features, metrics, text_model
+
+# Same weighting as features.calculate_hybrid_score
+VISUAL_WEIGHT = 0.6
+TEXT_WEIGHT = 0.4
+MIN_SCORE = 0.01
+# Category pre-filtering: search the predicted category first, then the
+# CATEGORY_TOP_N most probable ones, then everything, stopping at the first
+# tier that yields at least CATEGORY_MIN_HITS matches.
+CATEGORY_TOP_N = 3
+CATEGORY_MIN_HITS = 10
+
+# ==========================
+# 1. MATRIX CONSTRUCTION
+# ==========================
+
+def as_vector(blob, version=None):
+    """
+    Decodes a stored feature blob into a flat float32 vector (or None).
+    With `version`, vectors from any other extractor version are treated as missing,
+    so features from different extractors are never compared.
+    """
+    if blob is None:
+        return None
+    try:
+        if version is not None and codec.vector_version(blob) != version:
+            return None
+        return np.asarray(codec.decode_vector(blob), dtype=np.float32)
+    except Exception:
+        return None
+
+def normalize_rows(matrix):
+    """
+    L2-normalizes every row so that a dot product equals cosine similarity.
+    All-zero rows stay zero (sklearn's cosine_similarity gives 0 for them too).
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+def stack_vectors(vectors):
+    """
+    Packs a list of 1-D vectors into one contiguous, row-normalized float32 matrix.
+    Missing vectors (or ones with the wrong dimension) become zero rows,
+    which score 0.0 exactly like the per-row path did.
+    """
+    dims = [len(v) for v in vectors if v is not None]
+    if not dims:
+        return np.zeros((len(vectors), 0), dtype=np.float32)
+    # The most common dimension wins; stale rows from older extractors are zeroed.
+    dim = max(set(dims), key=dims.count)
+
+    matrix = np.zeros((len(vectors), dim), dtype=np.float32)
+    for i, vec in enumerate(vectors):
+        if vec is not None and len(vec) == dim:
+            matrix[i] = vec
+    return normalize_rows(matrix)
+
+def as_sparse(blob, version=None):
+    """Like as_vector, but returns (indices, values, dim) without densifying."""
+    if blob is None:
+        return None
+    try:
+        if version is not None and codec.vector_version(blob) != version:
+            return None
+        return codec.decode_sparse(blob)
+    except Exception:
+        return None
+
+def unit_values(values):
+    """L2-normalized copy of a sparse row's values (all-zero rows stay zero)."""
+    values = np.asarray(values, dtype=np.float32)
+    norm = np.linalg.norm(values)
+    return values / norm if norm > 0 else values.copy()
+
+def stack_sparse(entries, weights=None):
+    """
+    Packs (indices, values, dim) entries into one row-normalized CSR matrix,
+    scaling each column by `weights` (the corpus IDF) first when given.
+    Missing entries (or ones with the wrong dimension) become empty rows.
+    """
+    from scipy import sparse  # deferred: ~0.3 s import, see features.start_warmup
+    dims = [e[2] for e in entries if e is not None]
+    if not dims:
+        return sparse.csr_matrix((len(entries), 0), dtype=np.float32)
+    dim = max(set(dims), key=dims.count)
+
+    indptr = np.zeros(len(entries) + 1, dtype=np.int32)
+    indices, data = [], []
+    for i, entry in enumerate(entries):
+        nnz = 0
+        if entry is not None and entry[2] == dim:
+            values = np.asarray(entry[1], dtype=np.float32)
+            if weights is not None and weights.shape[0] == dim:
+                values = values * weights[entry[0]]
+            indices.append(entry[0])
+            data.append(unit_values(values))
+            nnz = len(entry[0])
+        indptr[i + 1] = indptr[i] + nnz
+    indices = np.concatenate(indices).astype(np.int32) if indices else np.zeros(0, np.int32)
+    data = np.concatenate(data) if data else np.zeros(0, np.float32)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(entries), dim))
+
+def normalize_query(vector, dim):
+    """Returns the query as a unit float32 vector, or None if it is unusable."""
+    if vector is None:
+        return None
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    if dim == 0 or vec.shape[0] != dim:
+        return None
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+class CandidateMatrix:
+    """
+    Holds one candidate pool as contiguous matrices:
+      rows   -> the original DB rows (for rendering)
+      visual -> (N, D_vis) unit vectors
+      text   -> (N, D_txt) IDF-weighted unit vectors, sparse CSR
+    """
+
+    def __init__(self, rows, text_weights=None):
+        self.rows = list(rows)
+        self.text_weights = text_weights if text_weights is not None else text_model.current_weights()[1]
+        self.visual = stack_vectors([as_vector(r['features_color'], features.VISUAL_FEATURE_VERSION) for r in self.rows])
+        self.text = stack_sparse([as_sparse(r['features_text'], features.TEXT_FEATURE_VERSION) for r in self.rows],
+                                 self.text_weights)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def score(self, q_visual=None, q_text=None):
+        """Hybrid scores for every candidate (see score_matrices)."""
+        return score_matrices(self.visual, self.text, q_visual, q_text, self.text_weights)
+
+    def search(self, q_visual=None, q_text=None, k=None, min_score=MIN_SCORE):
+        """Returns [(score, row), ...] sorted best first."""
+        scores = self.score(q_visual, q_text)
+        return [(float(scores[i]), self.rows[i]) for i in top_k(scores, k, min_score)]
+
+# ==========================
+# 2. SCORING
+# ==========================
+
+@metrics.timed("search.score")
+def score_matrices(visual, text, q_visual=None, q_text=None, text_weights=None):
+    """
+    Scores a query against every candidate with one matrix-vector product per modality
+    (`text` may be a SciPy sparse matrix: the product then only touches non-zeros).
+    text_weights (the corpus IDF) are applied to the query; `text` rows must already carry them.
+      Hybrid      -> 0.6 * visual + 0.4 * text
+      Text only   -> text cosine
+      Image only  -> visual cosine
+    """
+    n = visual.shape[0]
+    q_vis = normalize_query(decode_query(q_visual, features.VISUAL_FEATURE_VERSION), visual.shape[1])
+    q_txt = decode_query(q_text, features.TEXT_FEATURE_VERSION)
+    if q_txt is not None and text_weights is not None and q_txt.shape[0] == text_weights.shape[0]:
+        q_txt = q_txt * text_weights
+    q_txt = normalize_query(q_txt, text.shape[1])
+
+    has_vis = q_visual is not None
+    has_txt = q_text is not None
+
+    vis_scores = visual @ q_vis if q_vis is not None else np.zeros(n, dtype=np.float32)
+    txt_scores = np.asarray(text @ q_txt).ravel() if q_txt is not None else np.zeros(n, dtype=np.float32)
+
+    if has_vis and has_txt:
+        return VISUAL_WEIGHT * vis_scores + TEXT_WEIGHT * txt_scores
+    if has_txt:
+        return txt_scores
+    if has_vis:
+        return vis_scores
+    return np.zeros(n, dtype=np.float32)
+
+@metrics.timed("search.score_batch")
+def score_matrices_batch(visual, text, q_visuals, q_texts, text_weights=None):
+    """
+    Many queries at once: one matrix-matrix product per modality.
+    Returns (N, n_queries); column j equals score_matrices(visual, text, q_visuals[j], q_texts[j]).
+    """
+    return score_prepared(visual, text, prepare_queries(visual.shape[1], q_visuals, q_texts, text_weights))
+
+def prepare_queries(visual_dim, q_visuals, q_texts, text_weights=None):
+    """
+    Decodes and normalizes a query batch once, so it can be scored against many
+    matrices (e.g. the shards in modules/shards.py). Returns a small picklable tuple:
+    (unit visual queries (m, D), weighted unit text queries (m, T) CSR,
+     per-query visual weight, per-query text weight).
+    """
+    q_vis = np.zeros((len(q_visuals), visual_dim), dtype=np.float32)
+    for j, query in enumerate(q_visuals):
+        unit = normalize_query(decode_query(query, features.VISUAL_FEATURE_VERSION), visual_dim)
+        if unit is not None:
+            q_vis[j] = unit
+    q_txt = stack_sparse([as_sparse(q, features.TEXT_FEATURE_VERSION) for q in q_texts], text_weights)
+
+    # Same modality weighting as score_matrices, per query column.
+    has_vis = np.array([q is not None for q in q_visuals])
+    has_txt = np.array([q is not None for q in q_texts])
+    both = has_vis & has_txt
+    vis_weight = np.where(both, VISUAL_WEIGHT, has_vis.astype(np.float32)).astype(np.float32)
+    txt_weight = np.where(both, TEXT_WEIGHT, has_txt.astype(np.float32)).astype(np.float32)
+    return q_vis, q_txt, vis_weight, txt_weight
+
+def score_prepared(visual, text, prepared):
+    """(N, m) hybrid scores of prepare_queries() output against one candidate matrix pair."""
+    q_vis, q_txt, vis_weight, txt_weight = prepared
+    scores = np.zeros((visual.shape[0], q_vis.shape[0]), dtype=np.float32)
+    # A modality no query uses is skipped (text-only batches never touch the visual matrix).
+    if vis_weight.any() and visual.shape[1] == q_vis.shape[1]:
+        scores += (visual @ q_vis.T) * vis_weight
+    if txt_weight.any() and q_txt.shape[1] == text.shape[1]:
+        if q_txt.shape[0] == 1:
+            # One query: a sparse matrix-vector product is ~3x cheaper than sparse @ sparse.
+            txt_scores = np.asarray(text @ q_txt.toarray().ravel(), dtype=np.float32)[:, None]
+        else:
+            txt_scores = np.asarray((text @ q_txt.T).todense(), dtype=np.float32)
+        scores += txt_scores * txt_weight
+    return scores
+
+def decode_query(query, version=None):
+    """Accepts either a stored blob or an already-decoded vector."""
+    if query is None or isinstance(query, np.ndarray):
+        return query
+    return as_vector(query, version)
+
+def top_k(scores, k=None, min_score=MIN_SCORE):
+    """
+    Indices of the best scores (descending), ignoring anything <= min_score.
+    Uses argpartition so only the k winners get fully sorted.
+    """
+    candidates = np.flatnonzero(scores > min_score)
+    if k is not None and 0 < k < len(candidates):
+        part = np.argpartition(-scores[candidates], k - 1)[:k]
+        candidates = candidates[part]
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
+
+def keyword_overlap(text, terms):
+    """
+    Bulk explanations: for each row of the sparse text matrix, the query words it
+    contains. terms is {column: word} (features.text_terms); one column slice covers all rows.
+    """
+    from scipy import sparse
+    columns = np.array([c for c in terms if c < text.shape[1]], dtype=np.int64)
+    if columns.size == 0:
+        return [[] for _ in range(text.shape[0])]
+    shared = sparse.csr_matrix(text[:, columns])
+    shared.eliminate_zeros()
+    shared.sort_indices()  # query word order
+    return [
+        [terms[columns[j]] for j in shared.indices[shared.indptr[i]:shared.indptr[i + 1]]]
+        for i in range(shared.shape[0])
+    ]
+
+# ==========================
+# 3. CATEGORY PRE-FILTERING
+# ==========================
+
+def category_tiers(selected=None, ranking=None, top_n=CATEGORY_TOP_N):
+    """
+    Candidate category sets to try in order, narrowest first; None means "all".
+      selected -> a category the user picked (always searched first)
+      ranking  -> [(category, probability), ...] from features.analyze_image
+    Without either there is nothing to narrow on, so only [None] is returned.
+    """
+    tiers = []
+    ranked = [category for category, _ in (ranking or [])]
+    first = selected or (ranked[0] if ranked else None)
+    if first:
+        tiers.append([first])
+        widened = [first] + [c for c in ranked if c.lower() != first.lower()][:max(top_n - 1, 0)]
+        if len(widened) > 1:
+            tiers.append(widened)
+    tiers.append(None)
+    return tiers
@@ -0,0 +1,110 @@
+# File: modules/service_client.py
+# Purpose: Thin client for the headless matching service (service.py).
+# Design: Standard library only (http.client). Each thread keeps one keep-alive
+#         connection, so a Streamlit session or a load-test worker pays the TCP
+#         handshake once. Results come back as plain dicts shaped like the
+#         in-process index rows, so app.py renders both the same way.
+
+import base64
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+SERVICE_URL = os.environ.get("LF_SERVICE_URL")
+TIMEOUT_S = 30
+
+class ServiceClientError(Exception):
+    """The service answered with an error status (or could not be reached)."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+class ServiceClient:
+    def __init__(self, base_url=SERVICE_URL, timeout=TIMEOUT_S, token=None):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.token = token if token is not None else os.environ.get("LF_SERVICE_TOKEN")
+        self._local = threading.local()
+
+    # --- Endpoints ---
+    def health(self):
+        return self._request("GET", "/health")
+
+    def count(self, item_type):
+        return self.health()["pools"].get(item_type, 0)
+
+    def predict_category(self, image, top_k=3):
+        """{"category": str|None, "ranking": [[category, probability], ...]}"""
+        return self._request("POST", "/predict-category", {"image": _encode(image), "top_k": top_k})
+
+    def search(self, target, text=None, image=None, category=None, k=100):
+        """
+        Returns (results, searched): results is [(score, item), ...] best first and
+        every item dict carries the query keywords it shares under "keywords".
+        """
+        response = self._request("POST", "/search", {
+            "target": target, "text": text or None, "image": _encode(image) if image is not None else None,
+            "category": category, "k": k
+        })
+        results = [(r["score"], dict(r["item"], keywords=r["keywords"])) for r in response["results"]]
+        return results, response["searched"]
+
+    def submit_item(self, user_id, item_type, description, image, category=None):
+        """Stores a report; returns {"id", "image_path", "category"}."""
+        return self._request("POST", "/items", {
+            "user_id": user_id, "type": item_type, "description": description,
+            "image": _encode(image), "category": category
+        })
+
+    def matches(self, item_id, limit=5):
+        return self._request("GET", f"/items/{item_id}/matches?limit={limit}")["matches"]
+
+    def change_status(self, item_id, status, user_id):
+        """Moves user_id's report along modules/lifecycle.py's transitions (403 if not theirs, 409 if not allowed)."""
+        return self._request("POST", f"/items/{item_id}/status", {"user_id": user_id, "status": status})
+
+    # --- Transport ---
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        # A kept-alive connection the server has since closed fails once; retry on a fresh one.
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as err:
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise ServiceClientError(503, f"Service unreachable: {err}")
+        if response.getheader("Connection", "").lower() == "close":
+            conn.close()
+            self._local.conn = None
+        if response.status >= 400:
+            try:
+                message = json.loads(data).get("error", "")
+            except ValueError:
+                message = data[:200].decode("utf-8", "replace")
+            raise ServiceClientError(response.status, message)
+        return json.loads(data)
+
+def _encode(image):
+    """base64 text of an upload (Streamlit UploadedFile, BytesIO, bytes, memoryview)."""
+    if hasattr(image, "getvalue"):
+        image = image.getvalue()
+    return base64.b64encode(bytes(image)).decode("ascii")
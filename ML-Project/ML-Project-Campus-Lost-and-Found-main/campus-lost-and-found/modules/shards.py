@@ -0,0 +1,162 @@
+# File: modules/shards.py
+# Purpose: Exact search of very large pools across worker processes.
+# Design: A snapshot of a pool (unit visual matrix, weighted CSR text matrix, alive mask)
+#         is copied ONCE into a single multiprocessing.shared_memory segment. Workers
+#         attach to it by name and score contiguous row ranges (= id ranges, since rows
+#         are kept in id order) as zero-copy views, each returning only its local top-k;
+#         the coordinator merges those k * n_shards candidates. The query batch is
+#         decoded/normalized once (search.prepare_queries) and is all that is pickled.
+# Scaling: BLAS on one tall matrix-vector product is memory-bound and mostly uses one
+#          core; shards read disjoint memory from separate processes, so latency drops
+#          with the number of cores (on a single core it only adds IPC overhead).
+# Used by index.Bucket for pools of at least `shard_min_pool` rows (see VectorIndex).
+
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from modules import search
+
+ALIGN = 64
+DEFAULT_SHARDS_PER_WORKER = 1
+
+# ==========================
+# 1. SHARED SEGMENT LAYOUT
+# ==========================
+
+def _layout(arrays):
+    """{name: (offset, shape, dtype)} for arrays packed back to back, 64-byte aligned."""
+    spec, offset = {}, 0
+    for name, arr in arrays.items():
+        offset = (offset + ALIGN - 1) // ALIGN * ALIGN
+        spec[name] = (offset, arr.shape, arr.dtype.str)
+        offset += arr.nbytes
+    return spec, max(offset, 1)
+
+def _views(buf, spec):
+    return {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buf, offset=offset)
+            for name, (offset, shape, dtype) in spec.items()}
+
+def _attach(name):
+    # Pool workers share the creator's resource tracker, so attaching does not
+    # hand them the segment's lifetime; the creator unlinks it (ShardedSnapshot.close).
+    return shared_memory.SharedMemory(name=name)
+
+# ==========================
+# 2. WORKER SIDE
+# ==========================
+
+_attached = {}  # segment name -> (SharedMemory, {array name: view}); per worker process
+
+def _shard_arrays(name, spec):
+    entry = _attached.get(name)
+    if entry is None:
+        # Snapshots are replaced wholesale, so drop handles to older segments.
+        for old_shm, _ in _attached.values():
+            old_shm.close()
+        _attached.clear()
+        shm = _attach(name)
+        entry = _attached[name] = (shm, _views(shm.buf, spec))
+    return entry[1]
+
+def _search_shard(name, spec, text_shape, lo, hi, prepared, k, min_score):
+    """Local top-k of rows [lo, hi) for every query: [(positions, scores), ...]."""
+    from scipy import sparse
+    arrays = _shard_arrays(name, spec)
+    indptr = arrays["indptr"][lo:hi + 1]
+    start, end = int(indptr[0]), int(indptr[-1])
+    text = sparse.csr_matrix(
+        (arrays["data"][start:end], arrays["indices"][start:end], indptr - start),
+        shape=(hi - lo, text_shape[1]), copy=False
+    )
+    scores = search.score_prepared(arrays["visual"][lo:hi], text, prepared)
+    scores[~arrays["alive"][lo:hi]] = -np.inf
+    results = []
+    for column in scores.T:
+        winners = search.top_k(column, k, min_score)
+        results.append((winners + lo, column[winners]))
+    return results
+
+# ==========================
+# 3. COORDINATOR SIDE
+# ==========================
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+def get_executor(workers=None):
+    """Process-wide worker pool (recreated only if a different size is asked for)."""
+    global _executor, _executor_workers
+    workers = workers or os.cpu_count() or 1
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor, _executor_workers = ProcessPoolExecutor(workers), workers
+        return _executor
+
+def _release(shm):
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+class ShardedSnapshot:
+    """
+    Rows [0, n_built) of one pool in shared memory, split into contiguous shards.
+    generation is the text_model IDF generation the text rows were weighted with.
+    """
+
+    def __init__(self, visual, text, alive, generation=None, workers=None, n_shards=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.n_built = visual.shape[0]
+        self.generation = generation
+        self.text_shape = text.shape
+        arrays = {
+            "visual": np.ascontiguousarray(visual, dtype=np.float32),
+            "data": np.asarray(text.data, dtype=np.float32),
+            "indices": np.asarray(text.indices, dtype=np.int32),
+            "indptr": np.asarray(text.indptr, dtype=np.int64),
+            "alive": np.asarray(alive, dtype=bool),
+        }
+        self.spec, nbytes = _layout(arrays)
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._finalizer = weakref.finalize(self, _release, self.shm)
+        self.arrays = _views(self.shm.buf, self.spec)
+        for name, arr in arrays.items():
+            self.arrays[name][...] = arr
+
+        n_shards = n_shards or self.workers * DEFAULT_SHARDS_PER_WORKER
+        bounds = np.linspace(0, self.n_built, max(1, min(n_shards, self.n_built)) + 1).astype(int)
+        self.ranges = [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+    def kill(self, pos):
+        """Tombstones a row for every worker (the segment is shared, so no message is needed)."""
+        if pos < self.n_built:
+            self.arrays["alive"][pos] = False
+
+    def search(self, prepared, k=None, min_score=search.MIN_SCORE):
+        """
+        Scores a prepare_queries() batch on every shard in parallel.
+        Returns one (positions, scores) pair per query, best first, at most k each.
+        """
+        executor = get_executor(self.workers)
+        futures = [
+            executor.submit(_search_shard, self.shm.name, self.spec, self.text_shape, lo, hi, prepared, k, min_score)
+            for lo, hi in self.ranges
+        ]
+        per_shard = [f.result() for f in futures]
+        merged = []
+        for j in range(prepared[0].shape[0]):
+            positions = np.concatenate([shard[j][0] for shard in per_shard]) if per_shard else np.zeros(0, np.int64)
+            scores = np.concatenate([shard[j][1] for shard in per_shard]) if per_shard else np.zeros(0, np.float32)
+            best = search.top_k(scores, k, -np.inf)
+            merged.append((positions[best], scores[best]))
+        return merged
+
+    def close(self):
+        self._finalizer()
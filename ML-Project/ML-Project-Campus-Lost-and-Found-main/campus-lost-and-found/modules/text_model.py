@@ -0,0 +1,216 @@
+# File: modules/text_model.py
+# Purpose: Corpus-fitted IDF for the hashed text vectors from modules/features.py.
+# Design: Stored text vectors are raw hashed term counts, so a refit never re-encodes them:
+#         it only publishes a new IDF snapshot (tagged with a generation number) that
+#         search applies at score time, to the query and the candidates alike.
+#         Document frequencies are counted from the stored vectors in id order, so a
+#         refresh only reads items added since the last one. A background worker keeps
+#         the counts current and re-vectorizes rows still holding retired text vectors.
+# Persisted in data/text_model/: meta.json + df.npy (each replaced atomically).
+
+import json
+import os
+import threading
+import time
+import numpy as np
+from modules import codec, db, features
+
+MODEL_DIR = "data/text_model"
+MODEL_FORMAT = 1
+BATCH_SIZE = 500
+REFIT_RATIO = 0.02        # publish a new IDF once the corpus grew by 2% since the last one
+WORKER_INTERVAL_S = 30    # background refresh period
+
+class TextModel:
+    """Running document frequencies + the published IDF snapshot."""
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self.meta_path = os.path.join(model_dir, "meta.json")
+        self.df_path = os.path.join(model_dir, "df.npy")
+        self.n_features = features.TEXT_HASH_FEATURES
+        self._lock = threading.RLock()
+        self._reset()
+        self._load()
+        self._publish()
+
+    # ==========================
+    # 1. SCORING
+    # ==========================
+
+    def weights(self):
+        """(generation, idf) snapshot; the idf array is never modified after publishing."""
+        return self._snapshot
+
+    def _publish(self):
+        # Same smoothing as sklearn's TfidfTransformer(smooth_idf=True).
+        idf = (np.log((1.0 + self.n_docs) / (1.0 + self.df)) + 1.0).astype(np.float32)
+        self.generation += 1
+        self.published_docs = self.n_docs
+        self._snapshot = (self.generation, idf)
+
+    # ==========================
+    # 2. INCREMENTAL FITTING
+    # ==========================
+
+    def refresh(self):
+        """Counts items added since the last refresh. Returns True if a new IDF was published."""
+        with self._lock:
+            replaced = self._db_was_replaced()
+            if replaced:
+                self._reset()
+            dirty = replaced
+            while True:
+                rows = db.get_text_rows(self.last_item_id, BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    self._count(row['features_text'])
+                self.last_item_id = rows[-1]['id']
+                dirty = True
+
+            grown = self.n_docs - self.published_docs
+            published = replaced or (grown > 0 and grown >= REFIT_RATIO * self.published_docs)
+            if published:
+                self._publish()
+            if dirty or published:
+                self._save()
+            return published
+
+    def fit(self, blobs):
+        """Counts text vectors that are not in the database and publishes (offline tools, benchmarks)."""
+        with self._lock:
+            for blob in blobs:
+                self._count(blob)
+            self._publish()
+
+    def revectorize_stale(self, limit=BATCH_SIZE):
+        """
+        Re-encodes one batch of already-counted rows whose text vector predates
+        TEXT_FEATURE_VERSION (from their description). Returns False once the scan is done.
+        """
+        with self._lock:
+            rows = [r for r in db.get_text_rows(self.stale_scan_id, limit) if r['id'] <= self.last_item_id]
+            if not rows:
+                return False
+            updates = []
+            for row in rows:
+                if self._is_current(row['features_text']):
+                    continue
+                blob = features.extract_text_vector(row['description'])
+                self._count(blob)  # refresh() skipped this row while it was stale
+                updates.append((row['id'], blob))
+            # Rows first: a crash before _save() can only leave the counts slightly low.
+            db.update_text_features(updates)
+            self.stale_scan_id = rows[-1]['id']
+            self._save()
+        return True
+
+    def _is_current(self, blob):
+        if blob is None:
+            return False
+        try:
+            return codec.vector_version(blob) == features.TEXT_FEATURE_VERSION
+        except Exception:
+            return False
+
+    def _count(self, blob):
+        if not self._is_current(blob):
+            return
+        indices, _, dim = codec.decode_sparse(blob)
+        if dim != self.n_features:
+            return
+        self.df[np.unique(indices)] += 1
+        self.n_docs += 1
+
+    def _db_was_replaced(self):
+        # A fresh database (e.g. re-seeded) restarts the id sequence; archival never lowers it.
+        return db.get_last_item_id() < self.last_item_id
+
+    # ==========================
+    # 3. STORAGE
+    # ==========================
+
+    def _reset(self):
+        self.df = np.zeros(self.n_features, dtype=np.int64)
+        self.n_docs = 0
+        self.last_item_id = 0      # rows up to here are counted in df
+        self.stale_scan_id = 0     # rows up to here were checked for stale vectors
+        self.published_docs = 0
+        self.generation = getattr(self, "generation", 0)
+
+    def _load(self):
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.df_path):
+            return
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        if (meta.get("format") != MODEL_FORMAT
+                or meta.get("feature_version") != features.TEXT_FEATURE_VERSION
+                or meta.get("n_features") != self.n_features):
+            return  # Different vectorizer: refit from scratch.
+        self.df = np.load(self.df_path)
+        self.n_docs = meta["n_docs"]
+        self.last_item_id = meta["last_item_id"]
+        self.stale_scan_id = meta["stale_scan_id"]
+        self.generation = meta["generation"]
+
+    def _save(self):
+        os.makedirs(self.model_dir, exist_ok=True)
+        # df first: meta only ever describes counts that are already on disk.
+        tmp_df = self.df_path + ".tmp.npy"
+        np.save(tmp_df, self.df)
+        os.replace(tmp_df, self.df_path)
+        tmp_meta = self.meta_path + ".tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({"format": MODEL_FORMAT, "feature_version": features.TEXT_FEATURE_VERSION,
+                       "n_features": self.n_features, "n_docs": self.n_docs,
+                       "last_item_id": self.last_item_id, "stale_scan_id": self.stale_scan_id,
+                       "generation": self.generation}, f)
+        os.replace(tmp_meta, self.meta_path)
+
+# ==========================
+# 4. PROCESS-WIDE MODEL & WORKER
+# ==========================
+
+_model = None
+_model_lock = threading.Lock()
+_worker = None
+
+def get_model():
+    """Process-wide model, caught up with the database on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = TextModel()
+            _model.refresh()
+        return _model
+
+def set_model(model):
+    """Replaces the process-wide model (e.g. one fitted on a benchmark catalogue)."""
+    global _model
+    with _model_lock:
+        _model = model
+
+def current_weights():
+    """IDF snapshot (generation, idf) to score text with."""
+    return get_model().weights()
+
+def start_background_worker(interval=WORKER_INTERVAL_S):
+    """Starts (once per process) the daemon thread that refreshes counts and re-vectorizes stale rows."""
+    global _worker
+    with _model_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work_loop, args=(interval,), name="text-model", daemon=True)
+            _worker.start()
+    return _worker
+
+def _work_loop(interval):
+    while True:
+        try:
+            model = get_model()
+            model.refresh()
+            while model.revectorize_stale():
+                time.sleep(0.05)  # small batches, so searches and writes interleave
+        except Exception as err:
+            print(f"[text_model] Background refresh failed: {err}")
+        time.sleep(interval)
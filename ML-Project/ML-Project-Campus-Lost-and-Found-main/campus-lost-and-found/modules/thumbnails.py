@@ -0,0 +1,121 @@
+# File: modules/thumbnails.py
+# Purpose: Small JPEG previews for result cards, kept in a bounded on-disk LRU cache.
+# Layout: data/thumbnails/<aa>/<key>.jpg, key = SHA-1 of (source path, size, mtime, THUMB_SIZE),
+#         so an edited or replaced original never gets a stale preview.
+# LRU:    a thumbnail's mtime is its last use (touched on every hit). When the folder
+#         grows past MAX_CACHE_BYTES the least recently used files are deleted until it
+#         is back under EVICT_TO_RATIO of the budget. Evicted previews are simply
+#         regenerated on their next view.
+
+import hashlib
+import os
+import tempfile
+import threading
+
+THUMB_DIR = "data/thumbnails"
+THUMB_SIZE = 256                    # longest side, pixels
+JPEG_QUALITY = 80
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+EVICT_TO_RATIO = 0.8
+
+_lock = threading.Lock()
+_cache_bytes = None                 # running size estimate, measured on first write
+
+def _key(image_path):
+    st = os.stat(image_path)
+    raw = f"{os.path.abspath(image_path)}|{st.st_size}|{st.st_mtime_ns}|{THUMB_SIZE}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def thumbnail_path(image_path):
+    """Where the preview of image_path lives (whether or not it exists yet)."""
+    key = _key(image_path)
+    return os.path.join(THUMB_DIR, key[:2], key + ".jpg")
+
+def get_thumbnail(image_path):
+    """
+    Path of a small preview of image_path, generating it on first use.
+    Returns None if the original is missing or unreadable.
+    """
+    try:
+        path = thumbnail_path(image_path)
+    except OSError:
+        return None  # Original is gone.
+    try:
+        os.utime(path)  # Hit: mark as recently used.
+        return path
+    except FileNotFoundError:
+        pass
+    return _generate(image_path, path)
+
+def make_thumbnails(image_paths):
+    """Pre-generates previews at ingest time; returns how many are available."""
+    return sum(get_thumbnail(p) is not None for p in image_paths)
+
+# ==========================
+# 1. GENERATION
+# ==========================
+
+def _generate(image_path, path):
+    import cv2
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+
+    rows, cols = img.shape[:2]
+    scale = THUMB_SIZE / max(rows, cols)
+    if scale < 1:
+        img = cv2.resize(img, (max(1, round(cols * scale)), max(1, round(rows * scale))),
+                         interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        return None
+
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    with os.fdopen(fd, "wb") as out:
+        out.write(encoded.tobytes())
+    os.replace(tmp_path, path)
+    _account(len(encoded))
+    return path
+
+# ==========================
+# 2. LRU EVICTION
+# ==========================
+
+def _scan():
+    """[(last_used, bytes, path)] of every cached thumbnail."""
+    entries = []
+    for dir_path, _, filenames in os.walk(THUMB_DIR):
+        for fname in filenames:
+            path = os.path.join(dir_path, fname)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile.
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+def _account(added):
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan())
+        else:
+            _cache_bytes += added
+        if _cache_bytes > MAX_CACHE_BYTES:
+            _cache_bytes = _evict(MAX_CACHE_BYTES * EVICT_TO_RATIO)
+
+def _evict(target_bytes):
+    """Deletes least recently used thumbnails until the cache fits target_bytes."""
+    entries = sorted(_scan())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
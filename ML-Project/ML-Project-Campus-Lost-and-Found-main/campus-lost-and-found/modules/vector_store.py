@@ -0,0 +1,536 @@
+# File: modules/vector_store.py
+# Purpose: On-disk, memory-mapped store of the item feature vectors (years of LOST/FOUND
+#          history without holding every vector in RAM).
+# Layout: data/vectors/
+#           MANIFEST.json          segment list + committed row counts (the commit point)
+#           <type>-<n>.vec         float32 (rows, VISUAL_DIM) unit visual vectors
+#           <type>-<n>.ids         int64 item id per row (id order, except rows re-appended by replace())
+#           <type>-<n>.state       (status u1, category u2) per row, updated in place
+#           <type>-<n>.tptr/.tidx/.tval   raw hashed term counts as CSR (end offsets, columns, counts)
+#         Each segment holds one item type, so a search maps only that pool's files.
+# Crash safety: appends write + fsync the segment files first, then atomically replace the
+#         manifest. Readers map only the committed rows; bytes past them (a crashed append)
+#         are truncated by the next writer. A segment is sealed (never appended to again)
+#         once it holds SEGMENT_ROWS rows.
+# Sharing: every process maps the same files, so the OS page cache holds one copy of the
+#         vectors; status/category changes are written straight into the shared mapping.
+#         Writers serialize on a lock file; readers notice a new manifest by its stat stamp.
+# Compaction: rewrites the segments without rows that are no longer OPEN (reconciled with
+#         SQLite, which stays the source of truth), then swaps the manifest.
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from modules import db, features, metrics, search, text_model
+
+STORE_DIR = "data/vectors"
+STORE_FORMAT = 1
+VISUAL_DIM = 64 + 1764          # colour bins + HOG values (features.analyze_image)
+TEXT_DIM = features.TEXT_HASH_FEATURES
+SEGMENT_ROWS = 65536            # rows per segment before it is sealed
+SYNC_BATCH = 2000               # rows read from SQLite per append
+COMPACT_DEAD_RATIO = 0.2        # compact once this share of rows is no longer OPEN ...
+COMPACT_MIN_DEAD = 1000         # ... and at least this many
+GATHER_RATIO = 0.5              # filters keeping fewer rows than this gather them instead of masking
+WORKER_INTERVAL_S = 60
+REMOVED = 0                     # status code of superseded rows (code n + 1 = manifest["statuses"][n])
+
+STATE_DTYPE = np.dtype([("status", "u1"), ("category", "<u2")])
+SEGMENT_FILES = {".vec": np.float32, ".ids": np.int64, ".state": STATE_DTYPE,
+                 ".tptr": np.int32, ".tidx": np.int32, ".tval": np.float32}
+
+# ==========================
+# 1. SEGMENTS
+# ==========================
+
+def _map(path, dtype, shape, mode="r"):
+    if int(np.prod(shape)) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+class _Segment:
+    """Read-only view of one segment's committed rows (state is mapped writable)."""
+
+    def __init__(self, directory, entry):
+        self.entry = dict(entry)
+        self.name, self.item_type = entry["name"], entry["type"]
+        self.rows, self.nnz = entry["rows"], entry["nnz"]
+        base = os.path.join(directory, self.name)
+        self.vectors = _map(base + ".vec", np.float32, (self.rows, VISUAL_DIM))
+        self.ids = _map(base + ".ids", np.int64, (self.rows,))
+        self.state = _map(base + ".state", STATE_DTYPE, (self.rows,), mode="r+")
+        self.text_end = _map(base + ".tptr", np.int32, (self.rows,))
+        self.text_idx = _map(base + ".tidx", np.int32, (self.nnz,))
+        self.text_val = _map(base + ".tval", np.float32, (self.nnz,))
+        self._text = None    # (generation, IDF-weighted unit CSR)
+        self._order = None   # argsort of ids, for id lookups
+
+    def text(self, generation, idf, weighted=True):
+        """CSR text rows; weighted=True applies the IDF and L2-normalizes (cached per generation)."""
+        from scipy import sparse  # deferred: ~0.3 s import, see features.start_warmup
+        indptr = np.concatenate([[0], self.text_end]).astype(np.int32)
+        if not weighted:
+            return sparse.csr_matrix((self.text_val, self.text_idx, indptr), shape=(self.rows, TEXT_DIM))
+        if self._text is None or self._text[0] != generation:
+            values = self.text_val * idf[self.text_idx] if idf.shape[0] == TEXT_DIM else np.array(self.text_val)
+            sums = np.concatenate([[0.0], np.cumsum(values.astype(np.float64) ** 2)])
+            norms = np.sqrt(sums[indptr[1:]] - sums[indptr[:-1]]).astype(np.float32)
+            norms[norms == 0] = 1.0
+            values = (values / np.repeat(norms, np.diff(indptr))).astype(np.float32)
+            self._text = (generation, sparse.csr_matrix((values, self.text_idx, indptr), shape=(self.rows, TEXT_DIM)))
+        return self._text[1]
+
+    def find(self, item_id):
+        """Row positions holding item_id (superseded copies included)."""
+        if self._order is None:
+            self._order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._order]
+        lo, hi = np.searchsorted(sorted_ids, [item_id, item_id + 1])
+        return self._order[lo:hi]
+
+def _encode_rows(rows, codes):
+    """Segment arrays for db-shaped rows: (vectors, ids, state, text lengths, tidx, tval)."""
+    n = len(rows)
+    vectors = np.zeros((n, VISUAL_DIM), dtype=np.float32)
+    state = np.zeros(n, dtype=STATE_DTYPE)
+    lengths = np.zeros(n, dtype=np.int64)
+    tidx, tval = [], []
+    for i, row in enumerate(rows):
+        unit = search.normalize_query(search.as_vector(row['features_color'], features.VISUAL_FEATURE_VERSION),
+                                      VISUAL_DIM)
+        if unit is not None:
+            vectors[i] = unit  # Stale/missing vectors stay zero rows, like index.Bucket.
+        entry = search.as_sparse(row['features_text'], features.TEXT_FEATURE_VERSION)
+        if entry is not None and entry[2] == TEXT_DIM:
+            tidx.append(np.asarray(entry[0], dtype=np.int32))
+            tval.append(np.asarray(entry[1], dtype=np.float32))
+            lengths[i] = len(entry[0])
+        state[i] = (codes("statuses", row['status']), codes("categories", str(row['category'])))
+    ids = np.array([row['id'] for row in rows], dtype=np.int64)
+    tidx = np.concatenate(tidx) if tidx else np.zeros(0, np.int32)
+    tval = np.concatenate(tval) if tval else np.zeros(0, np.float32)
+    return vectors, ids, state, lengths, tidx, tval
+
+# ==========================
+# 2. STORE
+# ==========================
+
+class VectorStore:
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "MANIFEST.json")
+        self.lock_path = os.path.join(directory, "LOCK")
+        self._lock = threading.RLock()
+        self._writers = 0  # nesting depth of _writing() in the thread holding _lock
+        self._stamp = None
+        self.manifest = None
+        self.segments = []
+        os.makedirs(directory, exist_ok=True)
+        with self._writing():
+            if self.manifest is None or not self._is_current(self.manifest):
+                self._reset()
+
+    # --- Manifest ---
+    def _empty_manifest(self):
+        return {"format": STORE_FORMAT, "visual_version": features.VISUAL_FEATURE_VERSION,
+                "text_version": features.TEXT_FEATURE_VERSION, "visual_dim": VISUAL_DIM,
+                "text_dim": TEXT_DIM, "last_id": 0, "next_segment": 1, "segments": [],
+                "statuses": [], "categories": []}
+
+    def _is_current(self, manifest):
+        expected = self._empty_manifest()
+        return all(manifest.get(key) == expected[key]
+                   for key in ("format", "visual_version", "text_version", "visual_dim", "text_dim"))
+
+    def _reset(self):
+        """Drops every segment (different extractor versions or a replaced database)."""
+        self._commit(self._empty_manifest())
+        self._remove_orphans()
+
+    def refresh(self):
+        """Re-reads the manifest if another writer (or process) replaced it."""
+        with self._lock:
+            try:
+                st = os.stat(self.manifest_path)
+            except FileNotFoundError:
+                return
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp:
+                return
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            known = {s.name: s for s in self.segments}
+            segments = []
+            for entry in manifest["segments"]:
+                seg = known.get(entry["name"])
+                if seg is None or seg.entry != entry:
+                    seg = _Segment(self.directory, entry)
+                segments.append(seg)
+            self.manifest, self.segments, self._stamp = manifest, segments, stamp
+
+    def _commit(self, manifest):
+        """Atomically publishes a manifest (after every segment write it describes was fsynced)."""
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        _fsync_dir(self.directory)
+        self.refresh()
+
+    @contextmanager
+    def _writing(self):
+        """Thread + inter-process writer lock (re-entrant), with the latest manifest loaded."""
+        with self._lock:
+            if self._writers:
+                yield  # flock is per open file: re-locking from a nested call would deadlock.
+                return
+            with _FileLock(self.lock_path):
+                self._writers += 1
+                try:
+                    self.refresh()
+                    yield
+                finally:
+                    self._writers -= 1
+
+    def _code(self, manifest, vocab, value):
+        values = manifest[vocab]
+        if value not in values:
+            values.append(value)
+        return values.index(value) + 1
+
+    def _status_code(self, status):
+        statuses = self.manifest["statuses"] if self.manifest else []
+        return statuses.index(status) + 1 if status in statuses else None
+
+    # --- Writes ---
+    def append_rows(self, rows, manifest=None):
+        """Appends db-shaped rows (id, type, status, category, features_color, features_text)."""
+        with self._writing():
+            manifest = manifest or json.loads(json.dumps(self.manifest))
+            for item_type in sorted({row['type'] for row in rows}):
+                batch = [row for row in rows if row['type'] == item_type]
+                while batch:
+                    entry = self._active_entry(manifest, item_type)
+                    room = SEGMENT_ROWS - entry["rows"]
+                    arrays = _encode_rows(batch[:room], lambda vocab, v: self._code(manifest, vocab, v))
+                    self._write_segment(entry, *arrays)
+                    entry["sealed"] = entry["rows"] >= SEGMENT_ROWS
+                    batch = batch[room:]
+            self._commit(manifest)
+
+    def _active_entry(self, manifest, item_type):
+        for entry in reversed(manifest["segments"]):
+            if entry["type"] == item_type:
+                if not entry["sealed"]:
+                    return entry
+                break
+        entry = {"name": f"{item_type.lower()}-{manifest['next_segment']:06d}", "type": item_type,
+                 "rows": 0, "nnz": 0, "sealed": False}
+        manifest["next_segment"] += 1
+        manifest["segments"].append(entry)
+        return entry
+
+    def _write_segment(self, entry, vectors, ids, state, lengths, tidx, tval):
+        """Appends arrays to a segment's files (fsynced); the caller commits the manifest."""
+        base = os.path.join(self.directory, entry["name"])
+        rows, nnz = entry["rows"], entry["nnz"]
+        tptr = (nnz + np.cumsum(lengths)).astype(np.int32)
+        for ext, data, committed in ((".vec", vectors, rows * VISUAL_DIM * 4), (".ids", ids, rows * 8),
+                                     (".state", state, rows * STATE_DTYPE.itemsize), (".tptr", tptr, rows * 4),
+                                     (".tidx", tidx, nnz * 4), (".tval", tval, nnz * 4)):
+            path = base + ext
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                f.truncate(committed)  # Drops whatever a crashed writer left past the commit point.
+                f.seek(committed)
+                f.write(np.ascontiguousarray(data, dtype=SEGMENT_FILES[ext]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        entry["rows"] += len(ids)
+        entry["nnz"] += len(tidx)
+
+    @metrics.timed("vector_store.sync")
+    def sync(self):
+        """Appends OPEN items added to SQLite since the last sync (by any process). Returns how many."""
+        added = 0
+        with self._writing():
+            if db.get_last_item_id() < self.manifest["last_id"]:
+                self._reset()  # A fresh/smaller database: rebuild from scratch.
+            while True:
+                rows = db.get_new_items(self.manifest["last_id"], SYNC_BATCH)
+                if not rows:
+                    return added
+                manifest = json.loads(json.dumps(self.manifest))
+                manifest["last_id"] = rows[-1]['id']
+                live = [row for row in rows if row['status'] == 'OPEN']
+                self.append_rows(live, manifest)
+                added += len(live)
+
+    def set_status(self, item_id, status):
+        """
+        Updates a row's status in place (every process sees it through the shared mapping).
+        Returns the number of rows updated (0: the item is not stored, e.g. never OPEN).
+        """
+        with self._writing():
+            code = self._status_code(status)
+            if code is None:
+                manifest = json.loads(json.dumps(self.manifest))
+                code = self._code(manifest, "statuses", status)
+                self._commit(manifest)
+            return self._update(item_id, "status", code)
+
+    def set_category(self, item_id, category):
+        with self._writing():
+            manifest = json.loads(json.dumps(self.manifest))
+            code = self._code(manifest, "categories", str(category))
+            if manifest["categories"] != self.manifest["categories"]:
+                self._commit(manifest)
+            return self._update(item_id, "category", code)
+
+    def replace(self, row):
+        """New vectors for an existing item: the old row is superseded and the new one appended."""
+        with self._writing():
+            if row['id'] > self.manifest["last_id"]:
+                return  # Not synced yet: sync() will read the new vectors.
+            self._update(row['id'], "status", REMOVED)
+            if row['status'] == 'OPEN':
+                self.append_rows([row])
+
+    def _update(self, item_id, field, code):
+        updated = 0
+        for seg in self.segments:
+            positions = seg.find(item_id)
+            positions = positions[seg.state["status"][positions] != REMOVED]
+            if positions.size:
+                seg.state[field][positions] = code
+                updated += positions.size
+        return updated
+
+    def reconcile(self):
+        """
+        Drops rows SQLite no longer has as OPEN (changes made while no store-backed
+        process was running to apply them). Returns how many.
+        """
+        with self._writing():
+            code = self._status_code('OPEN')
+            if code is None:
+                return 0
+            open_ids = db.get_item_ids('OPEN')
+            dropped = 0
+            for seg in self.segments:
+                gone = np.flatnonzero((seg.state["status"] == code) & ~np.isin(seg.ids, open_ids))
+                seg.state["status"][gone] = REMOVED
+                dropped += gone.size
+            return dropped
+
+    # --- Reads ---
+    def count(self, item_type, status='OPEN'):
+        self.refresh()
+        code = self._status_code(status)
+        if code is None:
+            return 0
+        return sum(int(np.count_nonzero(seg.state["status"] == code))
+                   for seg in self.segments if seg.item_type == item_type)
+
+    def search(self, item_type, q_visual=None, q_text=None, k=None, min_score=search.MIN_SCORE,
+               status='OPEN', categories=None):
+        """[(score, item_id), ...] best first, exact (only the pool's own segments are touched)."""
+        return self.search_many(item_type, [q_visual], [q_text], k, min_score, status, categories)[0]
+
+    @metrics.timed("vector_store.search")
+    def search_many(self, item_type, q_visuals, q_texts, k=None, min_score=None, status='OPEN', categories=None):
+        """search() for a batch of queries: one pass over the segments for all of them."""
+        min_score = search.MIN_SCORE if min_score is None else min_score
+        self.refresh()
+        empty = [[] for _ in q_visuals]
+        code = self._status_code(status)
+        if code is None:
+            return empty
+        category_codes = None
+        if categories is not None:
+            wanted = {str(c).lower() for c in categories}
+            category_codes = [i + 1 for i, c in enumerate(self.manifest["categories"]) if c.lower() in wanted]
+
+        generation, idf = text_model.current_weights()
+        prepared = search.prepare_queries(VISUAL_DIM, q_visuals, q_texts, text_weights=idf)
+        found = [([], []) for _ in q_visuals]
+        for seg in self.segments:
+            if seg.item_type != item_type or not seg.rows:
+                continue
+            mask = seg.state["status"] == code
+            if category_codes is not None:
+                mask &= np.isin(seg.state["category"], category_codes)
+            positions = np.flatnonzero(mask)
+            if not positions.size:
+                continue
+            text = seg.text(generation, idf)
+            if positions.size < GATHER_RATIO * seg.rows:
+                # Few rows qualify: read only their pages.
+                scores = search.score_prepared(seg.vectors[positions], text[positions], prepared)
+            else:
+                scores = search.score_prepared(seg.vectors, text, prepared)
+                scores[~mask] = -np.inf
+                positions = np.arange(seg.rows)
+            for j, column in enumerate(scores.T):
+                winners = search.top_k(column, k, min_score)
+                found[j][0].append(seg.ids[positions[winners]])
+                found[j][1].append(column[winners])
+
+        results = []
+        for ids, scores in found:
+            if not ids:
+                results.append([])
+                continue
+            ids, scores = np.concatenate(ids), np.concatenate(scores)
+            best = search.top_k(scores, k, -np.inf)
+            results.append([(float(scores[i]), int(ids[i])) for i in best])
+        return results
+
+    def explain(self, query, item_ids):
+        """{item_id: [shared keywords]} from the stored term counts."""
+        from scipy import sparse
+        self.refresh()
+        generation, idf = text_model.current_weights()
+        ids, rows = [], []
+        for item_id in item_ids:
+            for seg in self.segments:
+                positions = seg.find(item_id)
+                positions = positions[seg.state["status"][positions] != REMOVED]
+                if positions.size:
+                    ids.append(item_id)
+                    rows.append(seg.text(generation, idf, weighted=False)[positions[-1]])
+                    break
+        if not rows:
+            return {}
+        keywords = search.keyword_overlap(sparse.vstack(rows).tocsr(), features.text_terms(query))
+        return dict(zip(ids, keywords))
+
+    # --- Compaction ---
+    def dead_rows(self):
+        self.refresh()
+        code = self._status_code('OPEN')
+        total = sum(seg.rows for seg in self.segments)
+        live = sum(int(np.count_nonzero(seg.state["status"] == code)) for seg in self.segments) if code else 0
+        return total - live, total
+
+    def needs_compaction(self):
+        dead, total = self.dead_rows()
+        return dead >= COMPACT_MIN_DEAD and dead > COMPACT_DEAD_RATIO * total
+
+    @metrics.timed("vector_store.compact")
+    def compact(self):
+        """
+        Rewrites every segment keeping only rows that are OPEN both here and in SQLite,
+        then swaps the manifest. Returns (rows before, rows after).
+        """
+        with self._writing():
+            self._remove_orphans()
+            open_ids = db.get_item_ids('OPEN')
+            code = self._status_code('OPEN')
+            old = list(self.segments)
+            manifest = json.loads(json.dumps(self.manifest))
+            manifest["segments"] = []
+            for seg in old:
+                keep = np.flatnonzero((seg.state["status"] == code) & np.isin(seg.ids, open_ids))
+                raw = seg.text(None, None, weighted=False)
+                start = 0
+                while start < keep.size:
+                    entry = self._active_entry(manifest, seg.item_type)
+                    take = keep[start:start + min(SYNC_BATCH, SEGMENT_ROWS - entry["rows"])]
+                    self._copy_rows(entry, seg, raw, take)
+                    entry["sealed"] = entry["rows"] >= SEGMENT_ROWS
+                    start += take.size
+            before = sum(seg.rows for seg in old)
+            self._commit(manifest)
+            self._remove_orphans()
+            return before, sum(seg.rows for seg in self.segments)
+
+    def _copy_rows(self, entry, seg, raw, positions):
+        texts = raw[positions]
+        self._write_segment(entry, seg.vectors[positions], seg.ids[positions], seg.state[positions],
+                            np.diff(texts.indptr), texts.indices, texts.data)
+
+    def _remove_orphans(self):
+        """Deletes segment files the manifest no longer lists (replaced or never committed)."""
+        names = {entry["name"] for entry in self.manifest["segments"]} if self.manifest else set()
+        for fname in os.listdir(self.directory):
+            stem, ext = os.path.splitext(fname)
+            if ext in SEGMENT_FILES and stem not in names:
+                try:
+                    os.remove(os.path.join(self.directory, fname))
+                except OSError:
+                    pass  # Still mapped on Windows: removed by the next compaction.
+
+# ==========================
+# 3. FILE LOCK & HELPERS
+# ==========================
+
+class _FileLock:
+    """Exclusive inter-process lock on a file (fcntl on POSIX, msvcrt on Windows)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, "a+b")
+        try:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+
+def _fsync_dir(path):
+    # Makes the rename itself durable; directories cannot be opened on Windows.
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ==========================
+# 4. BACKGROUND WORKER
+# ==========================
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_background_worker(store, interval=WORKER_INTERVAL_S):
+    """Starts (once per process) the daemon thread that syncs new items and compacts the store."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work_loop, args=(store, interval),
+                                       name="vector-store", daemon=True)
+            _worker.start()
+    return _worker
+
+def _work_loop(store, interval):
+    while True:
+        try:
+            store.sync()
+            if store.needs_compaction():
+                before, after = store.compact()
+                print(f"[vector_store] Compacted {before} -> {after} rows")
+        except Exception as err:
+            print(f"[vector_store] Background maintenance failed: {err}")
+        time.sleep(interval)
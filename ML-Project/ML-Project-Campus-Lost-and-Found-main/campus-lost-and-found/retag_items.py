@@ -0,0 +1,62 @@
+# File: retag_items.py
+# Description: Bulk re-classification of stored items with the current category model.
+#              Images are classified in batches (features.predict_categories: parallel
+#              extraction + one predict_proba per batch); a label only changes when the
+#              model is confident enough.
+# Usage: python retag_items.py [--apply] [--min-confidence 0.6] [--type FOUND|LOST] [--workers N]
+#        Without --apply it only reports what would change.
+
+import argparse
+import time
+from collections import Counter
+from modules import db, features
+
+BATCH_SIZE = 256
+
+def retag(apply=False, min_confidence=0.6, item_type=None, workers=None):
+    print(">>> RE-TAGGING ITEMS <<<")
+    db.init_db()
+    if features.load_ml_model() is None:
+        print("[ABORT] No trained classifier (run train_model.py first).")
+        return
+
+    scanned, unreadable, last_id = 0, 0, 0
+    changes = Counter()
+    start = time.perf_counter()
+    while True:
+        rows = db.get_image_rows(last_id, BATCH_SIZE, item_type)
+        if not rows:
+            break
+        rankings = features.predict_categories([row['image_path'] for row in rows], top_k=1, workers=workers)
+
+        updates = []
+        for row, ranking in zip(rows, rankings):
+            if ranking is None:
+                unreadable += 1
+                continue
+            label, confidence = ranking[0]
+            if label != row['category'] and confidence >= min_confidence:
+                updates.append((row['id'], label))
+                changes[(row['category'], label)] += 1
+        if apply:
+            db.update_item_categories(updates)
+
+        scanned += len(rows)
+        last_id = rows[-1]['id']
+
+    elapsed = time.perf_counter() - start
+    print(f"   [OK] {scanned} items classified in {elapsed:.1f}s "
+          f"({scanned / max(elapsed, 1e-9):.0f} images/s), {unreadable} unreadable")
+    for (old, new), count in changes.most_common():
+        print(f"        {old} -> {new}: {count}")
+    verb = "re-tagged" if apply else "would be re-tagged (dry run, pass --apply)"
+    print(f">>> {sum(changes.values())} items {verb} <<<")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-classify stored items with the category model.")
+    parser.add_argument("--apply", action="store_true", help="write the new labels (default: report only)")
+    parser.add_argument("--min-confidence", type=float, default=0.6, help="minimum probability to change a label")
+    parser.add_argument("--type", choices=["FOUND", "LOST"], help="only items of this type")
+    parser.add_argument("--workers", type=int, help="extraction processes (default: all cores)")
+    args = parser.parse_args()
+    retag(args.apply, args.min_confidence, args.type, args.workers)
@@ -0,0 +1,353 @@
+# File: service.py
+# Description: Headless matching service (HTTP/JSON on asyncio, standard library only).
+#              One long-lived process keeps the vector index, the text model and the
+#              classifier warm; image decoding + HOG run in a process pool so the event
+#              loop never blocks on CPU work, and index/SQLite calls run in threads.
+#              app.py becomes a thin client when LF_SERVICE_URL points here
+#              (see modules/service_client.py).
+# Usage: python service.py [--host 127.0.0.1] [--port 8765] [--workers N]
+#        --workers 0 extracts in threads instead of a process pool.
+#
+# Endpoints (images are base64 in the JSON body):
+#   GET  /health                  -> {"status", "pools": {"LOST": n, "FOUND": n}}
+#   GET  /metrics                 -> Prometheus text (modules/metrics.py)
+#   POST /predict-category        {image, top_k?} -> {"category", "ranking"}
+#   POST /search                  {target, text?, image?, category?, k?}
+#                                 -> {"results": [{"score", "item", "keywords"}], "searched"}
+#   POST /items                   {user_id, type, description, image, category?} -> {"id", "image_path", "category"}
+#   GET  /items/<id>/matches      -> {"matches": [...]}
+#   POST /items/<id>/status       {user_id, status} -> {"id", "status"}
+#                                 (403 if user_id does not own the item, 409 if the transition is not allowed)
+# Auth: LF_SERVICE_TOKEN requires "Authorization: Bearer <token>" on every request. The token
+#       authenticates the calling app, which vouches for the user_id it sends (it logged the user in).
+#       Without a token the service only starts on a loopback address.
+
+import argparse
+import asyncio
+import base64
+import binascii
+import ipaddress
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs
+from modules import db, features, image_store, index, lifecycle, matcher, metrics, search, text_model, thumbnails, vector_store
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_RESULTS = 100
+ANN_MIN_POOL = None  # same as app.py
+SHARD_MIN_POOL = None
+VECTOR_STORE_DIR = None  # memory-mapped OPEN pools, see app.py
+ITEM_TYPES = ("LOST", "FOUND")
+TOKEN = os.environ.get("LF_SERVICE_TOKEN")
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 422: "Unprocessable Entity",
+           500: "Internal Server Error"}
+
+class ServiceError(Exception):
+    """Becomes an HTTP error response with a JSON {"error": message} body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# ==========================
+# 1. CPU-BOUND WORK (PROCESS POOL)
+# ==========================
+
+def _init_worker():
+    # Each worker loads the classifier once instead of on its first request.
+    features.load_ml_model()
+
+def _analyze_bytes(data, predict):
+    """Runs in a pool worker: decode + Color/HOG (+ classifier) for one image."""
+    return features.analyze_image(data, predict=predict)
+
+# ==========================
+# 2. MATCHING SERVICE
+# ==========================
+
+class MatchingService:
+    """Request handlers on top of the shared warm index; every handler returns (status, payload)."""
+
+    def __init__(self, workers=None):
+        self.search_index = index.get_index(ann_min_pool=ANN_MIN_POOL, shard_min_pool=SHARD_MIN_POOL,
+                                            store_dir=VECTOR_STORE_DIR)
+        workers = os.cpu_count() if workers is None else workers
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker) if workers > 0 else None
+
+    def warm_up(self):
+        """Loads both pools, the text model and the classifier before the first request."""
+        db.init_db()
+        features.load_ml_model()
+        features.extract_text_vector("warm up")
+        for item_type in ITEM_TYPES:
+            self.search_index.count(item_type)
+        text_model.start_background_worker()
+        matcher.start_background_worker(self.search_index)
+        lifecycle.start_background_worker()
+        if self.search_index.store is not None:
+            vector_store.start_background_worker(self.search_index.store)
+        metrics.start_exporter()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def analyze(self, data, predict=True):
+        """image_store.analyze() with the extraction offloaded: (digest, analysis)."""
+        digest = image_store.content_digest(data)
+        found, analysis = image_store.lookup(digest, predict)
+        if not found:
+            loop = asyncio.get_running_loop()
+            analysis = await loop.run_in_executor(self.pool, _analyze_bytes, data, predict)
+            image_store.remember(digest, predict, analysis)
+        return digest, analysis
+
+    # --- Handlers ---
+    async def health(self, body):
+        pools = {t: await asyncio.to_thread(self.search_index.count, t) for t in ITEM_TYPES}
+        return 200, {"status": "ok", "pools": pools}
+
+    async def predict_category(self, body):
+        _, analysis = await self.analyze(_image(body, required=True))
+        if analysis is None:
+            raise ServiceError(422, "Image could not be decoded")
+        top_k = _int(body, "top_k", 3)
+        return 200, {"category": analysis["category"], "ranking": analysis["ranking"][:top_k]}
+
+    async def search(self, body):
+        target = _item_type(body, "target")
+        text = body.get("text") or None
+        category = body.get("category") or None
+        k = _int(body, "k", MAX_RESULTS)
+        data = _image(body)
+
+        q_vis_vec, ranking = None, None
+        if data is not None:
+            _, analysis = await self.analyze(data, predict=category is None)
+            if analysis is None:
+                raise ServiceError(422, "Image could not be decoded")
+            q_vis_vec, ranking = analysis["vector"], analysis["ranking"]
+        if q_vis_vec is None and text is None:
+            raise ServiceError(400, "Provide 'text', 'image' or both")
+
+        results, searched = await asyncio.to_thread(
+            self._search_sync, target, text, q_vis_vec, search.category_tiers(category, ranking), k
+        )
+        return 200, {"results": results, "searched": searched}
+
+    def _search_sync(self, target, text, q_vis_vec, tiers, k):
+        q_txt_vec = features.extract_text_vector(text) if text else None
+        scored, searched = self.search_index.search_by_category(target, q_vis_vec, q_txt_vec, k=k, tiers=tiers)
+        keywords = {}
+        if text and scored:
+            keywords = self.search_index.explain_keywords(target, text, [row['id'] for _, row in scored])
+        results = [{"score": score, "item": row, "keywords": keywords.get(row['id'], [])} for score, row in scored]
+        return results, searched
+
+    async def submit_item(self, body):
+        item_type = _item_type(body, "type")
+        description = (body.get("description") or "").strip()
+        if not description:
+            raise ServiceError(400, "'description' is required")
+        user_id = _int(body, "user_id")
+        if await asyncio.to_thread(db.get_user_by_id, user_id) is None:
+            raise ServiceError(400, f"Unknown user_id {user_id}")
+        data = _image(body, required=True)
+
+        digest, analysis = await self.analyze(data)
+        if analysis is None:
+            raise ServiceError(422, "Image could not be decoded")
+        category = body.get("category") or analysis["category"] or "Other"
+        item_id, path = await asyncio.to_thread(
+            self._store_sync, data, digest, user_id, item_type, category, description, analysis["vector"]
+        )
+        return 201, {"id": item_id, "image_path": path, "category": category}
+
+    def _store_sync(self, data, digest, user_id, item_type, category, description, vector):
+        path = image_store.save(data, digest)
+        item_id = db.add_item(user_id, item_type, category, description, path,
+                              vector, features.extract_text_vector(description))
+        thumbnails.get_thumbnail(path)
+        return item_id, path
+
+    async def matches(self, item_id, limit):
+        rows = await asyncio.to_thread(db.get_matches, item_id, limit)
+        return 200, {"matches": [dict(row) for row in rows]}
+
+    async def change_status(self, item_id, body):
+        status = str(body.get("status", "")).upper()
+        if status not in lifecycle.TRANSITIONS:
+            raise ServiceError(400, f"'status' must be one of {', '.join(lifecycle.TRANSITIONS)}")
+        user_id = _int(body, "user_id")
+        owner = await asyncio.to_thread(db.get_item_owner, item_id)
+        if owner is None:
+            raise ServiceError(404, f"No item {item_id}")
+        if owner != user_id:
+            raise ServiceError(403, f"Item {item_id} belongs to another user")
+        if not await asyncio.to_thread(lifecycle.change_status, item_id, status):
+            raise ServiceError(409, f"Item {item_id} cannot move to {status}")
+        return 200, {"id": item_id, "status": status}
+
+    # --- Routing ---
+    async def dispatch(self, method, path, query, body):
+        if path == "/health" and method == "GET":
+            return await self.health(body)
+        if path == "/metrics" and method == "GET":
+            return 200, metrics.to_prometheus()
+        routes = {"/predict-category": self.predict_category, "/search": self.search, "/items": self.submit_item}
+        if path in routes:
+            if method != "POST":
+                raise ServiceError(405, f"{path} expects POST")
+            return await routes[path](body)
+        parts = path.strip("/").split("/")
+        if len(parts) == 3 and parts[0] == "items" and parts[2] == "matches" and parts[1].isdigit():
+            if method != "GET":
+                raise ServiceError(405, f"{path} expects GET")
+            return await self.matches(int(parts[1]), _int(query, "limit", matcher.MATCH_TOP_K))
+        if len(parts) == 3 and parts[0] == "items" and parts[2] == "status" and parts[1].isdigit():
+            if method != "POST":
+                raise ServiceError(405, f"{path} expects POST")
+            return await self.change_status(int(parts[1]), body)
+        raise ServiceError(404, f"No route for {path}")
+
+def _image(body, required=False):
+    encoded = body.get("image")
+    if not encoded:
+        if required:
+            raise ServiceError(400, "'image' (base64) is required")
+        return None
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except (binascii.Error, TypeError):
+        raise ServiceError(400, "'image' is not valid base64")
+
+def _int(body, field, default=None):
+    value = body.get(field, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ServiceError(400, f"'{field}' must be an integer")
+
+def _item_type(body, field):
+    value = str(body.get(field, "")).upper()
+    if value not in ITEM_TYPES:
+        raise ServiceError(400, f"'{field}' must be LOST or FOUND")
+    return value
+
+# ==========================
+# 3. HTTP/1.1 TRANSPORT
+# ==========================
+
+async def _read_request(reader):
+    """(method, path, query, headers, body) or None when the client closed the connection."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise ServiceError(400, "Malformed request")
+    if length > MAX_BODY_BYTES:
+        raise ServiceError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+
+    path, _, raw_query = target.partition("?")
+    query = {name: values[-1] for name, values in parse_qs(raw_query).items()}
+    return method.upper(), path, query, headers, body
+
+def _response(status, payload, keep_alive):
+    if isinstance(payload, str):
+        content, ctype = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        content, ctype = json.dumps(payload).encode("utf-8"), "application/json"
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {ctype}\r\nContent-Length: {len(content)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + content
+
+async def _handle_connection(service, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, query, headers, raw_body = request
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                if TOKEN and headers.get("authorization") != f"Bearer {TOKEN}":
+                    raise ServiceError(401, "Missing or wrong bearer token")
+                try:
+                    body = json.loads(raw_body) if raw_body else {}
+                except ValueError:
+                    raise ServiceError(400, "Body is not valid JSON")
+                with metrics.timer(f"service.{path.strip('/').split('/')[0] or 'root'}"):
+                    status, payload = await service.dispatch(method, path, query, body)
+            except ServiceError as err:
+                status, payload = err.status, {"error": str(err)}
+            except (ConnectionError, asyncio.IncompleteReadError):
+                break
+            except Exception as err:
+                print(f"[service] Request failed: {err!r}")
+                status, payload = 500, {"error": "Internal error"}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=None):
+    service = MatchingService(workers)
+    start = time.perf_counter()
+    await asyncio.to_thread(service.warm_up)
+    server = await asyncio.start_server(lambda r, w: _handle_connection(service, r, w), host, port)
+    print(f"[service] Warm in {time.perf_counter() - start:.1f}s, listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Lost & Found matching service.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count, 0 = threads)")
+    args = parser.parse_args()
+    if not TOKEN and not _is_loopback(args.host):
+        parser.error(f"refusing to listen on {args.host} without LF_SERVICE_TOKEN (set it, or bind to 127.0.0.1)")
+    # SIGTERM (e.g. from a process manager) shuts down like Ctrl+C, so the pool workers exit too.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        print("[service] Stopped.")
+
+if __name__ == "__main__":
+    main()
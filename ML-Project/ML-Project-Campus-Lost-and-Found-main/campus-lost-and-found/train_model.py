@@ -3,68 +3,54 @@
 # Changes: Refactored logic flow, updated hyperparameters, and variable renaming.
 
 import os
+import sys
+import time
 import numpy as np
 import pickle as pkl
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
-from modules import features
+from modules import features, feature_cache, forest
 
 # --- SYSTEM CONSTANTS ---
 RAW_DATA_DIR = "data/raw_dataset" 
 MODEL_OUTPUT_FILE = "modules/category_classifier.pkl"
+COMPACT_OUTPUT_FILE = features.COMPACT_MODEL_PATH
 
-def compile_feature_set():
+def compile_feature_set(workers=None):
     """
     Traverses the dataset directory, extracts visual features (HOG + Color),
     and aggregates them into numpy arrays.
+    Vectors come from the on-disk feature cache (keyed by image content hash),
+    so only new images are extracted, in parallel across CPU cores.
     """
     print(">>> Phase 1: Initiating Data Ingestion & Feature Extraction...")
     
-    features_list = [] 
+    image_paths = [] 
     labels_list = [] 
     
     # Validation check
     if not os.path.exists(RAW_DATA_DIR):
         print(f"[CRITICAL] Directory not found: {RAW_DATA_DIR}")
         return None, None
-
-    img_counter = 0
     
     # Recursive directory walk
     for dir_path, _, filenames in os.walk(RAW_DATA_DIR):
-        for fname in filenames:
+        for fname in sorted(filenames):
             # Filter for valid image formats
             if fname.lower().endswith(('.jpg', '.jpeg', '.png')):
-                full_path = os.path.join(dir_path, fname)
-                
+                image_paths.append(os.path.join(dir_path, fname))
                 # Extract the class label from the parent folder name
-                class_label = os.path.basename(dir_path)
-                
-                try:
-                    # Invoke feature extractors from the modules package
-                    vec_color = features.get_raw_color_hist(full_path)
-                    vec_hog = features.get_hog_features(full_path)
-                    
-                    # Ensure both extractors returned valid data
-                    if vec_color is not None and vec_hog is not None:
-                        # Stack features horizontally
-                        combined_vector = np.hstack((vec_color, vec_hog))
-                        
-                        features_list.append(combined_vector)
-                        labels_list.append(class_label)
-                        
-                        img_counter += 1
-                        # Log progress every 200 images
-                        if img_counter % 200 == 0:
-                            print(f"    -> Extracted features for {img_counter} items...")
-                        
-                except Exception as err:
-                    # Silent fail on individual corrupt images to keep process running
-                    continue
+                labels_list.append(os.path.basename(dir_path))
+
+    # Cached + incremental extraction (corrupt images are skipped, not fatal)
+    start = time.perf_counter()
+    cache = feature_cache.FeatureCache()
+    X_data, readable = cache.load(image_paths, workers=workers)
+    y_data = np.array(labels_list)[readable]
                 
-    print(f"[COMPLETED] Total samples ready: {len(features_list)}")
-    return np.array(features_list), np.array(labels_list)
+    print(f"[COMPLETED] Total samples ready: {len(X_data)} ({time.perf_counter() - start:.1f}s)")
+    return X_data, y_data
 
 def execute_pipeline():
     """
@@ -95,6 +81,8 @@ def execute_pipeline():
     
     # 4. Fit Model
     rf_model.fit(X_train, y_train)
+    # Record which HOG extractor produced the training features
+    rf_model.feature_version_ = features.VISUAL_FEATURE_VERSION
     
     # 5. Evaluate
     predictions = rf_model.predict(X_val)
@@ -109,6 +97,36 @@ def execute_pipeline():
         print(f"[DONE] Classifier successfully saved to: {MODEL_OUTPUT_FILE}")
     except Exception as e:
         print(f"[ERROR] Failed to save model: {e}")
+        return
+
+    export_compact(rf_model, X_val)
+
+def export_compact(rf_model, X_check=None):
+    """
+    Writes the compact, memory-mappable copy the app loads (modules/forest.py)
+    and checks it predicts exactly like the forest it came from.
+    """
+    header = forest.export_forest(rf_model, COMPACT_OUTPUT_FILE)
+    size_kb = os.path.getsize(COMPACT_OUTPUT_FILE) / 1024
+    print(f"[DONE] Compact classifier saved to: {COMPACT_OUTPUT_FILE} "
+          f"({size_kb:.0f} KB, {header['n_selected']} of {header['input_dim']} input dims used)")
+    if X_check is not None and len(X_check):
+        compact = forest.load_forest(COMPACT_OUTPUT_FILE)
+        same = np.mean(compact.predict(X_check) == rf_model.predict(X_check).astype(str))
+        diff = np.abs(compact.predict_proba(X_check) - rf_model.predict_proba(X_check)).max()
+        print(f"    -> Compact vs. original: {same*100:.2f}% same labels, max probability diff {diff:.2e}")
+
+def export_existing():
+    """--export-only: converts an already trained pickle without retraining."""
+    if not os.path.exists(MODEL_OUTPUT_FILE):
+        print(f"[ABORT] No trained model at {MODEL_OUTPUT_FILE}")
+        return
+    with open(MODEL_OUTPUT_FILE, "rb") as file_in:
+        rf_model = pkl.load(file_in)
+    export_compact(rf_model)
 
 if __name__ == "__main__":
-    execute_pipeline()
\ No newline at end of file
+    if "--export-only" in sys.argv:
+        export_existing()
+    else:
+        execute_pipeline()
\ No newline at end of file